@@ -13,6 +13,7 @@
 # limitations under the License.
 
 __all__ = [
+    'block_transfer',
     'capability_keys',
     'capability_keystore',
     'endpoint_registry',
@@ -0,0 +1,221 @@
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Parallel transfer of key value store blocks between the local block store
+and a storage service. The root block of a key value store lists the
+identifiers of the remaining blocks; the list is split into batches that
+are moved with concurrent get_blocks/store_blocks requests. Blocks that
+the destination already holds with enough remaining lifetime are skipped,
+blocks that would expire sooner are stored again to extend their lifetime,
+and failed batches are retried.
+If the parallel transfer fails the serial synchronization provided by the
+key value store is used instead.
+"""
+
+import json
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pdo.common.block_store_manager as pblocks
+
+import logging
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------------------------------
+# defaults for the number of concurrent requests, the number of blocks
+# per request and the number of times a failed batch is retried
+__DEFAULT_PARALLELISM__ = 4
+__DEFAULT_BATCH_SIZE__ = 32
+__DEFAULT_RETRIES__ = 2
+
+# -----------------------------------------------------------------
+# lifetime in seconds that a block must have left at the destination to be
+# skipped when the caller does not request a specific lifetime
+__DEFAULT_MIN_EXPIRATION__ = 60
+
+# -----------------------------------------------------------------
+def root_block_ids(root_block) :
+    """Return the identifiers of the blocks listed in the root block of a key value store
+
+    :param root_block: the raw root block, trailing NUL characters are ignored
+    """
+    if root_block is None :
+        raise ValueError('missing root block')
+
+    root_block = json.loads(bytes(root_block).decode('utf8').rstrip('\0'))
+    return root_block.get('BlockIds', [])
+
+# -----------------------------------------------------------------
+def __requested_lifetime__(store_options) :
+    """Return the block lifetime in seconds requested in the store options or None
+    """
+    for option in ('expiration', 'duration') :
+        if store_options.get(option) is not None :
+            return int(store_options[option])
+    return None
+
+# -----------------------------------------------------------------
+def __missing_blocks__(block_store, block_ids, min_expiration = __DEFAULT_MIN_EXPIRATION__) :
+    """Return the subset of block_ids that must be stored at the block store
+
+    A block is skipped only if the block store holds it and, when the
+    block store reports the remaining lifetime of the block, that lifetime
+    is at least min_expiration seconds; storing the block again extends
+    its lifetime. Any failure to check the blocks is treated as if all
+    blocks are missing.
+    """
+    if not hasattr(block_store, 'check_blocks') :
+        return block_ids
+
+    try :
+        status_list = block_store.check_blocks(block_ids)
+    except Exception as e :
+        logger.debug('failed to check blocks; %s', e)
+        return block_ids
+
+    present = set()
+    for status in status_list or [] :
+        if not isinstance(status, dict) or status.get('size', 0) <= 0 :
+            continue
+        expiration = status.get('expiration')
+        if expiration is not None and expiration < min_expiration :
+            continue
+        present.add(status.get('block_id'))
+
+    return [ block_id for block_id in block_ids if block_id not in present ]
+
+# -----------------------------------------------------------------
+def transfer_blocks(
+        source,
+        destination,
+        root_block_id,
+        parallelism = __DEFAULT_PARALLELISM__,
+        batch_size = __DEFAULT_BATCH_SIZE__,
+        retries = __DEFAULT_RETRIES__,
+        **store_options) :
+    """Copy the blocks of a key value store from source to destination
+
+    The root block is copied last so that a store is never visible at the
+    destination before all of its blocks are.
+
+    :param source: block store with get_block and get_blocks methods
+    :param destination: block store with a store_blocks method
+    :param root_block_id: hash identity of the key value store
+    :param store_options: keyword arguments passed to destination.store_blocks,
+        such as the expiration of the stored blocks
+    :return: the number of blocks copied
+    """
+    if batch_size <= 0 :
+        raise ValueError('batch size must be a positive integer')
+
+    min_expiration = __requested_lifetime__(store_options)
+    if min_expiration is None :
+        min_expiration = __DEFAULT_MIN_EXPIRATION__
+
+    root_block = source.get_block(root_block_id)
+    block_ids = __missing_blocks__(destination, root_block_ids(root_block), min_expiration)
+    batches = [ block_ids[i:i+batch_size] for i in range(0, len(block_ids), batch_size) ]
+
+    def copy_batch(batch) :
+        for attempt in range(retries + 1) :
+            try :
+                blocks = list(source.get_blocks(batch))
+                if len(blocks) != len(batch) :
+                    raise ValueError('expected {} blocks, received {}'.format(len(batch), len(blocks)))
+                destination.store_blocks(blocks, **store_options)
+                return len(batch)
+            except Exception as e :
+                if attempt == retries :
+                    raise
+                logger.info('retrying batch of %d blocks; %s', len(batch), e)
+                time.sleep(0.1 * (2 ** attempt))
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, parallelism)) as executor :
+        block_count = sum(executor.map(copy_batch, batches))
+
+    destination.store_blocks([root_block], **store_options)
+    block_count += 1
+
+    logger.debug('copied %d blocks for store %s in %.4f seconds',
+                 block_count, root_block_id, time.perf_counter() - start_time)
+    return block_count
+
+# -----------------------------------------------------------------
+def sync_to_block_store(
+        kv,
+        block_store,
+        local_store = None,
+        parallelism = __DEFAULT_PARALLELISM__,
+        batch_size = __DEFAULT_BATCH_SIZE__,
+        retries = __DEFAULT_RETRIES__,
+        **kwargs) :
+    """Push the blocks of a key value store to a storage service
+
+    This is a drop-in replacement for kv.sync_to_block_store that copies
+    blocks in parallel batches; additional keyword arguments, such as the
+    expiration of the blocks, are passed to the store_blocks requests of
+    the parallel transfer and to kv.sync_to_block_store if the parallel
+    transfer fails.
+
+    :param kv: a closed KeyValueStore whose blocks are in the local block store
+    :param block_store: the storage service client that receives the blocks
+    :param local_store: block store holding the blocks, defaults to the local block manager
+    """
+    if local_store is None :
+        local_store = pblocks.local_block_manager()
+
+    try :
+        return transfer_blocks(
+            local_store, block_store, kv.hash_identity, parallelism, batch_size, retries, **kwargs)
+    except Exception as e :
+        logger.info('parallel block push failed, falling back to serial sync; %s', e)
+
+    return kv.sync_to_block_store(block_store, **kwargs)
+
+# -----------------------------------------------------------------
+def sync_from_block_store(
+        kv,
+        state_hash,
+        block_store,
+        local_store = None,
+        parallelism = __DEFAULT_PARALLELISM__,
+        batch_size = __DEFAULT_BATCH_SIZE__,
+        retries = __DEFAULT_RETRIES__,
+        **kwargs) :
+    """Pull the blocks of a key value store from a storage service
+
+    This is a drop-in replacement for kv.sync_from_block_store that copies
+    blocks in parallel batches; additional keyword arguments, such as the
+    expiration of the blocks, are passed to the store_blocks requests of
+    the parallel transfer and to kv.sync_from_block_store if the parallel
+    transfer fails.
+
+    :param kv: the KeyValueStore that will be opened on the blocks
+    :param state_hash: hash identity of the key value store
+    :param block_store: the storage service client that holds the blocks
+    :param local_store: block store receiving the blocks, defaults to the local block manager
+    """
+    if local_store is None :
+        local_store = pblocks.local_block_manager()
+
+    try :
+        return transfer_blocks(
+            block_store, local_store, state_hash, parallelism, batch_size, retries, **kwargs)
+    except Exception as e :
+        logger.info('parallel block pull failed, falling back to serial sync; %s', e)
+
+    return kv.sync_from_block_store(state_hash, block_store, **kwargs)
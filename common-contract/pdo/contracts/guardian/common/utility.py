@@ -18,6 +18,7 @@ import random
 import string
 
 from pdo.common.key_value import KeyValueStore
+from pdo.contracts.guardian.common import block_transfer
 
 import logging
 logger = logging.getLogger(__name__)
@@ -59,7 +60,7 @@ def send_file(file_name, block_store = None, **kwargs):
             with kv : _ = kv.set(f'{key}_{chunk_number}', chunk, input_encoding='str', output_encoding='raw')
 
     if block_store :
-        _ = kv.sync_to_block_store(block_store, **kwargs)
+        _ = block_transfer.sync_to_block_store(kv, block_store, **kwargs)
 
     file_information = dict()
     file_information['key_base'] = key
@@ -87,7 +88,7 @@ def recv_file(file_information, file_name, block_store = None, **kwargs) :
 
     kv = KeyValueStore(encryption_key, state_hash)
     if block_store :
-        _ = kv.sync_from_block_store(state_hash, block_store, **kwargs)
+        _ = block_transfer.sync_from_block_store(kv, state_hash, block_store, **kwargs)
 
     with open(file_name, 'wb') as fp :
         for chunk_number in range(chunks) :
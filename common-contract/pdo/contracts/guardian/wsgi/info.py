@@ -19,6 +19,7 @@ This file defines the InfoApp class, a WSGI interface class for
 handling requests for enclave service information.
 """
 
+import importlib
 import json
 
 from http import HTTPStatus
@@ -35,12 +36,23 @@ class InfoApp(object) :
         self.capability_store = capability_store
         self.endpoint_registry = endpoint_registry
 
+        # the operation module may publish additional information about
+        # the service, for example the inputs expected by the operations
+        self.service_metadata = None
+        operation_module_name = config.get('GuardianService', {}).get('Operations')
+        if operation_module_name :
+            operation_module = importlib.import_module(operation_module_name)
+            if hasattr(operation_module, 'service_metadata') :
+                self.service_metadata = operation_module.service_metadata(config)
+
     def __call__(self, environ, start_response) :
         try :
             response = dict()
             response['verifying_key'] = self.capability_store.svc_capability_key.verifying_key
             response['encryption_key'] = self.capability_store.svc_capability_key.encryption_key
             response['storage_service_url'] = self.storage_url
+            if self.service_metadata is not None :
+                response['service_metadata'] = self.service_metadata
 
             result = json.dumps(response).encode()
         except Exception as e :
@@ -12,8 +12,6 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import functools
-import glob
 import os
 import re
 import typing
@@ -23,6 +21,7 @@ import ipywidgets
 import pdo.client.builder as pbuilder
 from pdo.common.keys import ServiceKeys
 from pdo.contracts.jupyter.common_widgets import FileDownloadLink
+from pdo.contracts.key_index import KeyIndex
 
 __all__ = [
     'build_public_key_map',
@@ -44,25 +43,20 @@ __all__ = [
 # -----------------------------------------------------------------
 def _build_key_map_(state : pbuilder.state.State, bindings : pbuilder.bindings.Bindings, pattern : str) -> dict :
     """Build a map for keys found in the specified search path
+
+    The map comes from the shared key index, which is rebuilt only when
+    the contents of one of the key directories change.
     """
 
     key_directories = state.get(['Key', 'SearchPath'])
     key_directories = list(map(lambda f : bindings.expand(f), key_directories))
 
-    # fill the identity map, if there are duplicates then we use the
-    # one found first in the search path
-
-    key_files = map(
-        lambda f : os.path.realpath(f),
-        functools.reduce(lambda r, d : r + glob.glob(os.path.join(d, '*' + pattern)), key_directories, []))
-
-    key_map = {}
-    for key_file in key_files :
-        identity = os.path.basename(key_file).replace(pattern, '')
-        if key_map.get(identity) is None :
-            key_map[identity] = key_file
-
-    return key_map
+    # if there are duplicates then the index uses the one found first
+    # in the search path
+    index = KeyIndex.get_key_index(key_directories)
+    if pattern == index.private_suffix :
+        return index.private_key_map()
+    return index.public_key_map()
 
 def build_public_key_map(state : pbuilder.state.State, bindings : pbuilder.bindings.Bindings) -> dict :
     return _build_key_map_(state, bindings, '_public.pem')
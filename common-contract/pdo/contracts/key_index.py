@@ -0,0 +1,174 @@
+# Copyright 2024 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""An index of the key files in the key search path
+
+The key directories are scanned once and the identity of every key file
+is recorded; when the same identity appears in more than one directory
+the key found first in the search path is used. The contents of public
+key files are cached along with the modification time and size of the
+file, so a key file that is overwritten in place is read again. Adding
+or removing a key file changes the modification time of its directory;
+the modification times are checked on every lookup and the index is
+rebuilt when any of them changes, so lookups stay current without
+rescanning the directories.
+"""
+
+import logging
+import os
+import threading
+
+_logger = logging.getLogger(__name__)
+
+__all__ = [
+    'KeyIndex',
+    'get_key_index',
+    'find_public_key',
+]
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+class KeyIndex(object) :
+
+    public_suffix = '_public.pem'
+    private_suffix = '_private.pem'
+
+    __lock__ = threading.Lock()
+    __indexes__ = {}
+
+    def __init__(self, search_path : list) :
+        self.search_path = list(search_path)
+
+        self.__lock__ = threading.RLock()
+        self.__key_files__ = None
+        self.__mtimes__ = None
+        self.__public_keys__ = {}
+
+    @classmethod
+    def get_key_index(cls, search_path : list) :
+        """Return the shared index for a key search path
+        """
+        key = tuple(search_path)
+        with cls.__lock__ :
+            index = cls.__indexes__.get(key)
+            if index is None :
+                index = cls(search_path)
+                cls.__indexes__[key] = index
+
+        return index
+
+    def __directory_mtimes__(self) -> list :
+        mtimes = []
+        for key_directory in self.search_path :
+            try :
+                mtimes.append(os.stat(key_directory).st_mtime_ns)
+            except OSError :
+                mtimes.append(None)
+        return mtimes
+
+    def scan(self) :
+        """Rebuild the index from the contents of the key directories
+        """
+        mtimes = self.__directory_mtimes__()
+        key_files = { self.public_suffix : {}, self.private_suffix : {} }
+        for key_directory in self.search_path :
+            try :
+                entries = list(os.scandir(key_directory))
+            except OSError :
+                continue
+
+            for entry in entries :
+                for (suffix, key_map) in key_files.items() :
+                    if entry.name.endswith(suffix) :
+                        identity = entry.name[:-len(suffix)]
+                        key_map.setdefault(identity, os.path.realpath(entry.path))
+
+        with self.__lock__ :
+            self.__key_files__ = key_files
+            self.__mtimes__ = mtimes
+            self.__public_keys__ = {}
+
+        _logger.debug('indexed %d public keys', len(key_files[self.public_suffix]))
+
+    def __key_map__(self, suffix : str) -> dict :
+        with self.__lock__ :
+            if self.__key_files__ is None or self.__mtimes__ != self.__directory_mtimes__() :
+                self.scan()
+            return self.__key_files__[suffix]
+
+    def public_key_map(self) -> dict :
+        """Return a dictionary that maps identities to public key files
+        """
+        return dict(self.__key_map__(self.public_suffix))
+
+    def private_key_map(self) -> dict :
+        """Return a dictionary that maps identities to private key files
+        """
+        return dict(self.__key_map__(self.private_suffix))
+
+    def find_public_key_file(self, identity : str) -> str :
+        """Return the path to the public key file for an identity
+
+        A ValueError is raised if there is no such key.
+        """
+        key_file = self.__key_map__(self.public_suffix).get(identity)
+        if key_file is None :
+            raise ValueError('unable to locate public key for {}'.format(identity))
+
+        return key_file
+
+    def find_private_key_file(self, identity : str) -> str :
+        """Return the path to the private key file for an identity
+
+        A ValueError is raised if there is no such key.
+        """
+        key_file = self.__key_map__(self.private_suffix).get(identity)
+        if key_file is None :
+            raise ValueError('unable to locate private key for {}'.format(identity))
+
+        return key_file
+
+    def public_key(self, identity : str) -> str :
+        """Return the PEM encoded public key for an identity
+
+        The key is cached with the modification time and size of its file
+        so that a key file that is overwritten in place is read again.
+        """
+        key_file = self.find_public_key_file(identity)
+        stat = os.stat(key_file)
+        signature = (stat.st_mtime_ns, stat.st_size)
+
+        with self.__lock__ :
+            entry = self.__public_keys__.get(key_file)
+        if entry is not None and entry[0] == signature :
+            return entry[1]
+
+        with open(key_file, 'r') as fp :
+            verifying_key = fp.read()
+        with self.__lock__ :
+            self.__public_keys__[key_file] = (signature, verifying_key)
+
+        return verifying_key
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+def get_key_index(state) -> KeyIndex :
+    """Return the shared key index for the key search path in the client configuration
+    """
+    return KeyIndex.get_key_index(state.get(['Key', 'SearchPath']))
+
+def find_public_key(state, identity : str) -> str :
+    """Return the PEM encoded public key for an identity in the key search path
+    """
+    return get_key_index(state).public_key(identity)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Throughput benchmark for the parallel block transfer helpers.
+
+A synthetic key value store (a root block listing a configurable number
+of random blocks) is copied between two in-memory stand-ins for a block
+store. The destination adds a fixed latency to every request to model a
+remote storage service. The serial transfer (one block per request) is
+reported first, followed by the parallel transfer at each of the requested
+parallelism levels. No PDO services are required.
+
+Example:
+    python benchmark_block_transfer.py --blocks 512 --latency 10 --parallelism 1 4 16
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+
+from pdo.contracts.guardian.common.block_transfer import transfer_blocks
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class StandInBlockStore(object) :
+    """In-memory block store with the interface of the storage service client
+    """
+
+    # -----------------------------------------------------------------
+    def __init__(self, latency = 0.0) :
+        self.latency = latency
+        self.blocks = {}
+        self.requests = 0
+        self.__lock__ = threading.Lock()
+
+    # -----------------------------------------------------------------
+    def __request__(self) :
+        with self.__lock__ :
+            self.requests += 1
+        if self.latency > 0 :
+            time.sleep(self.latency)
+
+    # -----------------------------------------------------------------
+    def get_block(self, block_id) :
+        self.__request__()
+        return self.blocks.get(block_id)
+
+    def get_blocks(self, block_ids) :
+        self.__request__()
+        return [ self.blocks[block_id] for block_id in block_ids ]
+
+    def store_blocks(self, blocks, **kwargs) :
+        self.__request__()
+        with self.__lock__ :
+            for block in blocks :
+                self.blocks[hashlib.sha256(block).hexdigest()] = block
+
+    def check_blocks(self, block_ids) :
+        self.__request__()
+        return [ { 'block_id' : b, 'size' : len(self.blocks.get(b, b'')), 'expiration' : 3600 } for b in block_ids ]
+
+# -----------------------------------------------------------------
+def create_store(block_store, block_count, block_size) :
+    """Populate the block store with a synthetic key value store, return the root block id
+    """
+    blocks = [ os.urandom(block_size) for _ in range(block_count) ]
+    block_store.store_blocks(blocks)
+
+    block_ids = [ hashlib.sha256(block).hexdigest() for block in blocks ]
+    root_block = json.dumps({ 'BlockIds' : block_ids }).encode('utf8')
+    block_store.store_blocks([root_block])
+
+    return hashlib.sha256(root_block).hexdigest()
+
+# -----------------------------------------------------------------
+def run_transfer(source, root_block_id, latency, parallelism, batch_size) :
+    destination = StandInBlockStore(latency)
+
+    start_time = time.perf_counter()
+    block_count = transfer_blocks(source, destination, root_block_id, parallelism, batch_size)
+    elapsed = time.perf_counter() - start_time
+
+    return (block_count, elapsed, destination.requests)
+
+# -----------------------------------------------------------------
+def Main() :
+    parser = argparse.ArgumentParser(description='benchmark the parallel block transfer helpers')
+    parser.add_argument('--blocks', help='number of blocks in the store', type=int, default=512)
+    parser.add_argument('--block-size', help='size of each block in bytes', type=int, default=8192)
+    parser.add_argument('--latency', help='latency of each storage request in milliseconds', type=float, default=10.0)
+    parser.add_argument('--batch-size', help='blocks per request for parallel transfers', type=int, default=32)
+    parser.add_argument('--parallelism', help='parallelism levels to measure', type=int, nargs='+', default=[1, 4, 16])
+    options = parser.parse_args()
+
+    latency = options.latency / 1000.0
+    source = StandInBlockStore()
+    root_block_id = create_store(source, options.blocks, options.block_size)
+    total_bytes = options.blocks * options.block_size
+
+    print('{:>12} {:>12} {:>10} {:>10} {:>12}'.format('parallelism', 'batch size', 'requests', 'seconds', 'MB/s'))
+
+    runs = [ (1, 1) ] + [ (p, options.batch_size) for p in options.parallelism ]
+    for (parallelism, batch_size) in runs :
+        (block_count, elapsed, requests) = run_transfer(source, root_block_id, latency, parallelism, batch_size)
+        if block_count != options.blocks + 1 :
+            raise RuntimeError('expected {} blocks, copied {}'.format(options.blocks + 1, block_count))
+
+        print('{:>12} {:>12} {:>10} {:>10.3f} {:>12.2f}'.format(
+            parallelism, batch_size, requests, elapsed, total_bytes / elapsed / (1024 * 1024)))
+
+if __name__ == '__main__' :
+    Main()
@@ -0,0 +1,41 @@
+# Copyright 2024 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Unit tests for the client side modules of the common contract family.
+Modules are loaded from the source tree so the tests run without an
+installed PDO client; modules that import the client are skipped when it
+is not available.
+"""
+
+import importlib.util
+import os
+
+import pytest
+
+SOURCE_ROOT = os.path.realpath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+@pytest.fixture(scope='session')
+def load_source() :
+    def load(relative_path) :
+        path = os.path.join(SOURCE_ROOT, relative_path)
+        name = os.path.splitext(relative_path)[0].replace(os.sep, '.')
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        try :
+            spec.loader.exec_module(module)
+        except ImportError as e :
+            pytest.skip('{} requires {}'.format(relative_path, e.name))
+        return module
+    return load
@@ -0,0 +1,109 @@
+# Copyright 2024 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+import threading
+
+import pytest
+
+block_transfer = pytest.importorskip('pdo.contracts.guardian.common.block_transfer')
+
+def block_id(block) :
+    return hashlib.sha256(block).hexdigest()
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class RecordingBlockStore(object) :
+    """In-memory block store that records the blocks in each store request
+    """
+
+    def __init__(self, fail_batches = 0, expiration = 3600) :
+        self.blocks = {}
+        self.stored = []
+        self.fail_batches = fail_batches
+        self.expiration = expiration
+        self.__lock__ = threading.Lock()
+
+    def get_block(self, block_id) :
+        return self.blocks.get(block_id)
+
+    def get_blocks(self, block_ids) :
+        return [ self.blocks[b] for b in block_ids ]
+
+    def store_blocks(self, blocks, **kwargs) :
+        with self.__lock__ :
+            if self.fail_batches > 0 :
+                self.fail_batches -= 1
+                raise IOError('storage service unavailable')
+            self.stored.append([ block_id(b) for b in blocks ])
+            for block in blocks :
+                self.blocks[block_id(block)] = block
+
+    def check_blocks(self, block_ids) :
+        return [ { 'block_id' : b, 'size' : len(self.blocks.get(b, b'')), 'expiration' : self.expiration } for b in block_ids ]
+
+@pytest.fixture
+def source() :
+    source = RecordingBlockStore()
+    blocks = [ 'block {}'.format(i).encode('utf8') for i in range(10) ]
+    source.store_blocks(blocks)
+    root_block = json.dumps({ 'BlockIds' : [ block_id(b) for b in blocks ] }).encode('utf8') + b'\0'
+    source.store_blocks([root_block])
+    source.root_block_id = block_id(root_block)
+    return source
+
+# -----------------------------------------------------------------
+def test_root_block_is_stored_last(source) :
+    destination = RecordingBlockStore()
+    count = block_transfer.transfer_blocks(source, destination, source.root_block_id, parallelism=4, batch_size=3)
+
+    assert count == 11
+    assert destination.stored[-1] == [ source.root_block_id ]
+    assert all(source.root_block_id not in batch for batch in destination.stored[:-1])
+    assert sorted(len(batch) for batch in destination.stored[:-1]) == [ 1, 3, 3, 3 ]
+    assert set(destination.blocks) == set(source.blocks)
+
+def test_root_block_is_not_stored_when_a_batch_fails(source) :
+    destination = RecordingBlockStore(fail_batches=100)
+
+    with pytest.raises(IOError) :
+        block_transfer.transfer_blocks(source, destination, source.root_block_id, batch_size=3, retries=0)
+    assert source.root_block_id not in destination.blocks
+
+def test_failed_batches_are_retried(source, monkeypatch) :
+    monkeypatch.setattr(block_transfer.time, 'sleep', lambda s : None)
+    destination = RecordingBlockStore(fail_batches=2)
+
+    count = block_transfer.transfer_blocks(source, destination, source.root_block_id, parallelism=1, batch_size=5, retries=2)
+    assert count == 11
+    assert destination.stored[-1] == [ source.root_block_id ]
+
+def test_present_blocks_are_skipped_unless_expiring(source) :
+    destination = RecordingBlockStore()
+    block_transfer.transfer_blocks(source, destination, source.root_block_id)
+    destination.stored.clear()
+
+    # every block is present with enough lifetime, only the root is stored
+    assert block_transfer.transfer_blocks(source, destination, source.root_block_id) == 1
+    assert destination.stored == [ [ source.root_block_id ] ]
+
+    # blocks that expire before the requested lifetime are stored again
+    destination.stored.clear()
+    assert block_transfer.transfer_blocks(source, destination, source.root_block_id, expiration=7200) == 11
+    assert destination.stored[-1] == [ source.root_block_id ]
+
+def test_invalid_batch_size_is_rejected(source) :
+    with pytest.raises(ValueError) :
+        block_transfer.transfer_blocks(source, RecordingBlockStore(), source.root_block_id, batch_size=0)
@@ -0,0 +1,87 @@
+# Copyright 2024 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+
+import pytest
+
+@pytest.fixture
+def key_index(load_source) :
+    return load_source('pdo/contracts/key_index.py')
+
+@pytest.fixture
+def key_directories(tmp_path) :
+    (first, second) = (tmp_path / 'first', tmp_path / 'second')
+    first.mkdir()
+    second.mkdir()
+    (first / 'alice_public.pem').write_text('alice-first')
+    (second / 'alice_public.pem').write_text('alice-second')
+    (second / 'bob_public.pem').write_text('bob')
+    (second / 'bob_private.pem').write_text('bob-private')
+    return (first, second)
+
+def touch_directory(path) :
+    # move the directory modification time forward so the change is seen
+    # even on file systems with a coarse timestamp granularity
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+
+# -----------------------------------------------------------------
+def test_first_directory_in_search_path_wins(key_index, key_directories) :
+    index = key_index.KeyIndex([ str(d) for d in key_directories ])
+
+    assert index.public_key('alice') == 'alice-first'
+    assert index.public_key('bob') == 'bob'
+    assert sorted(index.public_key_map()) == [ 'alice', 'bob' ]
+    assert index.find_private_key_file('bob').endswith('bob_private.pem')
+
+def test_unknown_identity_raises_value_error(key_index, key_directories) :
+    index = key_index.KeyIndex([ str(d) for d in key_directories ])
+
+    with pytest.raises(ValueError) :
+        index.public_key('carol')
+    with pytest.raises(ValueError) :
+        index.find_private_key_file('alice')
+
+def test_added_and_removed_keys_are_seen(key_index, key_directories) :
+    (first, second) = key_directories
+    index = key_index.KeyIndex([ str(first), str(second) ])
+    assert 'carol' not in index.public_key_map()
+
+    (second / 'carol_public.pem').write_text('carol')
+    touch_directory(second)
+    assert index.public_key('carol') == 'carol'
+
+    (first / 'alice_public.pem').unlink()
+    touch_directory(first)
+    assert index.public_key('alice') == 'alice-second'
+
+def test_overwritten_key_file_is_read_again(key_index, key_directories) :
+    (first, _) = key_directories
+    index = key_index.KeyIndex([ str(d) for d in key_directories ])
+    assert index.public_key('alice') == 'alice-first'
+
+    # a different size invalidates the cached key even if the modification
+    # time does not change
+    key_file = first / 'alice_public.pem'
+    stat = os.stat(key_file)
+    key_file.write_text('alice-replaced')
+    os.utime(key_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert index.public_key('alice') == 'alice-replaced'
+
+def test_shared_index_per_search_path(key_index, key_directories) :
+    search_path = [ str(d) for d in key_directories ]
+
+    assert key_index.KeyIndex.get_key_index(search_path) is key_index.KeyIndex.get_key_index(list(search_path))
+    assert key_index.KeyIndex.get_key_index(search_path) is not key_index.KeyIndex.get_key_index(search_path[:1])
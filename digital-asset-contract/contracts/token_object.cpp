@@ -64,6 +64,8 @@ contract_method_reference_t contract_method_dispatch_table[] = {
     CONTRACT_METHOD2(get_image_metadata, ww::digital_asset::token_object::get_image_metadata),
     CONTRACT_METHOD2(get_public_image, ww::digital_asset::token_object::get_public_image),
     CONTRACT_METHOD2(get_original_image, ww::digital_asset::token_object::get_original_image),
+    CONTRACT_METHOD2(get_image_region, ww::digital_asset::token_object::get_image_region),
+    CONTRACT_METHOD2(get_thumbnail, ww::digital_asset::token_object::get_thumbnail),
     CONTRACT_METHOD2(decode_original_image, ww::digital_asset::token_object::decode_original_image),
 
     // object transfer, escrow & claim methods
@@ -40,15 +40,36 @@
 static KeyValueStore image_store("image");
 static const std::string md_image_key("image");
 static const std::string md_image_hash_key("image_hash");
+static const std::string md_public_image_key("public_image");
+static const std::string md_thumbnail_key("thumbnail");
+static const std::string md_pyramid_levels_key("pyramid_levels");
+static const std::string md_level_width_key("level_width");
+static const std::string md_level_height_key("level_height");
+static const std::string md_tile_key("tile");
 static const std::string md_border_width_key("border_width");
 static const std::string transfer_key("_transfer_");
 
+// images returned to the client are split into chunks of this size so
+// that the client can retrieve and write them one chunk at a time
+static const size_t transfer_chunk_size = 1024 * 1024;
+
+// images are also stored as square tiles at each level of a pyramid
+// where every level is half the size of the one before; the pyramid
+// stops at the first level that fits in a single tile
+static const uint32_t tile_size = 256;
+static const uint32_t max_pyramid_levels = 8;
+
+// the largest number of tiles that a single region request may return
+static const uint32_t max_region_tiles = 64;
+
 static std::map<std::string, contract_method_t> initialize_capability_map(void)
 {
     std::map<std::string, contract_method_t> result;
     result["get_public_image"] = ww::digital_asset::guardian::get_public_image;
     result["get_original_image"] = ww::digital_asset::guardian::get_original_image;
     result["get_image_metadata"] = ww::digital_asset::guardian::get_image_metadata;
+    result["get_image_region"] = ww::digital_asset::guardian::get_image_region;
+    result["get_thumbnail"] = ww::digital_asset::guardian::get_thumbnail;
     return result;
 }
 
@@ -66,6 +87,20 @@ static bool get_public_border_width(uint32_t& border_width)
     return image_store.get(md_border_width_key, border_width);
 }
 
+// -----------------------------------------------------------------
+// indexed_key -- build the key "<base>_<index>" used for chunked transfers
+// -----------------------------------------------------------------
+static std::string indexed_key(const std::string& base, uint32_t index)
+{
+    std::string digits;
+    do {
+        digits.insert(digits.begin(), (char)('0' + (index % 10)));
+        index = index / 10;
+    } while (index > 0);
+
+    return base + "_" + digits;
+}
+
 // -----------------------------------------------------------------
 static bool set_image(const ww::types::ByteArray& image_data)
 {
@@ -103,6 +138,212 @@ static bool get_image(bitmap_image& image)
     return image.error_code_ == 0;
 }
 
+// -----------------------------------------------------------------
+// NAME: create_public_image
+//
+// Derive the public variant of the image; this is done once when the
+// guardian is initialized so that public image requests only need to
+// copy the stored result
+// -----------------------------------------------------------------
+static bool create_public_image(bitmap_image& image, ww::types::ByteArray& public_image_vector)
+{
+    image.convert_to_grayscale();
+    image.save_image(public_image_vector);
+    return image.error_code_ == 0;
+}
+
+// -----------------------------------------------------------------
+static bool save_public_image(const ww::types::ByteArray& public_image_vector)
+{
+    return image_store.set(md_public_image_key, public_image_vector);
+}
+
+// -----------------------------------------------------------------
+static bool load_public_image(ww::types::ByteArray& public_image_vector)
+{
+    return image_store.get(md_public_image_key, public_image_vector);
+}
+
+// -----------------------------------------------------------------
+static std::string tile_key(uint32_t level, uint32_t column, uint32_t row)
+{
+    return indexed_key(indexed_key(indexed_key(md_tile_key, level), column), row);
+}
+
+// -----------------------------------------------------------------
+// NAME: save_tiles
+//
+// Split one level of the pyramid into tiles of tile_size pixels, the
+// tiles in the last row and column may be smaller
+// -----------------------------------------------------------------
+static bool save_tiles(const bitmap_image& image, uint32_t level)
+{
+    if (! image_store.set(indexed_key(md_level_width_key, level), (uint32_t)image.width()))
+        return false;
+    if (! image_store.set(indexed_key(md_level_height_key, level), (uint32_t)image.height()))
+        return false;
+
+    for (uint32_t row = 0; row * tile_size < image.height(); row++)
+    {
+        for (uint32_t column = 0; column * tile_size < image.width(); column++)
+        {
+            const uint32_t x = column * tile_size;
+            const uint32_t y = row * tile_size;
+            const uint32_t width = std::min(tile_size, (uint32_t)image.width() - x);
+            const uint32_t height = std::min(tile_size, (uint32_t)image.height() - y);
+
+            bitmap_image tile;
+            if (! image.region(x, y, width, height, tile))
+                return false;
+
+            ww::types::ByteArray tile_vector;
+            tile.save_image(tile_vector);
+            if (! image_store.set(tile_key(level, column, row), tile_vector))
+                return false;
+        }
+    }
+
+    return true;
+}
+
+// -----------------------------------------------------------------
+// NAME: save_pyramid
+// -----------------------------------------------------------------
+static bool save_pyramid(const bitmap_image& image)
+{
+    bitmap_image level_image(image);
+
+    uint32_t levels = 0;
+    while (levels < max_pyramid_levels)
+    {
+        if (! save_tiles(level_image, levels))
+            return false;
+        levels++;
+
+        if (level_image.width() <= tile_size && level_image.height() <= tile_size)
+            break;
+
+        bitmap_image next_image;
+        level_image.subsample(next_image);
+        level_image = next_image;
+    }
+
+    return image_store.set(md_pyramid_levels_key, levels);
+}
+
+// -----------------------------------------------------------------
+// NAME: create_thumbnail
+// -----------------------------------------------------------------
+static bool create_thumbnail(const bitmap_image& image, ww::types::ByteArray& thumbnail_vector)
+{
+    bitmap_image thumbnail(image);
+    while (thumbnail.width() > tile_size || thumbnail.height() > tile_size)
+    {
+        bitmap_image next_image;
+        thumbnail.subsample(next_image);
+        thumbnail = next_image;
+    }
+
+    thumbnail.save_image(thumbnail_vector);
+    return thumbnail.error_code_ == 0;
+}
+
+// -----------------------------------------------------------------
+static bool encode_value(ww::value::Structure& result, const char* name, const ww::types::ByteArray& value)
+{
+    std::string encoded_value;
+    if (! ww::crypto::b64_encode(value, encoded_value))
+        return false;
+
+    const ww::value::String v(encoded_value.c_str());
+    return result.set_value(name, v);
+}
+
+// -----------------------------------------------------------------
+static bool number_value(ww::value::Structure& result, const char* name, const uint32_t value)
+{
+    const ww::value::Number v((double)value);
+    return result.set_value(name, v);
+}
+
+// -----------------------------------------------------------------
+// NAME: transfer_image
+//
+// Save the image data to a new key value store in chunks under the
+// keys <transfer_key>_<n> and package the information the client
+// needs to open the store and to verify the image it retrieves
+// -----------------------------------------------------------------
+static bool transfer_image(const ww::types::ByteArray& image_vector, Response& rsp)
+{
+    ww::types::ByteArray encryption_key;
+    ASSERT_SUCCESS(rsp, ww::crypto::aes::generate_key(encryption_key),
+                   "unexpected error: failed to create encryption key");
+
+    // Save it to the output store
+    int handle = KeyValueStore::create(encryption_key);
+    if (handle < 0)
+        return rsp.error("failed to create the key value store");
+
+    KeyValueStore output_store("", handle);
+
+    uint32_t transfer_chunks = 0;
+    for (size_t offset = 0; offset < image_vector.size(); offset += transfer_chunk_size)
+    {
+        const size_t chunk_end = std::min(offset + transfer_chunk_size, image_vector.size());
+        const ww::types::ByteArray chunk(image_vector.begin() + offset, image_vector.begin() + chunk_end);
+        ASSERT_SUCCESS(rsp, output_store.set(indexed_key(transfer_key, transfer_chunks), chunk),
+                       "unexpected error: failed to save value");
+        transfer_chunks++;
+    }
+
+    ww::types::ByteArray state_hash;
+    ASSERT_SUCCESS(rsp, output_store.finalize(handle, state_hash),
+                   "failed to close the output store");
+
+    ww::types::ByteArray transfer_hash;
+    ASSERT_SUCCESS(rsp, ww::crypto::crypto_hash(image_vector, transfer_hash),
+                   "unexpected error: failed to hash the image");
+
+    // Package the result
+    ww::value::Structure result(DAG_IMAGE_TRANSFER_SCHEMA);
+
+    {
+        const ww::value::String v(transfer_key.c_str());
+        result.set_value("transfer_key", v);
+    }
+
+    {
+        const ww::value::Number v((double)transfer_chunks);
+        result.set_value("transfer_chunks", v);
+    }
+
+    {
+        std::string encoded_hash;
+        ASSERT_SUCCESS(rsp, ww::crypto::b64_encode(transfer_hash, encoded_hash),
+                       "unexpected error: failed to encode hash");
+        const ww::value::String v(encoded_hash.c_str());
+        result.set_value("transfer_hash", v);
+    }
+
+    {
+        std::string encoded_encryption_key;
+        ASSERT_SUCCESS(rsp, ww::crypto::b64_encode(encryption_key, encoded_encryption_key),
+                       "unexpected error: failed to encode key");
+        const ww::value::String v(encoded_encryption_key.c_str());
+        result.set_value("encryption_key", v);
+    }
+
+    {
+        std::string encoded_hash;
+        ASSERT_SUCCESS(rsp, ww::crypto::b64_encode(state_hash, encoded_hash),
+                       "unexpected error: failed to encode hash");
+        const ww::value::String v(encoded_hash.c_str());
+        result.set_value("state_hash", v);
+    }
+
+    return rsp.value(result, false);
+}
+
 // -----------------------------------------------------------------
 // NAME: initialize_contract
 // -----------------------------------------------------------------
@@ -130,6 +371,7 @@ bool ww::digital_asset::guardian::initialize(const Message& msg, const Environme
     const std::string encoded_encryption_key(msg.get_string("encryption_key"));
     const std::string encoded_state_hash(msg.get_string("state_hash"));
     const std::string transfer_key(msg.get_string("transfer_key"));
+    const uint32_t transfer_chunks = (uint32_t)msg.get_number("transfer_chunks");
 
     ww::types::ByteArray encryption_key;
     ASSERT_SUCCESS(rsp, ww::crypto::b64_decode(encoded_encryption_key, encryption_key),
@@ -146,8 +388,23 @@ bool ww::digital_asset::guardian::initialize(const Message& msg, const Environme
     ww::types::ByteArray image_vector;
     KeyValueStore input_store("", handle);
 
-    ASSERT_SUCCESS(rsp, input_store.get(transfer_key, image_vector),
-                   "store does not contain a value");
+    // large images are transferred in chunks stored under the keys
+    // <transfer_key>_<n>, a chunk count of 0 means a single key
+    if (transfer_chunks == 0)
+    {
+        ASSERT_SUCCESS(rsp, input_store.get(transfer_key, image_vector),
+                       "store does not contain a value");
+    }
+    else
+    {
+        for (uint32_t chunk = 0; chunk < transfer_chunks; chunk++)
+        {
+            ww::types::ByteArray chunk_vector;
+            ASSERT_SUCCESS(rsp, input_store.get(indexed_key(transfer_key, chunk), chunk_vector),
+                           "store does not contain a value");
+            image_vector.insert(image_vector.end(), chunk_vector.begin(), chunk_vector.end());
+        }
+    }
 
     ww::types::ByteArray new_state_hash;
     ASSERT_SUCCESS(rsp, input_store.finalize(handle, new_state_hash),
@@ -162,6 +419,18 @@ bool ww::digital_asset::guardian::initialize(const Message& msg, const Environme
 
     ASSERT_SUCCESS(rsp, set_image(image_vector), "failed to store the image");
     ASSERT_SUCCESS(rsp, set_public_border_width(border_width), "failed to store the border width");
+    ASSERT_SUCCESS(rsp, save_pyramid(image), "failed to store the image tiles");
+
+    // the image is no longer needed after it is stored so the public
+    // variant is derived from it in place
+    ww::types::ByteArray public_image_vector;
+    ASSERT_SUCCESS(rsp, create_public_image(image, public_image_vector), "failed to create the public image");
+    ASSERT_SUCCESS(rsp, save_public_image(public_image_vector), "failed to store the public image");
+
+    // the thumbnail is derived from the public image since anyone may request it
+    ww::types::ByteArray thumbnail_vector;
+    ASSERT_SUCCESS(rsp, create_thumbnail(image, thumbnail_vector), "failed to create the thumbnail");
+    ASSERT_SUCCESS(rsp, image_store.set(md_thumbnail_key, thumbnail_vector), "failed to store the thumbnail");
 
     // Initialize the data guardian
     ww::value::Object guardian_message;
@@ -196,6 +465,13 @@ bool ww::digital_asset::guardian::get_image_metadata(const Message& msg, const E
     const ww::value::Number bw((double)border_width);
     v.set_value("public-border-width", bw);
 
+    uint32_t pyramid_levels;
+    ASSERT_SUCCESS(rsp, image_store.get(md_pyramid_levels_key, pyramid_levels), "failed to retrieve the pyramid levels");
+    const ww::value::Number ts((double)tile_size);
+    v.set_value("tile_size", ts);
+    const ww::value::Number pl((double)pyramid_levels);
+    v.set_value("pyramid_levels", pl);
+
     ww::types::ByteArray image_hash;
     ASSERT_SUCCESS(rsp, image_store.get(md_image_hash_key, image_hash), "failed to locate the image hash");
 
@@ -223,108 +499,120 @@ bool ww::digital_asset::guardian::get_original_image(const Message& msg, const E
         image.save_image(image_vector);
     }
 
-    ww::types::ByteArray encryption_key;
-    ASSERT_SUCCESS(rsp, ww::crypto::aes::generate_key(encryption_key),
-                   "unexpected error: failed to create encryption key");
-
-    // Save it to the output store
-    int handle = KeyValueStore::create(encryption_key);
-    if (handle < 0)
-        return rsp.error("failed to create the key value store");
-
-    KeyValueStore output_store("", handle);
-    ASSERT_SUCCESS(rsp, output_store.set(transfer_key, image_vector),
-                   "unexpected error: failed to save value");
-
-    ww::types::ByteArray state_hash;
-    ASSERT_SUCCESS(rsp, output_store.finalize(handle, state_hash),
-                   "failed to close the output store");
-
-    // Package the result
-    ww::value::Structure result(DAG_IMAGE_TRANSFER_SCHEMA);
-
-    {
-        const ww::value::String v(transfer_key.c_str());
-        result.set_value("transfer_key", v);
-    }
+    return transfer_image(image_vector, rsp);
+}
 
-    {
-        std::string encoded_encryption_key;
-        ASSERT_SUCCESS(rsp, ww::crypto::b64_encode(encryption_key, encoded_encryption_key),
-                       "unexpected error: failed to encode key");
-        const ww::value::String v(encoded_encryption_key.c_str());
-        result.set_value("encryption_key", v);
-    }
+// -----------------------------------------------------------------
+// -----------------------------------------------------------------
+bool ww::digital_asset::guardian::get_public_image(const Message& msg, const Environment& env, Response& rsp)
+{
+    ASSERT_INITIALIZED(rsp);
 
-    {
-        std::string encoded_hash;
-        ASSERT_SUCCESS(rsp, ww::crypto::b64_encode(state_hash, encoded_hash),
-                       "unexpected error: failed to encode hash");
-        const ww::value::String v(encoded_hash.c_str());
-        result.set_value("state_hash", v);
-    }
+    // the public image is computed when the guardian is initialized
+    ww::types::ByteArray image_vector;
+    ASSERT_SUCCESS(rsp, load_public_image(image_vector), "failed to retrieve the public image");
 
-    return rsp.value(result, false);
+    return transfer_image(image_vector, rsp);
 }
 
 // -----------------------------------------------------------------
+// NAME: get_image_region
+//
+// Return the tiles that cover a region of one level of the image
+// pyramid, coordinates are in the pixels of the requested level. The
+// tiles are saved in a new key value store under the keys
+// <transfer_key>_<column>_<row> so the client can assemble the region
+// and cache the tiles for later requests.
 // -----------------------------------------------------------------
-bool ww::digital_asset::guardian::get_public_image(const Message& msg, const Environment& env, Response& rsp)
+bool ww::digital_asset::guardian::get_image_region(const Message& msg, const Environment& env, Response& rsp)
 {
     ASSERT_INITIALIZED(rsp);
 
-    ww::types::ByteArray image_vector;
+    ASSERT_SUCCESS(rsp, msg.validate_schema(DAG_IMAGE_REGION_PARAM_SCHEMA),
+                   "invalid request, missing required parameters");
 
-    {
-        // Get the image
-        bitmap_image image;
-        ASSERT_SUCCESS(rsp, get_image(image), "failed to retrieve the image");
-        image.convert_to_grayscale();
-        image.save_image(image_vector);
-    }
+    const uint32_t level = (uint32_t)msg.get_number("level");
+    const uint32_t x = (uint32_t)msg.get_number("x");
+    const uint32_t y = (uint32_t)msg.get_number("y");
+    const uint32_t width = (uint32_t)msg.get_number("width");
+    const uint32_t height = (uint32_t)msg.get_number("height");
+
+    uint32_t pyramid_levels;
+    ASSERT_SUCCESS(rsp, image_store.get(md_pyramid_levels_key, pyramid_levels), "failed to retrieve the pyramid levels");
+    ASSERT_SUCCESS(rsp, level < pyramid_levels, "invalid pyramid level");
+
+    uint32_t level_width, level_height;
+    ASSERT_SUCCESS(rsp, image_store.get(indexed_key(md_level_width_key, level), level_width),
+                   "failed to retrieve the level width");
+    ASSERT_SUCCESS(rsp, image_store.get(indexed_key(md_level_height_key, level), level_height),
+                   "failed to retrieve the level height");
+
+    ASSERT_SUCCESS(rsp, 0 < width && 0 < height, "region must not be empty");
+    ASSERT_SUCCESS(rsp, x < level_width && width <= level_width - x, "invalid region width");
+    ASSERT_SUCCESS(rsp, y < level_height && height <= level_height - y, "invalid region height");
+
+    const uint32_t first_column = x / tile_size;
+    const uint32_t first_row = y / tile_size;
+    const uint32_t columns = (x + width - 1) / tile_size - first_column + 1;
+    const uint32_t rows = (y + height - 1) / tile_size - first_row + 1;
+    ASSERT_SUCCESS(rsp, columns * rows <= max_region_tiles, "region too large");
 
     ww::types::ByteArray encryption_key;
     ASSERT_SUCCESS(rsp, ww::crypto::aes::generate_key(encryption_key),
                    "unexpected error: failed to create encryption key");
 
-    // Save it to the output store
     int handle = KeyValueStore::create(encryption_key);
     if (handle < 0)
         return rsp.error("failed to create the key value store");
 
     KeyValueStore output_store("", handle);
-    ASSERT_SUCCESS(rsp, output_store.set(transfer_key, image_vector),
-                   "unexpected error: failed to save value");
+
+    for (uint32_t row = first_row; row < first_row + rows; row++)
+    {
+        for (uint32_t column = first_column; column < first_column + columns; column++)
+        {
+            ww::types::ByteArray tile_vector;
+            ASSERT_SUCCESS(rsp, image_store.get(tile_key(level, column, row), tile_vector),
+                           "failed to retrieve the tile");
+            ASSERT_SUCCESS(rsp, output_store.set(indexed_key(indexed_key(transfer_key, column), row), tile_vector),
+                           "unexpected error: failed to save value");
+        }
+    }
 
     ww::types::ByteArray state_hash;
     ASSERT_SUCCESS(rsp, output_store.finalize(handle, state_hash),
                    "failed to close the output store");
 
     // Package the result
-    ww::value::Structure result(DAG_IMAGE_TRANSFER_SCHEMA);
+    ww::value::Structure result(DAG_IMAGE_REGION_SCHEMA);
+
+    const ww::value::String tk(transfer_key.c_str());
+    ASSERT_SUCCESS(rsp, result.set_value("transfer_key", tk), "unexpected error: failed to set value");
+    ASSERT_SUCCESS(rsp, encode_value(result, "encryption_key", encryption_key), "failed to encode key");
+    ASSERT_SUCCESS(rsp, encode_value(result, "state_hash", state_hash), "failed to encode hash");
+    ASSERT_SUCCESS(rsp, number_value(result, "tile_size", tile_size), "unexpected error: failed to set value");
+    ASSERT_SUCCESS(rsp, number_value(result, "level", level), "unexpected error: failed to set value");
+    ASSERT_SUCCESS(rsp, number_value(result, "level_width", level_width), "unexpected error: failed to set value");
+    ASSERT_SUCCESS(rsp, number_value(result, "level_height", level_height), "unexpected error: failed to set value");
+    ASSERT_SUCCESS(rsp, number_value(result, "first_column", first_column), "unexpected error: failed to set value");
+    ASSERT_SUCCESS(rsp, number_value(result, "first_row", first_row), "unexpected error: failed to set value");
+    ASSERT_SUCCESS(rsp, number_value(result, "columns", columns), "unexpected error: failed to set value");
+    ASSERT_SUCCESS(rsp, number_value(result, "rows", rows), "unexpected error: failed to set value");
 
-    {
-        const ww::value::String v(transfer_key.c_str());
-        result.set_value("transfer_key", v);
-    }
+    return rsp.value(result, false);
+}
 
-    {
-        std::string encoded_encryption_key;
-        ASSERT_SUCCESS(rsp, ww::crypto::b64_encode(encryption_key, encoded_encryption_key),
-                       "unexpected error: failed to encode key");
-        const ww::value::String v(encoded_encryption_key.c_str());
-        result.set_value("encryption_key", v);
-    }
+// -----------------------------------------------------------------
+// -----------------------------------------------------------------
+bool ww::digital_asset::guardian::get_thumbnail(const Message& msg, const Environment& env, Response& rsp)
+{
+    ASSERT_INITIALIZED(rsp);
 
-    {
-        std::string encoded_hash;
-        ASSERT_SUCCESS(rsp, ww::crypto::b64_encode(state_hash, encoded_hash),
-                       "unexpected error: failed to encode hash");
-        const ww::value::String v(encoded_hash.c_str());
-        result.set_value("state_hash", v);
-    }
+    // the thumbnail is computed when the guardian is initialized
+    ww::types::ByteArray image_vector;
+    ASSERT_SUCCESS(rsp, image_store.get(md_thumbnail_key, image_vector), "failed to retrieve the thumbnail");
 
-    return rsp.value(result, false);
+    return transfer_image(image_vector, rsp);
 }
 
 // -----------------------------------------------------------------
@@ -32,6 +32,7 @@
 #include "contract/attestation.h"
 #include "exchange/issuer_authority_base.h"
 #include "exchange/token_object.h"
+#include "digital_asset/guardian.h"
 #include "digital_asset/token_object.h"
 
 // -----------------------------------------------------------------
@@ -91,6 +92,60 @@ bool ww::digital_asset::token_object::get_original_image(const Message& msg, con
     return rsp.value(result, false);
 }
 
+// -----------------------------------------------------------------
+// METHOD: get_image_region
+//
+// Generate a capability for the tiles that cover a region of one level
+// of the image pyramid; the region is signed into the capability
+// -----------------------------------------------------------------
+bool ww::digital_asset::token_object::get_image_region(const Message& msg, const Environment& env, Response& rsp)
+{
+    // Only the owner may get regions of the original image
+    ASSERT_SENDER_IS_OWNER(env, rsp);
+    ASSERT_INITIALIZED(rsp);
+
+    ASSERT_SUCCESS(rsp, msg.validate_schema(DAG_IMAGE_REGION_PARAM_SCHEMA),
+                   "invalid request, missing required parameters");
+
+    const uint32_t width = (uint32_t)msg.get_number("width");
+    const uint32_t height = (uint32_t)msg.get_number("height");
+    ASSERT_SUCCESS(rsp, 0 < width && 0 < height, "region must not be empty");
+
+    ww::value::Structure params(DAG_IMAGE_REGION_PARAM_SCHEMA);
+    ASSERT_SUCCESS(rsp, params.set_number("level", msg.get_number("level")),
+                   "unexpected error: failed to store parameter");
+    ASSERT_SUCCESS(rsp, params.set_number("x", msg.get_number("x")),
+                   "unexpected error: failed to store parameter");
+    ASSERT_SUCCESS(rsp, params.set_number("y", msg.get_number("y")),
+                   "unexpected error: failed to store parameter");
+    ASSERT_SUCCESS(rsp, params.set_number("width", width),
+                   "unexpected error: failed to store parameter");
+    ASSERT_SUCCESS(rsp, params.set_number("height", height),
+                   "unexpected error: failed to store parameter");
+
+    ww::value::Object result;
+    ASSERT_SUCCESS(rsp, ww::exchange::token_object::create_operation_package("get_image_region", params, result),
+                   "unexpected error: failed to generate capability");
+
+    return rsp.value(result, false);
+}
+
+// -----------------------------------------------------------------
+// METHOD: get_thumbnail
+// -----------------------------------------------------------------
+bool ww::digital_asset::token_object::get_thumbnail(const Message& msg, const Environment& env, Response& rsp)
+{
+    // Anyone is allowed to get the thumbnail, it is derived from the public image
+    ASSERT_INITIALIZED(rsp);
+
+    ww::value::Object params;
+    ww::value::Object result;
+    ASSERT_SUCCESS(rsp, ww::exchange::token_object::create_operation_package("get_thumbnail", params, result),
+                   "unexpected error: failed to generate capability");
+
+    return rsp.value(result, false);
+}
+
 // -----------------------------------------------------------------
 // METHOD: decode_original_image
 // -----------------------------------------------------------------
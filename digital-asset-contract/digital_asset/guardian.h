@@ -31,6 +31,7 @@
         SCHEMA_KW(encryption_key, "") ","                       \
         SCHEMA_KW(state_hash, "") ","                           \
         SCHEMA_KW(transfer_key, "") ","                         \
+        SCHEMA_KW(transfer_chunks, 0) ","                       \
         SCHEMA_KWS(guardian, DG_INITIALIZE_PARAM_SCHEMA)        \
     "}"
 
@@ -38,7 +39,33 @@
     "{"                                         \
         SCHEMA_KW(encryption_key, "") ","       \
         SCHEMA_KW(state_hash, "") ","           \
-        SCHEMA_KW(transfer_key, "")             \
+        SCHEMA_KW(transfer_key, "") ","         \
+        SCHEMA_KW(transfer_chunks, 0) ","       \
+        SCHEMA_KW(transfer_hash, "")            \
+    "}"
+
+#define DAG_IMAGE_REGION_PARAM_SCHEMA           \
+    "{"                                         \
+        SCHEMA_KW(level, 0) ","                 \
+        SCHEMA_KW(x, 0) ","                     \
+        SCHEMA_KW(y, 0) ","                     \
+        SCHEMA_KW(width, 0) ","                 \
+        SCHEMA_KW(height, 0)                    \
+    "}"
+
+#define DAG_IMAGE_REGION_SCHEMA                 \
+    "{"                                         \
+        SCHEMA_KW(encryption_key, "") ","       \
+        SCHEMA_KW(state_hash, "") ","           \
+        SCHEMA_KW(transfer_key, "") ","         \
+        SCHEMA_KW(tile_size, 0) ","             \
+        SCHEMA_KW(level, 0) ","                 \
+        SCHEMA_KW(level_width, 0) ","           \
+        SCHEMA_KW(level_height, 0) ","          \
+        SCHEMA_KW(first_column, 0) ","          \
+        SCHEMA_KW(first_row, 0) ","             \
+        SCHEMA_KW(columns, 0) ","               \
+        SCHEMA_KW(rows, 0)                      \
     "}"
 
 #define DAG_IMAGE_METADATA_SCHEMA               \
@@ -47,6 +74,8 @@
         SCHEMA_KW(height, 0) ","                \
         SCHEMA_KW(byte-per-pixel, 0) ","        \
         SCHEMA_KW(public-border-width, 0) ","   \
+        SCHEMA_KW(tile_size, 0) ","             \
+        SCHEMA_KW(pyramid_levels, 0) ","        \
         SCHEMA_KW(image_hash, "")               \
     "}"
 
@@ -66,6 +95,8 @@ namespace guardian
     bool get_public_image(const Message& msg, const Environment& env, Response& rsp);
     bool get_original_image(const Message& msg, const Environment& env, Response& rsp);
     bool get_image_metadata(const Message& msg, const Environment& env, Response& rsp);
+    bool get_image_region(const Message& msg, const Environment& env, Response& rsp);
+    bool get_thumbnail(const Message& msg, const Environment& env, Response& rsp);
 } /* guardian */
 } /* digital asset */
 } /* ww
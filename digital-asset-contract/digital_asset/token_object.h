@@ -32,6 +32,8 @@ namespace token_object
     bool get_image_metadata(const Message& msg, const Environment& env, Response& rsp);
     bool get_public_image(const Message& msg, const Environment& env, Response& rsp);
     bool get_original_image(const Message& msg, const Environment& env, Response& rsp);
+    bool get_image_region(const Message& msg, const Environment& env, Response& rsp);
+    bool get_thumbnail(const Message& msg, const Environment& env, Response& rsp);
     bool decode_original_image(const Message& msg, const Environment& env, Response& rsp);
 }; /* token_object */
 }; /* digital_asset */
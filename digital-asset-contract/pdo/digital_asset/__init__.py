@@ -12,4 +12,4 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-__all__ = [ 'jupyter', 'plugins', 'resources', 'scripts' ]
+__all__ = [ 'common', 'jupyter', 'plugins', 'resources', 'scripts' ]
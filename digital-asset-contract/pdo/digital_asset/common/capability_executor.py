@@ -0,0 +1,176 @@
+# Copyright 2022 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This file defines the CapabilityExecutor class that runs capability
+operations against a digital asset guardian. Every operation takes two
+contract invocations: the token object mints a capability and the data
+guardian processes it. Executors are kept in a small bounded cache keyed
+by the data directory, the guardian save file and the client identity, so
+the guardian session, its eservice client and the worker pool are reused
+across operations. For a batch of requests the executor mints the
+capability for the next token while the guardian is still processing the
+current one; the number of concurrent requests is chosen per call.
+"""
+
+import collections
+import json
+import threading
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from pdo.contract import invocation_request
+
+import pdo.client.builder as pbuilder
+import pdo.client.commands.contract as pcontract_cmd
+from pdo.client.commands.eservice import get_eservice_from_contract
+
+import logging
+logger = logging.getLogger(__name__)
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class CapabilityExecutor(object) :
+
+    __lock__ = threading.Lock()
+    __executors__ = collections.OrderedDict()
+    __executor_cache_size__ = 16
+    __eservice_clients__ = collections.OrderedDict()
+    __eservice_cache_size__ = 32
+
+    default_parallelism = 4
+
+    # -----------------------------------------------------------------
+    def __init__(self, state, data_guardian, max_workers = 16) :
+        self.state = state
+        self.max_workers = max(1, max_workers)
+        self.guardian_session = pbuilder.SessionParameters(save_file=data_guardian)
+        self.__pool__ = ThreadPoolExecutor(max_workers=self.max_workers)
+
+    # -----------------------------------------------------------------
+    @classmethod
+    def get_executor(cls, state, data_guardian) :
+        """Return the shared executor for the guardian save file and the client identity
+
+        Save files are resolved relative to the data directory of the
+        client configuration, so the data directory is part of the key.
+        """
+        key = (state.get(['Contract', 'DataDirectory']), data_guardian, state.identity)
+        with cls.__lock__ :
+            executor = cls.__executors__.get(key)
+            if executor is not None :
+                cls.__executors__.move_to_end(key)
+                return executor
+
+            executor = cls(state, data_guardian)
+            cls.__executors__[key] = executor
+            # an evicted executor may still be in use, its idle workers exit
+            # once it is no longer referenced
+            while len(cls.__executors__) > cls.__executor_cache_size__ :
+                cls.__executors__.popitem(last=False)
+
+        return executor
+
+    # -----------------------------------------------------------------
+    @property
+    def eservice_client(self) :
+        """The eservice client for the guardian, used to retrieve the stores it returns
+        """
+        # save files are resolved relative to the data directory of the client configuration
+        session = self.guardian_session
+        key = (self.state.get(['Contract', 'DataDirectory']), session.save_file, session.eservice_url)
+        with self.__lock__ :
+            eservice_client = self.__eservice_clients__.get(key)
+            if eservice_client is not None :
+                self.__eservice_clients__.move_to_end(key)
+                return eservice_client
+
+        eservice_client = get_eservice_from_contract(self.state, session.save_file, session.eservice_url)
+        if not eservice_client :
+            raise Exception('unknown eservice {}'.format(session.eservice_url))
+
+        with self.__lock__ :
+            self.__eservice_clients__[key] = eservice_client
+            while len(self.__eservice_clients__) > self.__eservice_cache_size__ :
+                self.__eservice_clients__.popitem(last=False)
+
+        return eservice_client
+
+    # -----------------------------------------------------------------
+    def create_capability(self, session_params, method, params, log_invocation = None) :
+        """Ask the token object to mint a capability for a guardian method
+        """
+        message = invocation_request(method, **params)
+        capability = pcontract_cmd.send_to_contract(self.state, message, **session_params)
+        if log_invocation :
+            log_invocation(message, capability)
+
+        return capability
+
+    # -----------------------------------------------------------------
+    def process_capability(self, capability, log_invocation = None) :
+        """Send a capability minted by a token object to the guardian
+        """
+        params = json.loads(capability)
+        message = invocation_request('process_capability', **params)
+        result = pcontract_cmd.send_to_contract(self.state, message, **self.guardian_session)
+        if log_invocation :
+            log_invocation(message, result)
+
+        return result
+
+    # -----------------------------------------------------------------
+    def execute(self, session_params, method, params = {}, log_invocation = None) :
+        """Mint a capability with the token object and process it with the guardian
+        """
+        capability = self.create_capability(session_params, method, params, log_invocation)
+        return self.process_capability(capability, log_invocation)
+
+    # -----------------------------------------------------------------
+    def execute_many(self, requests, log_invocation = None, parallelism = None) :
+        """Execute a batch of capability operations with overlapped invocations
+
+        Each request mints its capability and sends it to the guardian on
+        the shared worker pool; while one request waits for the guardian
+        the next one is minting its capability. At most parallelism
+        requests from this call run at a time, bounded by the size of the
+        pool, so concurrent callers do not change each other's concurrency.
+
+        :param requests: list of (session_params, method, params) tuples
+        :param parallelism: number of concurrent requests, defaults to default_parallelism
+        :return: list of guardian results in the same order as the requests
+        """
+        requests = list(requests)
+        limit = max(1, parallelism or self.default_parallelism)
+
+        results = [ None ] * len(requests)
+        running = {}
+        next_request = 0
+        while next_request < len(requests) or running :
+            while next_request < len(requests) and len(running) < limit :
+                (session_params, method, params) = requests[next_request]
+                future = self.__pool__.submit(self.execute, session_params, method, params, log_invocation)
+                running[future] = next_request
+                next_request += 1
+
+            (done, _) = wait(running, return_when=FIRST_COMPLETED)
+            for future in done :
+                index = running.pop(future)
+                try :
+                    results[index] = future.result()
+                except Exception :
+                    wait(running)
+                    raise
+
+        return results
@@ -0,0 +1,285 @@
+# Copyright 2022 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This file defines the TileCache class that keeps the image tiles returned
+by a digital asset guardian on the local disk. Guardian images cannot
+change once the guardian is initialized, so cached tiles never need to be
+refreshed; a region request only has to fetch the tiles that are not
+already in the cache. The cache also assembles regions from the tiles,
+tiles are 24-bit uncompressed bitmaps.
+
+Tiles are decrypted pixels that only the owner of the token may see. The
+cache is kept per guardian and requesting identity in a directory that
+only the current user can read, and callers must confirm that the
+identity is still authorized (the token object mints a capability only
+for its owner) before serving a region from the cache.
+"""
+
+import hashlib
+import json
+import math
+import os
+import struct
+
+import logging
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------------------------------
+def read_bitmap(data) :
+    """Decode a 24-bit uncompressed bitmap
+
+    :param data: the encoded bitmap
+    :return: tuple (width, height, rows) where rows lists the pixel rows from the top
+    """
+    data = bytes(data)
+    if len(data) < 54 or data[0:2] != b'BM' :
+        raise ValueError('invalid bitmap')
+
+    (offset,) = struct.unpack_from('<I', data, 10)
+    (width, height, _, bit_count) = struct.unpack_from('<iiHH', data, 18)
+    if bit_count != 24 :
+        raise ValueError('unsupported bitmap depth {}'.format(bit_count))
+
+    row_size = width * 3
+    row_stride = (row_size + 3) & ~3
+    rows = [ data[offset + r * row_stride : offset + r * row_stride + row_size] for r in range(abs(height)) ]
+
+    # rows are stored from the bottom unless the height is negative
+    if height > 0 :
+        rows.reverse()
+
+    return (width, abs(height), rows)
+
+# -----------------------------------------------------------------
+def write_bitmap(width, height, rows) :
+    """Encode pixel rows, listed from the top, as a 24-bit uncompressed bitmap
+    """
+    row_stride = (width * 3 + 3) & ~3
+    padding = b'\0' * (row_stride - width * 3)
+    image_size = row_stride * height
+
+    header = struct.pack('<2sIHHI', b'BM', 54 + image_size, 0, 0, 54)
+    header += struct.pack('<IiiHHIIiiII', 40, width, height, 1, 24, 0, image_size, 0, 0, 0, 0)
+
+    return header + b''.join(row + padding for row in reversed(rows))
+
+# -----------------------------------------------------------------
+def split_region(tile_size, x, y, width, height, max_tiles) :
+    """Split a region into regions that are each covered by at most max_tiles tiles
+
+    The regions are aligned to the tile grid so that no tile is covered
+    by more than one of them.
+
+    :return: list of (x, y, width, height) tuples
+    """
+    first_column = x // tile_size
+    first_row = y // tile_size
+    columns = (x + width - 1) // tile_size - first_column + 1
+    rows = (y + height - 1) // tile_size - first_row + 1
+
+    column_step = min(columns, max(1, math.isqrt(max_tiles)))
+    row_step = max(1, max_tiles // column_step)
+
+    regions = []
+    for row in range(first_row, first_row + rows, row_step) :
+        top = max(y, row * tile_size)
+        bottom = min(y + height, (row + row_step) * tile_size)
+        for column in range(first_column, first_column + columns, column_step) :
+            left = max(x, column * tile_size)
+            right = min(x + width, (column + column_step) * tile_size)
+            regions.append((left, top, right - left, bottom - top))
+
+    return regions
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class TileCache(object) :
+
+    # -----------------------------------------------------------------
+    def __init__(self, cache_directory, guardian_id, identity, max_tiles = 4096) :
+        # guardian identifiers are base64 encoded and may contain '/'
+        cache_hash = hashlib.sha256('{}:{}'.format(guardian_id, identity).encode('utf8')).hexdigest()[:32]
+        self.cache_directory = os.path.join(cache_directory, cache_hash)
+        self.max_tiles = max_tiles
+
+        os.makedirs(self.cache_directory, mode=0o700, exist_ok=True)
+        os.chmod(self.cache_directory, 0o700)
+
+        self.__index_file__ = os.path.join(self.cache_directory, 'index.json')
+        try :
+            with open(self.__index_file__, 'r') as fp :
+                self.__index__ = json.load(fp)
+        except (OSError, ValueError) :
+            self.__index__ = { 'tile_size' : 0, 'levels' : {} }
+
+    # -----------------------------------------------------------------
+    @classmethod
+    def create(cls, state, guardian_id, identity) :
+        """Create a cache for the guardian and identity in the tile cache directory of the client configuration
+        """
+        cache_directory = state.get(['Contract', 'TileCacheDirectory'], None)
+        if cache_directory is None :
+            cache_directory = os.path.join(state.get(['Contract', 'DataDirectory']), '__tile_cache__')
+        return cls(cache_directory, guardian_id, identity)
+
+    # -----------------------------------------------------------------
+    @staticmethod
+    def __write_private__(filename, data) :
+        """Write a file that only the current user can read
+        """
+        fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as fp :
+            fp.write(data)
+
+    # -----------------------------------------------------------------
+    @property
+    def tile_size(self) :
+        return self.__index__['tile_size']
+
+    # -----------------------------------------------------------------
+    def level_size(self, level) :
+        """Return the (width, height) of a pyramid level or None if it is not known
+        """
+        size = self.__index__['levels'].get(str(level))
+        return tuple(size) if size else None
+
+    # -----------------------------------------------------------------
+    def set_level(self, tile_size, level, width, height) :
+        """Record the tile size and the dimensions of a pyramid level reported by the guardian
+        """
+        if self.__index__['tile_size'] != tile_size :
+            self.__index__ = { 'tile_size' : tile_size, 'levels' : {} }
+        self.__index__['levels'][str(level)] = [width, height]
+
+        self.__write_private__(self.__index_file__, json.dumps(self.__index__).encode('utf8'))
+
+    # -----------------------------------------------------------------
+    def __tile_file__(self, level, column, row) :
+        return os.path.join(self.cache_directory, 'tile_{}_{}_{}.bmp'.format(level, column, row))
+
+    # -----------------------------------------------------------------
+    def get(self, level, column, row) :
+        try :
+            with open(self.__tile_file__(level, column, row), 'rb') as fp :
+                return fp.read()
+        except OSError :
+            return None
+
+    # -----------------------------------------------------------------
+    def put(self, level, column, row, tile) :
+        tile_file = self.__tile_file__(level, column, row)
+        self.__write_private__(tile_file + '.partial', bytes(tile))
+        os.replace(tile_file + '.partial', tile_file)
+
+    # -----------------------------------------------------------------
+    def tiles(self, level, x, y, width, height) :
+        """Return the (column, row) of the tiles that cover a region
+
+        Returns None if the tile size is not known yet.
+        """
+        tile_size = self.tile_size
+        if tile_size == 0 :
+            return None
+
+        columns = range(x // tile_size, (x + width - 1) // tile_size + 1)
+        rows = range(y // tile_size, (y + height - 1) // tile_size + 1)
+        return [ (c, r) for r in rows for c in columns ]
+
+    # -----------------------------------------------------------------
+    def missing_region(self, level, x, y, width, height) :
+        """Return the smallest region whose tiles cover all uncached tiles of a region
+
+        Returns the region itself if the layout of the level is not known
+        yet, and None if every tile is cached.
+        """
+        tiles = self.tiles(level, x, y, width, height)
+        if tiles is None or self.level_size(level) is None :
+            return (x, y, width, height)
+
+        missing = [ (c, r) for (c, r) in tiles if not os.path.exists(self.__tile_file__(level, c, r)) ]
+        if not missing :
+            return None
+
+        tile_size = self.tile_size
+        (level_width, level_height) = self.level_size(level)
+        min_x = min(c for (c, r) in missing) * tile_size
+        min_y = min(r for (c, r) in missing) * tile_size
+        max_x = min(level_width, (max(c for (c, r) in missing) + 1) * tile_size)
+        max_y = min(level_height, (max(r for (c, r) in missing) + 1) * tile_size)
+        return (min_x, min_y, max_x - min_x, max_y - min_y)
+
+    # -----------------------------------------------------------------
+    def missing_regions(self, level, x, y, width, height, max_tiles, tile_size = None) :
+        """Return the regions to request so that every tile of a region is cached
+
+        The smallest region that covers the uncached tiles is split into
+        regions of at most max_tiles tiles, and regions whose tiles are all
+        cached are dropped. tile_size is used when the cache does not know
+        the tile size yet.
+        """
+        region = self.missing_region(level, x, y, width, height)
+        if region is None :
+            return []
+
+        tile_size = self.tile_size or tile_size
+        if not tile_size :
+            return [region]
+
+        regions = split_region(tile_size, *region, max_tiles)
+        return [ r for r in regions if self.missing_region(level, *r) is not None ]
+
+    # -----------------------------------------------------------------
+    def compose_region(self, level, x, y, width, height) :
+        """Assemble a region from the cached tiles and return it as an encoded bitmap
+        """
+        tile_size = self.tile_size
+        rows = [ bytearray(width * 3) for _ in range(height) ]
+
+        for (column, row) in self.tiles(level, x, y, width, height) :
+            tile = self.get(level, column, row)
+            if tile is None :
+                raise ValueError('missing tile {} {} at level {}'.format(column, row, level))
+
+            (tile_width, tile_height, tile_rows) = read_bitmap(tile)
+            tile_x = column * tile_size
+            tile_y = row * tile_size
+
+            # intersection of the tile with the region in image coordinates
+            left = max(x, tile_x)
+            right = min(x + width, tile_x + tile_width)
+            top = max(y, tile_y)
+            bottom = min(y + height, tile_y + tile_height)
+
+            for image_y in range(top, bottom) :
+                source = tile_rows[image_y - tile_y][(left - tile_x) * 3 : (right - tile_x) * 3]
+                rows[image_y - y][(left - x) * 3 : (right - x) * 3] = source
+
+        return write_bitmap(width, height, [ bytes(r) for r in rows ])
+
+    # -----------------------------------------------------------------
+    def prune(self) :
+        """Remove the least recently written tiles when the cache holds more than max_tiles
+        """
+        tile_files = [ os.path.join(self.cache_directory, f) for f in os.listdir(self.cache_directory) if f.endswith('.bmp') ]
+        if len(tile_files) <= self.max_tiles :
+            return 0
+
+        tile_files.sort(key=os.path.getmtime)
+        expired = tile_files[:len(tile_files) - self.max_tiles]
+        for tile_file in expired :
+            os.remove(tile_file)
+
+        logger.debug('removed %d tiles from %s', len(expired), self.cache_directory)
+        return len(expired)
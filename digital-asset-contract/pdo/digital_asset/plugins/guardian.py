@@ -18,7 +18,7 @@ import pdo.common.crypto as pcrypto
 from pdo.common.key_value import KeyValueStore
 from pdo.contract import ContractCode
 from pdo.contract import invocation_request
-from pdo.submitter.create import create_submitter
+from pdo.contracts.guardian.common import block_transfer
 
 import pdo.client.builder as pbuilder
 import pdo.client.builder.command as pcommand
@@ -27,6 +27,7 @@ import pdo.client.builder.shell as pshell
 import pdo.client.commands.contract as pcontract_cmd
 from pdo.client.commands.eservice import get_eservice_from_contract
 
+import pdo.exchange.common.ledger as ledger
 import pdo.exchange.plugins.guardian as guardian_base
 
 logger = logging.getLogger(__name__)
@@ -51,6 +52,11 @@ __all__ = [
 
 logger = logging.getLogger(__name__)
 
+# size of the chunks used to move an image into the transfer store; only
+# one chunk is held in memory at a time so large images can be ingested
+# with a small, constant amount of memory
+__transfer_chunk_size__ = 1024 * 1024
+
 ## -----------------------------------------------------------------
 ## inherited operations
 ## -----------------------------------------------------------------
@@ -98,9 +104,14 @@ class op_initialize(pcontract.contract_op_base) :
             '-b', '--border',
             help="size of the hidden border for public images",
             type=int, default=5)
+        parser.add_argument(
+            '--chunk-size',
+            help="size of the chunks used to transfer the image",
+            type=int, default=__transfer_chunk_size__)
 
     @classmethod
-    def invoke(cls, state, session_params, code_hash, token_issuer_code, ledger_key, image, border, **kwargs) :
+    def invoke(cls, state, session_params, code_hash, token_issuer_code, ledger_key, image, border,
+               chunk_size=__transfer_chunk_size__, **kwargs) :
         session_params['commit'] = True
 
         gparams = {}
@@ -120,24 +131,32 @@ class op_initialize(pcontract.contract_op_base) :
         else :
             raise ValueError("missing required parameter; must specify verifying key")
 
-        # prepare a local KV store that we can use to pass the image
-        with open(image, 'rb') as fp:
-            image_data = fp.read()
+        if chunk_size <= 0 :
+            raise ValueError("chunk size must be a positive integer")
 
+        # prepare a local KV store that we can use to pass the image, the
+        # image is copied in chunks under the keys <transfer_key>_<n>
         transfer_key = '_transfer_'
+        transfer_chunks = 0
 
         kv = KeyValueStore()
-        with kv :
-            encoded_key = KeyValueStore.input_encoding_conversion['str'](transfer_key)
-            encoded_image_data = tuple(image_data)
-            kv.set(encoded_key, encoded_image_data, input_encoding='raw', output_encoding='raw')
+        with open(image, 'rb') as fp, kv :
+            while True :
+                chunk = fp.read(chunk_size)
+                if not chunk :
+                    break
+                kv.set('{}_{}'.format(transfer_key, transfer_chunks), chunk, input_encoding='str', output_encoding='raw')
+                transfer_chunks += 1
+
+        if transfer_chunks == 0 :
+            raise ValueError("empty image file {}".format(image))
 
         # push the blocks to the eservice so the server can open the store
         eservice_client = get_eservice_from_contract(state, session_params.save_file, session_params.eservice_url)
         if not eservice_client :
             raise Exception('unknown eservice {}'.format(session_params.eservice_url))
 
-        _ = kv.sync_to_block_store(eservice_client)
+        _ = block_transfer.sync_to_block_store(kv, eservice_client)
 
         params = {}
         params['guardian'] = gparams
@@ -145,6 +164,7 @@ class op_initialize(pcontract.contract_op_base) :
         params['encryption_key'] = kv.encryption_key
         params['state_hash'] = kv.hash_identity
         params['transfer_key'] = transfer_key
+        params['transfer_chunks'] = transfer_chunks
 
         message = invocation_request('initialize', **params)
         result = pcontract_cmd.send_to_contract(state, message, **session_params)
@@ -189,8 +209,7 @@ class cmd_create_guardian(pcommand.contract_command_base) :
             border = int(context['image_border']) or 10
 
         # need the ledger key as the root of trust for binding to the issuer
-        ledger_submitter = create_submitter(state.get(['Ledger']))
-        ledger_key = ledger_submitter.get_ledger_info()
+        ledger_key = ledger.get_ledger_access(state).ledger_key
 
         # create the guardian contract
         save_file = pcontract_cmd.create_contract_from_context(state, context, 'da_guardian', **kwargs)
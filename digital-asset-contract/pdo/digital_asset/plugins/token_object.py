@@ -12,18 +12,22 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import base64
+import hashlib
 import json
 import logging
+import os
 
 from pdo.common.key_value import KeyValueStore
-from pdo.contract import invocation_request
 
 import pdo.client.builder as pbuilder
 import pdo.client.builder.command as pcommand
 import pdo.client.builder.contract as pcontract
 import pdo.client.builder.shell as pshell
 import pdo.client.commands.contract as pcontract_cmd
-from pdo.client.commands.eservice import get_eservice_from_contract
+from pdo.contracts.guardian.common import block_transfer
+from pdo.digital_asset.common.capability_executor import CapabilityExecutor
+from pdo.digital_asset.common.tile_cache import TileCache
 
 import pdo.exchange.plugins.token_object as token_object
 
@@ -33,6 +37,8 @@ __all__ = [
     'op_get_image_metadata',
     'op_get_public_image',
     'op_get_original_image',
+    'op_get_image_region',
+    'op_get_thumbnail',
     'op_initialize',
     'op_get_verifying_key',
     'op_get_contract_metadata',
@@ -49,6 +55,9 @@ __all__ = [
     'cmd_get_image_metadata',
     'cmd_get_public_image',
     'cmd_get_original_image',
+    'cmd_get_image_region',
+    'cmd_get_thumbnail',
+    'cmd_get_collection_metadata',
     'do_da_token',
     'do_da_token_contract',
     'load_commands',
@@ -77,23 +86,77 @@ logger = logging.getLogger(__name__)
 ## -----------------------------------------------------------------
 
 ## -----------------------------------------------------------------
-def __save_image__(state, session, result, filename) :
+def __save_image__(eservice_client, result, filename, parallelism = 4, batch_size = 32) :
+    """Retrieve an image from the transfer store returned by the guardian
+
+    The blocks of the transfer store are pulled in parallel batches and
+    the image is written one chunk at a time to a temporary file that
+    replaces the output file only if the running hash of the image
+    matches the hash reported by the guardian.
+    """
     # not catching exceptions intentionally, we want the interpreter
     # to see and handle the exception
     parsed_result = json.loads(result)
 
-    eservice_client = get_eservice_from_contract(state, session.save_file, session.eservice_url)
-    if not eservice_client :
-        raise Exception('unknown eservice {}'.format(session.eservice_url))
+    encryption_key = parsed_result['encryption_key']
+    state_hash = parsed_result['state_hash']
+    transfer_key = parsed_result['transfer_key']
+    transfer_chunks = parsed_result.get('transfer_chunks', 0)
 
-    kv = KeyValueStore(parsed_result['encryption_key'])
-    _ = kv.sync_from_block_store(parsed_result['state_hash'], eservice_client)
+    kv = KeyValueStore(encryption_key, state_hash)
+    _ = block_transfer.sync_from_block_store(
+        kv, state_hash, eservice_client, parallelism=parallelism, batch_size=batch_size)
 
+    if transfer_chunks == 0 :
+        transfer_keys = [ transfer_key ]
+    else :
+        transfer_keys = [ '{}_{}'.format(transfer_key, n) for n in range(transfer_chunks) ]
+
+    running_hash = hashlib.sha256()
+    partial_filename = filename + '.partial'
+
+    try :
+        with open(partial_filename, 'wb') as fp, kv :
+            for (index, key) in enumerate(transfer_keys) :
+                chunk = bytes(kv.get(key, input_encoding='str', output_encoding='raw'))
+                fp.write(chunk)
+                running_hash.update(chunk)
+                logger.info('retrieved chunk %d of %d for %s', index + 1, len(transfer_keys), filename)
+
+        transfer_hash = parsed_result.get('transfer_hash')
+        if transfer_hash and base64.b64encode(running_hash.digest()).decode() != transfer_hash :
+            raise ValueError('integrity check failed for image {}'.format(filename))
+
+        os.replace(partial_filename, filename)
+    finally :
+        if os.path.exists(partial_filename) :
+            os.remove(partial_filename)
+
+## -----------------------------------------------------------------
+def __save_tiles__(eservice_client, result, tile_cache) :
+    """Retrieve the tiles returned by the guardian for a region and add them to the tile cache
+    """
+    parsed_result = json.loads(result)
+
+    state_hash = parsed_result['state_hash']
+    transfer_key = parsed_result['transfer_key']
+    level = parsed_result['level']
+
+    kv = KeyValueStore(parsed_result['encryption_key'], state_hash)
+    _ = block_transfer.sync_from_block_store(kv, state_hash, eservice_client)
+
+    tile_cache.set_level(
+        parsed_result['tile_size'], level, parsed_result['level_width'], parsed_result['level_height'])
+
+    first_column = parsed_result['first_column']
+    first_row = parsed_result['first_row']
     with kv :
-        image_data = kv.get(parsed_result['transfer_key'], output_encoding='raw')
+        for row in range(first_row, first_row + parsed_result['rows']) :
+            for column in range(first_column, first_column + parsed_result['columns']) :
+                tile = kv.get('{}_{}_{}'.format(transfer_key, column, row), input_encoding='str', output_encoding='raw')
+                tile_cache.put(level, column, row, tile)
 
-    with open(filename, 'wb') as fp:
-        fp.write(bytes(image_data))
+    return parsed_result['columns'] * parsed_result['rows']
 
 ## -----------------------------------------------------------------
 ## get_image_metadata
@@ -114,16 +177,8 @@ class op_get_image_metadata(pcontract.contract_op_base) :
     def invoke(cls, state, session_params, data_guardian, **kwargs) :
         params = {}
 
-        message = invocation_request('get_image_metadata', **params)
-        capability = pcontract_cmd.send_to_contract(state, message, **session_params)
-        cls.log_invocation(message, capability)
-
-        dg_session = pbuilder.SessionParameters(save_file=data_guardian)
-
-        params = json.loads(capability)
-        message = invocation_request('process_capability', **params)
-        result = pcontract_cmd.send_to_contract(state, message, **dg_session)
-        cls.log_invocation(message, result)
+        executor = CapabilityExecutor.get_executor(state, data_guardian)
+        result = executor.execute(session_params, 'get_image_metadata', params, cls.log_invocation)
 
         return result
 
@@ -150,19 +205,11 @@ class op_get_public_image(pcontract.contract_op_base) :
     def invoke(cls, state, session_params, data_guardian, image_file, **kwargs) :
         params = {}
 
-        message = invocation_request('get_public_image', **params)
-        capability = pcontract_cmd.send_to_contract(state, message, **session_params)
-        cls.log_invocation(message, capability)
-
-        dg_session = pbuilder.SessionParameters(save_file=data_guardian)
-
-        params = json.loads(capability)
-        message = invocation_request('process_capability', **params)
-        result = pcontract_cmd.send_to_contract(state, message, **dg_session)
-        cls.log_invocation(message, result)
+        executor = CapabilityExecutor.get_executor(state, data_guardian)
+        result = executor.execute(session_params, 'get_public_image', params, cls.log_invocation)
 
         if image_file:
-            __save_image__(state, dg_session, result, image_file)
+            __save_image__(executor.eservice_client, result, image_file)
 
         return result
 
@@ -189,19 +236,124 @@ class op_get_original_image(pcontract.contract_op_base) :
     def invoke(cls, state, session_params, data_guardian, image_file, **kwargs) :
         params = {}
 
-        message = invocation_request('get_original_image', **params)
-        capability = pcontract_cmd.send_to_contract(state, message, **session_params)
-        cls.log_invocation(message, capability)
+        executor = CapabilityExecutor.get_executor(state, data_guardian)
+        result = executor.execute(session_params, 'get_original_image', params, cls.log_invocation)
+
+        if image_file:
+            __save_image__(executor.eservice_client, result, image_file)
+
+        return result
+
+## -----------------------------------------------------------------
+## get_image_region
+## -----------------------------------------------------------------
+class op_get_image_region(pcontract.contract_op_base) :
 
-        dg_session = pbuilder.SessionParameters(save_file=data_guardian)
+    name = "get_image_region"
+    help = "get a region of one level of the image pyramid"
 
-        params = json.loads(capability)
-        message = invocation_request('process_capability', **params)
-        result = pcontract_cmd.send_to_contract(state, message, **dg_session)
-        cls.log_invocation(message, result)
+    # tile size and the largest number of tiles in one region, these match the guardian
+    __tile_size__ = 256
+    __max_region_tiles__ = 64
+
+    @classmethod
+    def add_arguments(cls, parser) :
+        parser.add_argument(
+            '-d', '--data-guardian',
+            help="contract object for the data guardian",
+            type=str, required=True)
+        parser.add_argument(
+            '-i', '--image-file',
+            help='File where the region is stored',
+            type=str)
+        parser.add_argument(
+            '--level',
+            help='Pyramid level, 0 is the full resolution image',
+            type=int, default=0)
+        parser.add_argument(
+            '-x', help='Left edge of the region in pixels of the level', type=int, required=True)
+        parser.add_argument(
+            '-y', help='Top edge of the region in pixels of the level', type=int, required=True)
+        parser.add_argument(
+            '--width', help='Width of the region in pixels', type=int, required=True)
+        parser.add_argument(
+            '--height', help='Height of the region in pixels', type=int, required=True)
+
+    @classmethod
+    def invoke(cls, state, session_params, data_guardian, x, y, width, height, level=0, image_file=None, **kwargs) :
+        if level < 0 or x < 0 or y < 0 :
+            raise ValueError("region coordinates must be non-negative integers")
+        if width <= 0 or height <= 0 :
+            raise ValueError("region width and height must be positive integers")
+
+        executor = CapabilityExecutor.get_executor(state, data_guardian)
+        guardian_contract = pcontract_cmd.get_contract(state, data_guardian)
+        identity = kwargs.get('identity') or state.identity
+        tile_cache = TileCache.create(state, guardian_contract.contract_id, identity)
+
+        def region_params(region) :
+            params = {}
+            params['level'] = level
+            (params['x'], params['y'], params['width'], params['height']) = region
+            return params
+
+        # only the tiles that are not already cached are requested, in regions
+        # small enough for the guardian to return in a single response
+        missing_regions = tile_cache.missing_regions(
+            level, x, y, width, height, cls.__max_region_tiles__, cls.__tile_size__)
+
+        # the token object mints capabilities only for the current owner; when
+        # every tile is cached, an image metadata capability that is never sent
+        # to the guardian confirms that cached tiles are served only to the owner
+        tiles_fetched = 0
+        if missing_regions :
+            requests = [
+                (session_params, 'get_image_region', region_params(region)) for region in missing_regions ]
+            for result in executor.execute_many(requests, cls.log_invocation) :
+                tiles_fetched += __save_tiles__(executor.eservice_client, result, tile_cache)
+            tile_cache.prune()
+        else :
+            executor.create_capability(session_params, 'get_image_metadata', {}, cls.log_invocation)
+
+        if image_file :
+            with open(image_file, 'wb') as fp :
+                fp.write(tile_cache.compose_region(level, x, y, width, height))
+
+        result = {}
+        result['level'] = level
+        result['tile_size'] = tile_cache.tile_size
+        result['tiles'] = len(tile_cache.tiles(level, x, y, width, height))
+        result['tiles_fetched'] = tiles_fetched
+        return json.dumps(result)
+
+## -----------------------------------------------------------------
+## get_thumbnail
+## -----------------------------------------------------------------
+class op_get_thumbnail(pcontract.contract_op_base) :
+
+    name = "get_thumbnail"
+    help = "get a thumbnail of the public image"
+
+    @classmethod
+    def add_arguments(cls, parser) :
+        parser.add_argument(
+            '-d', '--data-guardian',
+            help="contract object for the data guardian",
+            type=str, required=True)
+        parser.add_argument(
+            '-i', '--image-file',
+            help='File where image is stored',
+            type=str)
+
+    @classmethod
+    def invoke(cls, state, session_params, data_guardian, image_file, **kwargs) :
+        params = {}
+
+        executor = CapabilityExecutor.get_executor(state, data_guardian)
+        result = executor.execute(session_params, 'get_thumbnail', params, cls.log_invocation)
 
         if image_file:
-            __save_image__(state, dg_session, result, image_file)
+            __save_image__(executor.eservice_client, result, image_file)
 
         return result
 
@@ -287,6 +439,123 @@ class cmd_get_original_image(pcommand.contract_command_base) :
         cls.display("image saved to file {}".format(image_file))
         return result
 
+## -----------------------------------------------------------------
+## -----------------------------------------------------------------
+class cmd_get_image_region(pcommand.contract_command_base) :
+    name = "get_image_region"
+    help = "get a region of the image from cached and newly retrieved tiles"
+
+    @classmethod
+    def add_arguments(cls, parser) :
+        parser.add_argument(
+            '-i', '--image-file',
+            help='File where the region is stored',
+            required=True,
+            type=str)
+        parser.add_argument(
+            '--level',
+            help='Pyramid level, 0 is the full resolution image',
+            type=int, default=0)
+        parser.add_argument(
+            '-x', help='Left edge of the region in pixels of the level', type=int, required=True)
+        parser.add_argument(
+            '-y', help='Top edge of the region in pixels of the level', type=int, required=True)
+        parser.add_argument(
+            '--width', help='Width of the region in pixels', type=int, required=True)
+        parser.add_argument(
+            '--height', help='Height of the region in pixels', type=int, required=True)
+
+    @classmethod
+    def invoke(cls, state, context, image_file, x, y, width, height, level=0, **kwargs) :
+        save_file = pcontract_cmd.get_contract_from_context(state, context)
+        if not save_file :
+            raise ValueError("token has not been created")
+
+        guardian_context = context.get_context('data_guardian_context')
+        guardian_save_file = pcontract_cmd.get_contract_from_context(state, guardian_context)
+
+        session = pbuilder.SessionParameters(save_file=save_file)
+        result = pcontract.invoke_contract_op(
+            op_get_image_region, state, context, session, guardian_save_file,
+            x, y, width, height, level=level, image_file=image_file, **kwargs)
+
+        cls.display("region saved to file {}".format(image_file))
+        return result
+
+## -----------------------------------------------------------------
+## -----------------------------------------------------------------
+class cmd_get_thumbnail(pcommand.contract_command_base) :
+    name = "get_thumbnail"
+    help = "get a thumbnail of the public image"
+
+    @classmethod
+    def add_arguments(cls, parser) :
+        parser.add_argument(
+            '-i', '--image-file',
+            help='File where image is stored',
+            required=True,
+            type=str)
+
+    @classmethod
+    def invoke(cls, state, context, image_file, **kwargs) :
+        save_file = pcontract_cmd.get_contract_from_context(state, context)
+        if not save_file :
+            raise ValueError("token has not been created")
+
+        guardian_context = context.get_context('data_guardian_context')
+        guardian_save_file = pcontract_cmd.get_contract_from_context(state, guardian_context)
+
+        session = pbuilder.SessionParameters(save_file=save_file)
+        result = pcontract.invoke_contract_op(
+            op_get_thumbnail, state, context, session, guardian_save_file, image_file, **kwargs)
+
+        cls.display("image saved to file {}".format(image_file))
+        return result
+
+## -----------------------------------------------------------------
+## -----------------------------------------------------------------
+class cmd_get_collection_metadata(pcommand.contract_command_base) :
+    """Get the image metadata for every token minted from the context
+
+    The capabilities for the tokens are minted and processed by the
+    guardian with overlapped invocations.
+    """
+
+    name = "get_collection_metadata"
+    help = "get image metadata for all minted tokens"
+
+    @classmethod
+    def add_arguments(cls, parser) :
+        parser.add_argument(
+            '--parallelism',
+            help='Number of concurrent invocations for each contract',
+            type=int, default=4)
+
+    @classmethod
+    def invoke(cls, state, context, parallelism=4, **kwargs) :
+        token_save_files = context.get('token_save_file_list', [])
+        if not token_save_files :
+            raise ValueError("no tokens have been minted")
+
+        guardian_context = context.get_context('data_guardian_context')
+        guardian_save_file = pcontract_cmd.get_contract_from_context(state, guardian_context)
+
+        executor = CapabilityExecutor.get_executor(state, guardian_save_file)
+
+        requests = []
+        for save_file in token_save_files :
+            session = pbuilder.SessionParameters(save_file=save_file)
+            requests.append((session, 'get_image_metadata', {}))
+
+        results = executor.execute_many(requests, parallelism=parallelism)
+
+        result = {}
+        for (save_file, metadata) in zip(token_save_files, results) :
+            result[save_file] = json.loads(metadata)
+
+        cls.display(json.dumps(result))
+        return result
+
 ## -----------------------------------------------------------------
 ## Create the generic, shell independent version of the aggregate command
 ## -----------------------------------------------------------------
@@ -305,6 +574,8 @@ __operations__ = [
     op_get_image_metadata,
     op_get_public_image,
     op_get_original_image,
+    op_get_image_region,
+    op_get_thumbnail,
 ]
 
 do_da_token_contract = pcontract.create_shell_command('da_token_contract', __operations__)
@@ -315,6 +586,9 @@ __commands__ = [
     cmd_get_image_metadata,
     cmd_get_public_image,
     cmd_get_original_image,
+    cmd_get_image_region,
+    cmd_get_thumbnail,
+    cmd_get_collection_metadata,
 ]
 
 do_da_token = pcommand.create_shell_command('da_token', __commands__)
@@ -64,6 +64,7 @@ setup(
     packages = [
         'pdo',
         'pdo.digital_asset',
+        'pdo.digital_asset.common',
         'pdo.digital_asset.jupyter',
         'pdo.digital_asset.plugins',
         'pdo.digital_asset.scripts',
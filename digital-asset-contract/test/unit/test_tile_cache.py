@@ -0,0 +1,97 @@
+# Copyright 2024 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+
+import pytest
+
+@pytest.fixture
+def tile_cache(load_source) :
+    return load_source('pdo/digital_asset/common/tile_cache.py')
+
+@pytest.fixture
+def cache(tile_cache, tmp_path) :
+    cache = tile_cache.TileCache(str(tmp_path), 'guardian/id', 'alice')
+    cache.set_level(4, 0, 10, 10)
+    return cache
+
+def tile(tile_cache, width, height, value) :
+    return tile_cache.write_bitmap(width, height, [ bytes([value]) * (width * 3) for _ in range(height) ])
+
+def covered_tiles(tile_size, regions) :
+    tiles = []
+    for (x, y, width, height) in regions :
+        tiles += [ (c, r)
+                   for r in range(y // tile_size, (y + height - 1) // tile_size + 1)
+                   for c in range(x // tile_size, (x + width - 1) // tile_size + 1) ]
+    return tiles
+
+# -----------------------------------------------------------------
+def test_split_region_respects_the_tile_limit(tile_cache) :
+    regions = tile_cache.split_region(256, 100, 50, 3000, 1800, 64)
+    tiles = covered_tiles(256, regions)
+
+    assert all(len(covered_tiles(256, [ r ])) <= 64 for r in regions)
+    assert len(tiles) == len(set(tiles)) == 13 * 8
+    assert sum(w * h for (_, _, w, h) in regions) == 3000 * 1800
+
+def test_split_region_keeps_small_regions(tile_cache) :
+    assert tile_cache.split_region(256, 10, 10, 100, 100, 64) == [ (10, 10, 100, 100) ]
+
+def test_missing_regions_skip_cached_tiles(tile_cache, cache) :
+    # a 3x3 grid of tiles for the 10x10 level, cache the top row
+    for column in range(3) :
+        cache.put(0, column, 0, tile(tile_cache, 4, 4, column))
+
+    assert cache.missing_region(0, 0, 0, 10, 4) is None
+    assert cache.missing_regions(0, 0, 0, 10, 4, 64) == []
+    assert cache.missing_regions(0, 0, 0, 10, 10, 64) == [ (0, 4, 10, 6) ]
+
+    regions = cache.missing_regions(0, 0, 0, 10, 10, 2)
+    assert sorted(covered_tiles(4, regions)) == sorted((c, r) for r in (1, 2) for c in range(3))
+    assert all(len(covered_tiles(4, [ r ])) <= 2 for r in regions)
+
+def test_missing_regions_without_a_layout(tile_cache, tmp_path) :
+    cache = tile_cache.TileCache(str(tmp_path), 'guardian', 'bob')
+
+    assert cache.missing_regions(0, 0, 0, 10, 10, 64) == [ (0, 0, 10, 10) ]
+    assert sorted(cache.missing_regions(0, 0, 0, 1024, 1024, 4, tile_size=256)) == \
+        [ (0, 0, 512, 512), (0, 512, 512, 512), (512, 0, 512, 512), (512, 512, 512, 512) ]
+
+def test_compose_region_from_tiles(tile_cache, cache) :
+    for row in range(3) :
+        for column in range(3) :
+            (width, height) = (min(4, 10 - column * 4), min(4, 10 - row * 4))
+            cache.put(0, column, row, tile(tile_cache, width, height, row * 3 + column))
+
+    (width, height, rows) = tile_cache.read_bitmap(cache.compose_region(0, 3, 3, 2, 2))
+    assert (width, height) == (2, 2)
+    assert rows == [ bytes([0] * 3 + [1] * 3), bytes([3] * 3 + [4] * 3) ]
+
+def test_cache_files_are_private(cache) :
+    cache.put(0, 0, 0, b'tile')
+
+    assert os.stat(cache.cache_directory).st_mode & 0o777 == 0o700
+    for name in os.listdir(cache.cache_directory) :
+        assert os.stat(os.path.join(cache.cache_directory, name)).st_mode & 0o077 == 0
+
+def test_prune_removes_the_oldest_tiles(tile_cache, tmp_path) :
+    cache = tile_cache.TileCache(str(tmp_path), 'guardian', 'carol', max_tiles=2)
+    for column in range(4) :
+        cache.put(0, column, 0, b'tile')
+        tile_file = os.path.join(cache.cache_directory, 'tile_0_{}_0.bmp'.format(column))
+        os.utime(tile_file, (column, column))
+
+    assert cache.prune() == 2
+    assert [ cache.get(0, c, 0) is not None for c in range(4) ] == [ False, False, True, True ]
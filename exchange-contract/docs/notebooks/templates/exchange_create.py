@@ -162,29 +162,18 @@ print('exchange contract in {}'.format(exchange_save_file))
 # ## Work with the Exchange Contract
 
 # %% [markdown]
-# ### Examine the Offered Asset
-
-# %%
-# %%skip True
-import json
-session = pc_jupyter.pbuilder.SessionParameters(save_file=exchange_save_file)
-offered_asset = pc_jupyter.pcontract.invoke_contract_op(
-            pc_jupyter.ex_exchange.op_examine_offered_asset, state, context.get_context('order'), session)
-offered_asset = json.loads(offered_asset)
-ip_display.display(ip_display.JSON(offered_asset))
-
-
-# %% [markdown]
-# ### Examine the Requested Asset
+# ### Examine the Offered and Requested Assets
+#
+# Both assets are read from the exchange contract in a single batch.
 
 # %%
 # %%skip True
 import json
 session = pc_jupyter.pbuilder.SessionParameters(save_file=exchange_save_file)
-offered_asset = pc_jupyter.pcontract.invoke_contract_op(
-            pc_jupyter.ex_exchange.op_examine_requested_asset, state, context.get_context('order'), session)
-offered_asset = json.loads(offered_asset)
-ip_display.display(ip_display.JSON(offered_asset))
+(offered_asset, requested_asset) = pc_jupyter.pcontract.invoke_contract_op(
+            pc_jupyter.ex_exchange.op_examine_order, state, context.get_context('order'), session)
+ip_display.display(ip_display.JSON(json.loads(offered_asset)))
+ip_display.display(ip_display.JSON(json.loads(requested_asset)))
 
 
 # %% [markdown]
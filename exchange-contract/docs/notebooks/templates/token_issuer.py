@@ -130,7 +130,8 @@ print('token issuer contract in {}'.format(token_issuer_save_file))
 token_object_context = pc_jupyter.pbuilder.Context(state, token_class_path + '.token_object')
 
 minted_token_save_files = pc_jupyter.pcommand.invoke_contract_cmd(
-    pc_jupyter.ex_token_object.cmd_mint_tokens, state, token_object_context)
+    pc_jupyter.ex_token_object.cmd_mint_tokens, state, token_object_context,
+    checkpoint_file=context_file, checkpoint_prefix=token_class_path)
 pc_jupyter.pbuilder.Context.SaveContextFile(state, context_file, prefix=token_class_path)
 
 minted_token_contexts = []
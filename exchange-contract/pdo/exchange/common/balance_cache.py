@@ -0,0 +1,134 @@
+# Copyright 2022 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Snapshots of issuer balances keyed by the issuer contract, the owner and
+the state hash of the issuer contract. A balance cannot change unless a
+transaction changes the state of the issuer, so a snapshot stays valid as
+long as the state hash recorded on the ledger is the one the snapshot was
+taken at. The current state hashes for a set of issuers are read from the
+ledger concurrently, and only the balances whose issuer state changed
+need an enclave invocation. Snapshots are kept in a file per wallet in
+the data directory.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+import pdo.exchange.common.ledger as ledger
+
+import logging
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    'BalanceSnapshotCache',
+]
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class BalanceSnapshotCache(object) :
+
+    __lock__ = threading.Lock()
+    __caches__ = {}
+
+    # -----------------------------------------------------------------
+    def __init__(self, snapshot_file = None) :
+        self.snapshot_file = snapshot_file
+
+        self.__lock__ = threading.Lock()
+        self.__snapshots__ = {}
+
+        if self.snapshot_file :
+            try :
+                with open(self.snapshot_file, 'r') as fp :
+                    self.__snapshots__ = json.load(fp)
+            except (OSError, ValueError) :
+                pass
+
+    # -----------------------------------------------------------------
+    @classmethod
+    def get_cache(cls, state, wallet_path) :
+        """Return the snapshot cache for a wallet context
+        """
+        data_directory = state.get(['Contract', 'DataDirectory'])
+        wallet_hash = hashlib.sha256(wallet_path.encode('utf8')).hexdigest()[:32]
+        snapshot_file = os.path.join(data_directory, '__balance_snapshots__', '{}.json'.format(wallet_hash))
+
+        with cls.__lock__ :
+            cache = cls.__caches__.get(snapshot_file)
+            if cache is None :
+                os.makedirs(os.path.dirname(snapshot_file), exist_ok=True)
+                cache = cls(snapshot_file)
+                cls.__caches__[snapshot_file] = cache
+
+        return cache
+
+    # -----------------------------------------------------------------
+    @staticmethod
+    def __key__(contract_id, owner) :
+        return '{}:{}'.format(contract_id, owner)
+
+    # -----------------------------------------------------------------
+    def get(self, contract_id, owner, state_hash) :
+        """Return the balance snapshot for the owner at the issuer state or None
+        """
+        with self.__lock__ :
+            snapshot = self.__snapshots__.get(self.__key__(contract_id, owner))
+        if snapshot and snapshot['state_hash'] == state_hash :
+            return snapshot['balance']
+
+        return None
+
+    # -----------------------------------------------------------------
+    def put(self, contract_id, owner, state_hash, balance) :
+        with self.__lock__ :
+            self.__snapshots__[self.__key__(contract_id, owner)] = { 'state_hash' : state_hash, 'balance' : balance }
+
+    # -----------------------------------------------------------------
+    def save(self) :
+        if not self.snapshot_file :
+            return
+
+        with self.__lock__ :
+            snapshots = dict(self.__snapshots__)
+        with open(self.snapshot_file + '.partial', 'w') as fp :
+            json.dump(snapshots, fp)
+        os.replace(self.snapshot_file + '.partial', self.snapshot_file)
+
+    # -----------------------------------------------------------------
+    def lookup(self, state, requests) :
+        """Find the balances that have not changed since they were last cached
+
+        :param requests: list of (issuer contract id, owner) tuples
+        :return: tuple of a dictionary that maps each request with a valid
+            snapshot to its balance, and a dictionary that maps every
+            issuer contract id to its current state hash
+        """
+        contract_ids = [ contract_id for (contract_id, _) in requests ]
+        try :
+            attestations = ledger.get_ledger_access(state).get_current_state_hashes(contract_ids)
+            state_hashes = { c : a['state_hash'] for (c, a) in attestations.items() }
+        except Exception as e :
+            logger.info('unable to read issuer state from the ledger; %s', e)
+            return ({}, {})
+
+        balances = {}
+        for (contract_id, owner) in requests :
+            balance = self.get(contract_id, owner, state_hashes[contract_id])
+            if balance is not None :
+                balances[(contract_id, owner)] = balance
+
+        return (balances, state_hashes)
@@ -0,0 +1,211 @@
+# Copyright 2022 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Support for commands that apply one operation to many rows of a manifest,
+such as issuing assets to a list of owners. Manifests are CSV files with a
+header row or JSON lines files, and are read as a stream. The outcome of
+every row is appended to a result log; when a command is run again with
+the same log, rows that completed are skipped.
+"""
+
+import csv
+import json
+import os
+import threading
+import time
+
+import logging
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    'pipeline',
+    'read_manifest',
+    'ResultLog',
+]
+
+# -----------------------------------------------------------------
+def read_manifest(filename, fields) :
+    """Generate the rows of a CSV or JSON lines manifest
+
+    Files ending in .jsonl or .json are read as one JSON object per line,
+    all other files are read as CSV with a header row.
+
+    :param fields: dictionary that maps required field names to a conversion function
+    :return: generator of (row number, row dictionary) tuples, row numbers start at 1
+    """
+    def check(row_number, row) :
+        try :
+            return { field : convert(row[field]) for (field, convert) in fields.items() }
+        except KeyError as ke :
+            raise ValueError('manifest row {} is missing field {}'.format(row_number, ke))
+        except (TypeError, ValueError) as e :
+            raise ValueError('manifest row {} is invalid; {}'.format(row_number, e))
+
+    with open(filename, 'r', newline='') as fp :
+        if filename.endswith('.jsonl') or filename.endswith('.json') :
+            rows = (json.loads(line) for line in fp if line.strip())
+        else :
+            rows = csv.DictReader(fp, skipinitialspace=True)
+
+        for (row_number, row) in enumerate(rows, start=1) :
+            yield (row_number, check(row_number, row))
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class ResultLog(object) :
+    """Append-only JSON lines log of the outcome of each manifest row
+
+    Each record holds a key that identifies the row, a status and any
+    additional fields supplied by the command. A row is complete once a
+    record with the status 'complete' is written for its key; a row whose
+    latest record is 'sent' may or may not have been applied.
+    """
+
+    # -----------------------------------------------------------------
+    def __init__(self, filename) :
+        self.filename = filename
+        self.__lock__ = threading.Lock()
+        self.__completed__ = {}
+        self.__latest__ = {}
+
+        if os.path.exists(self.filename) :
+            with open(self.filename, 'r') as fp :
+                for line in fp :
+                    try :
+                        record = json.loads(line)
+                    except ValueError :
+                        # a partial record left by an interrupted run
+                        continue
+                    self.__latest__[record['key']] = record
+                    if record.get('status') == 'complete' :
+                        self.__completed__[record['key']] = record
+
+    # -----------------------------------------------------------------
+    def completed(self, key) :
+        """Return the completion record for a key or None if the row has not completed
+        """
+        return self.__completed__.get(key)
+
+    # -----------------------------------------------------------------
+    def latest(self, key) :
+        """Return the most recent record for a key or None if nothing is logged for the key
+        """
+        return self.__latest__.get(key)
+
+    # -----------------------------------------------------------------
+    def write(self, records) :
+        """Append records to the log and flush them to disk
+        """
+        with self.__lock__ :
+            with open(self.filename, 'a') as fp :
+                for record in records :
+                    fp.write(json.dumps(record) + '\n')
+                fp.flush()
+                os.fsync(fp.fileno())
+
+            for record in records :
+                self.__latest__[record['key']] = record
+                if record.get('status') == 'complete' :
+                    self.__completed__[record['key']] = record
+
+# -----------------------------------------------------------------
+def pipeline(items, invoke, result_log, in_flight = 8, retries = 0, recover = None, sync = None) :
+    """Apply committed invocations to the rows of a manifest, logging completed rows
+
+    Invocations on a single contract cannot run concurrently since each
+    update depends on the state committed by the previous one. Instead the
+    invocations are sent without waiting for the ledger commit; after every
+    in_flight invocations, and after the last one, the invocation waits for
+    the pending commits and the rows in the window are logged as complete.
+
+    When a row fails, or succeeds only because recover reports that it was
+    applied, the rows already sent in its window have not been confirmed by
+    a committed invocation. They are logged once sync returns
+    or, without a sync, once the next invocation waits for its commit. Rows
+    that are left unconfirmed when the manifest ends are logged as 'sent'.
+
+    :param items: iterable of (record, payload) tuples, record is logged and must contain a key
+    :param invoke: function invoke(record, payload, wait) that sends one invocation
+    :param result_log: ResultLog for the rows
+    :param retries: number of times a failed invocation is retried
+    :param recover: function recover(record, payload, exception) that returns True if
+        the failed invocation was actually applied, used before each retry
+    :param sync: function that returns once every invocation sent on the contract is committed
+    :return: dictionary with the number of complete and failed rows
+    """
+    counts = { 'complete' : 0, 'failed' : 0 }
+    window = []
+
+    def flush(committed) :
+        if not window :
+            return
+        if not committed and sync :
+            sync()
+            committed = True
+        if committed :
+            result_log.write(window)
+            counts['complete'] += len(window)
+        else :
+            result_log.write([ dict(record, status='sent') for record in window ])
+        window.clear()
+
+    items = iter(items)
+    current = next(items, None)
+    unconfirmed = False
+    while current is not None :
+        (record, payload) = current
+        following = next(items, None)
+        # after a failure without a sync the next invocation confirms the window
+        wait = unconfirmed or following is None or len(window) + 1 >= max(1, in_flight)
+
+        failed = False
+        recovered = False
+        for attempt in range(retries + 1) :
+            try :
+                invoke(record, payload, wait)
+                window.append(dict(record, status='complete'))
+                break
+            except Exception as e :
+                if recover and recover(record, payload, e) :
+                    window.append(dict(record, status='complete', recovered=True))
+                    recovered = True
+                    break
+                if attempt < retries :
+                    logger.info('retrying %s; %s', record['key'], e)
+                    time.sleep(0.5 * (2 ** attempt))
+                    continue
+
+                logger.warning('failed to process %s; %s', record['key'], e)
+                result_log.write([ dict(record, status='failed', error=str(e)) ])
+                counts['failed'] += 1
+                failed = True
+
+        # a recovered invocation did not wait for its commit, so it cannot
+        # confirm the window any more than a failed one
+        if wait and not (failed or recovered) :
+            flush(True)
+            unconfirmed = False
+        elif (failed or recovered) and window :
+            if sync :
+                flush(False)
+                unconfirmed = False
+            else :
+                unconfirmed = True
+
+        current = following
+
+    # whatever is left was sent without a committed wait
+    flush(False)
+    return counts
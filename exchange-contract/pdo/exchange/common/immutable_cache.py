@@ -0,0 +1,165 @@
+# Copyright 2022 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Memoization of contract operations whose results never change for a
+given contract, such as the verifying key or the contract metadata.
+Results are filled lazily and persisted next to the contract cache, one
+file per contract, so later commands skip the enclave invocation. Use
+invoke_contract_op in place of pcontract.invoke_contract_op; operations
+that are not declared immutable are passed through unchanged.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+import pdo.client.builder.contract as pcontract
+import pdo.client.commands.contract as pcontract_cmd
+import pdo.client.plugins.common as common
+
+import pdo.exchange.plugins.asset_type as asset_type
+
+import logging
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    'declare_immutable',
+    'invoke_contract_op',
+    'ImmutableOpCache',
+]
+
+# -----------------------------------------------------------------
+# names of the operations whose results are fixed once a contract is
+# created or initialized
+# -----------------------------------------------------------------
+__immutable_operations__ = set()
+
+def declare_immutable(*operations) :
+    """Declare that the results of the operations never change for a contract
+    """
+    for op in operations :
+        __immutable_operations__.add(op.name)
+
+declare_immutable(
+    common.op_get_verifying_key,
+    common.op_get_contract_metadata,
+    common.op_get_contract_code_metadata,
+    asset_type.op_get_asset_type_identifier)
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class ImmutableOpCache(object) :
+
+    __lock__ = threading.Lock()
+    __caches__ = {}
+
+    # -----------------------------------------------------------------
+    def __init__(self, cache_directory) :
+        self.cache_directory = cache_directory
+        os.makedirs(self.cache_directory, exist_ok=True)
+
+        self.__lock__ = threading.Lock()
+        self.__entries__ = {}
+        self.__contract_ids__ = {}
+
+    # -----------------------------------------------------------------
+    @classmethod
+    def get_cache(cls, state) :
+        """Return the cache stored beside the contract cache in the data directory
+        """
+        data_directory = state.get(['Contract', 'DataDirectory'])
+        cache_directory = os.path.join(data_directory, '__immutable_cache__')
+        with cls.__lock__ :
+            cache = cls.__caches__.get(cache_directory)
+            if cache is None :
+                cache = cls(cache_directory)
+                cls.__caches__[cache_directory] = cache
+
+        return cache
+
+    # -----------------------------------------------------------------
+    def contract_id(self, state, save_file) :
+        """Return the identifier of the contract in a save file, remembering it for later calls
+        """
+        with self.__lock__ :
+            contract_id = self.__contract_ids__.get(save_file)
+        if contract_id is None :
+            contract_id = pcontract_cmd.get_contract(state, save_file).contract_id
+            with self.__lock__ :
+                self.__contract_ids__[save_file] = contract_id
+
+        return contract_id
+
+    # -----------------------------------------------------------------
+    def __cache_file__(self, contract_id) :
+        # contract identifiers are base64 encoded and may contain '/'
+        contract_hash = hashlib.sha256(contract_id.encode('utf8')).hexdigest()
+        return os.path.join(self.cache_directory, '{}.json'.format(contract_hash))
+
+    # -----------------------------------------------------------------
+    def __load__(self, contract_id) :
+        entries = self.__entries__.get(contract_id)
+        if entries is None :
+            try :
+                with open(self.__cache_file__(contract_id), 'r') as fp :
+                    entries = json.load(fp)
+            except (OSError, ValueError) :
+                entries = {}
+            self.__entries__[contract_id] = entries
+
+        return entries
+
+    # -----------------------------------------------------------------
+    def get(self, contract_id, key) :
+        with self.__lock__ :
+            return self.__load__(contract_id).get(key)
+
+    # -----------------------------------------------------------------
+    def set(self, contract_id, key, value) :
+        with self.__lock__ :
+            entries = self.__load__(contract_id)
+            entries[key] = value
+
+            cache_file = self.__cache_file__(contract_id)
+            with open(cache_file + '.partial', 'w') as fp :
+                json.dump(entries, fp)
+            os.replace(cache_file + '.partial', cache_file)
+
+# -----------------------------------------------------------------
+def invoke_contract_op(op, state, context, session_params, *args, **kwargs) :
+    """Invoke a contract operation, answering immutable operations from the cache
+
+    The result of an immutable operation is keyed by the contract
+    identifier, the operation name and the positional arguments. Only
+    successful, non-empty results are cached.
+    """
+    if op.name not in __immutable_operations__ :
+        return pcontract.invoke_contract_op(op, state, context, session_params, *args, **kwargs)
+
+    cache = ImmutableOpCache.get_cache(state)
+    contract_id = cache.contract_id(state, session_params.save_file)
+    key = json.dumps([op.name] + list(args))
+
+    result = cache.get(contract_id, key)
+    if result is not None :
+        logger.debug('cached result for %s on contract %s', op.name, contract_id)
+        return result
+
+    result = pcontract.invoke_contract_op(op, state, context, session_params, *args, **kwargs)
+    if result :
+        cache.set(contract_id, key, result)
+
+    return result
@@ -0,0 +1,182 @@
+# Copyright 2022 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Shared access to the ledger for the contract family plugins. One
+submitter is created per ledger configuration and reused by every
+command. The ledger key is read once, contract registration information
+is memoized per contract, and state attestations are memoized per contract
+state. Lookups for many contracts are issued concurrently.
+"""
+
+import json
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pdo.client.commands.contract as pcontract_cmd
+from pdo.submitter.create import create_submitter
+
+import logging
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    'get_ledger_access',
+    'LedgerAccess',
+    'wait_for_commit',
+]
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class LedgerAccess(object) :
+
+    __lock__ = threading.Lock()
+    __ledgers__ = {}
+
+    # -----------------------------------------------------------------
+    def __init__(self, ledger_config, max_workers = 8) :
+        self.submitter = create_submitter(ledger_config)
+        self.max_workers = max(1, max_workers)
+
+        self.__lock__ = threading.Lock()
+        self.__ledger_key__ = None
+        self.__contract_info__ = {}
+        self.__state_attestations__ = {}
+
+    # -----------------------------------------------------------------
+    @classmethod
+    def get_ledger_access(cls, state) :
+        """Return the ledger access for the ledger in the client configuration
+        """
+        ledger_config = state.get(['Ledger'])
+        key = json.dumps(ledger_config, sort_keys=True, default=str)
+        with cls.__lock__ :
+            ledger = cls.__ledgers__.get(key)
+            if ledger is None :
+                ledger = cls(ledger_config)
+                cls.__ledgers__[key] = ledger
+
+        return ledger
+
+    # -----------------------------------------------------------------
+    @property
+    def ledger_key(self) :
+        """The ledger verifying key, read from the ledger on first use
+        """
+        with self.__lock__ :
+            if self.__ledger_key__ is None :
+                self.__ledger_key__ = self.submitter.get_ledger_info()
+            return self.__ledger_key__
+
+    # -----------------------------------------------------------------
+    def get_contract_info(self, contract_id) :
+        """Return the registration information for a contract
+
+        Registration information does not change once the contract is
+        provisioned so the result is kept for the life of the session.
+        """
+        with self.__lock__ :
+            contract_info = self.__contract_info__.get(contract_id)
+        if contract_info is None :
+            contract_info = self.submitter.get_contract_info(contract_id)
+            with self.__lock__ :
+                self.__contract_info__[contract_id] = contract_info
+
+        return contract_info
+
+    # -----------------------------------------------------------------
+    def get_current_state_hash(self, contract_id, state_hash = None) :
+        """Return the ledger attestation for the current state of a contract
+
+        If state_hash is given and matches the state of the memoized
+        attestation, the attestation is returned without a ledger round
+        trip; otherwise the ledger is queried and the result memoized.
+
+        :param contract_id: identifier of the contract
+        :param state_hash: the state hash the caller expects the contract to have
+        """
+        if state_hash is not None :
+            with self.__lock__ :
+                attestation = self.__state_attestations__.get(contract_id)
+            if attestation is not None and attestation.get('state_hash') == state_hash :
+                return attestation
+
+        attestation = self.submitter.get_current_state_hash(contract_id)
+        with self.__lock__ :
+            self.__state_attestations__[contract_id] = attestation
+
+        return attestation
+
+    # -----------------------------------------------------------------
+    def __fan_out__(self, lookup, contract_ids) :
+        contract_ids = list(dict.fromkeys(contract_ids))
+        if len(contract_ids) <= 1 :
+            return { contract_id : lookup(contract_id) for contract_id in contract_ids }
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(contract_ids))) as executor :
+            return dict(zip(contract_ids, executor.map(lookup, contract_ids)))
+
+    # -----------------------------------------------------------------
+    def get_contract_infos(self, contract_ids) :
+        """Return a dictionary that maps each contract identifier to its registration information
+        """
+        return self.__fan_out__(self.get_contract_info, contract_ids)
+
+    # -----------------------------------------------------------------
+    def get_current_state_hashes(self, contract_ids) :
+        """Return a dictionary that maps each contract identifier to its current state attestation
+        """
+        return self.__fan_out__(self.get_current_state_hash, contract_ids)
+
+    # -----------------------------------------------------------------
+    def invalidate(self, contract_id) :
+        """Forget the memoized state attestation for a contract
+        """
+        with self.__lock__ :
+            self.__state_attestations__.pop(contract_id, None)
+
+    # -----------------------------------------------------------------
+    def wait_for_state(self, contract_id, state_hash, timeout = 60.0, interval = 0.5) :
+        """Wait until the ledger reports state_hash as the current state of a contract
+
+        Used to confirm that invocations sent without waiting for the
+        ledger commit have been committed.
+
+        :param state_hash: base64 encoded hash of the expected contract state
+        :param timeout: number of seconds to wait before raising TimeoutError
+        """
+        deadline = time.time() + timeout
+        while True :
+            attestation = self.get_current_state_hash(contract_id, state_hash)
+            if attestation.get('state_hash') == state_hash :
+                return attestation
+            if time.time() > deadline :
+                raise TimeoutError('contract {} did not reach the expected state'.format(contract_id))
+            time.sleep(interval)
+
+# -----------------------------------------------------------------
+def get_ledger_access(state) :
+    return LedgerAccess.get_ledger_access(state)
+
+# -----------------------------------------------------------------
+def wait_for_commit(state, save_file, timeout = 60.0) :
+    """Wait until every update sent on the contract in save_file is committed
+
+    The local contract object holds the state produced by the most recent
+    update, including updates sent without waiting for the ledger.
+    """
+    contract = pcontract_cmd.get_contract(state, save_file)
+    state_hash = contract.contract_state.get_state_hash(encoding='b64')
+    return get_ledger_access(state).wait_for_state(contract.contract_id, state_hash, timeout)
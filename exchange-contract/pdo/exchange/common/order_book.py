@@ -0,0 +1,309 @@
+# Copyright 2022 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+A local index of open exchange orders. Every exchange contract holds a
+single order; the order book examines the offered and requested assets of
+the order contracts found in the client contexts (including imported
+contract collections) and indexes them by asset type and issuer verifying
+key. Orders are kept in a file in the data directory along with the ledger
+state hash of the order contract, so a refresh only examines orders that
+are new or whose state changed on the ledger. Orders that can no longer
+be examined (filled or cancelled) are dropped from the book.
+
+Queries run entirely against the in-memory indexes. Orders are grouped by
+the requested asset type and issuer and sorted by the requested count, so
+finding the orders a counterparty can fill is a dictionary lookup and a
+binary search.
+"""
+
+import bisect
+import json
+import os
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pdo.client.builder as pbuilder
+import pdo.client.commands.contract as pcontract_cmd
+
+import pdo.exchange.common.ledger as ledger
+import pdo.exchange.common.read_batch as read_batch
+
+import logging
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    'find_order_contexts',
+    'OrderBook',
+]
+
+# module used for the contexts of exchange orders, see context/order.toml
+__order_module__ = 'pdo.exchange.plugins.exchange'
+
+# -----------------------------------------------------------------
+def find_order_contexts(state, prefix = '') :
+    """Return the paths of all exchange order contexts below a context prefix
+    """
+    root = pbuilder.Context(state, prefix).context if prefix else state.get(['Context'], {})
+
+    order_paths = []
+    def walk(path, value) :
+        if not isinstance(value, dict) :
+            return
+        if value.get('module') == __order_module__ :
+            order_paths.append(path)
+            return
+        for (key, child) in value.items() :
+            walk('{}.{}'.format(path, key) if path else key, child)
+
+    walk(prefix, root or {})
+    return order_paths
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class OrderBook(object) :
+
+    __lock__ = threading.Lock()
+    __books__ = {}
+
+    # -----------------------------------------------------------------
+    def __init__(self, book_file = None) :
+        self.book_file = book_file
+
+        self.__lock__ = threading.RLock()
+        self.__orders__ = {}
+        self.__by_request__ = {}
+        self.__by_offered_type__ = {}
+        self.__by_offered_issuer__ = {}
+
+        if self.book_file :
+            try :
+                with open(self.book_file, 'r') as fp :
+                    for order in json.load(fp) :
+                        self.add(order)
+            except (OSError, ValueError) :
+                pass
+
+    # -----------------------------------------------------------------
+    @classmethod
+    def get_order_book(cls, state) :
+        """Return the order book kept in the data directory of the client configuration
+        """
+        data_directory = state.get(['Contract', 'DataDirectory'])
+        book_file = os.path.join(data_directory, '__order_book__.json')
+        with cls.__lock__ :
+            book = cls.__books__.get(book_file)
+            if book is None :
+                book = cls(book_file)
+                cls.__books__[book_file] = book
+
+        return book
+
+    # -----------------------------------------------------------------
+    def save(self) :
+        if not self.book_file :
+            return
+
+        with self.__lock__ :
+            orders = list(self.__orders__.values())
+        with open(self.book_file + '.partial', 'w') as fp :
+            json.dump(orders, fp)
+        os.replace(self.book_file + '.partial', self.book_file)
+
+    # -----------------------------------------------------------------
+    @staticmethod
+    def create_order(path, contract_id, state_hash, offered_asset, requested_asset) :
+        """Build an order entry from the results of examine_offered_asset and examine_requested_asset
+        """
+        asset = offered_asset['asset']
+        return {
+            'path' : path,
+            'contract_id' : contract_id,
+            'state_hash' : state_hash,
+            'offered_type' : asset['asset_type_identifier'],
+            'offered_issuer' : offered_asset['issuer_identity'],
+            'offered_count' : int(asset['count']),
+            'offered_owner' : asset['owner_identity'],
+            'requested_type' : requested_asset['asset_type_identifier'],
+            'requested_issuer' : requested_asset['issuer_verifying_key'],
+            'requested_count' : int(requested_asset['count']),
+            'requested_owner' : requested_asset.get('owner_identity', ''),
+        }
+
+    # -----------------------------------------------------------------
+    def __len__(self) :
+        return len(self.__orders__)
+
+    def get(self, path) :
+        return self.__orders__.get(path)
+
+    # -----------------------------------------------------------------
+    def add(self, order) :
+        """Add an order to the indexes, replacing any order with the same context path
+        """
+        path = order['path']
+        with self.__lock__ :
+            self.remove(path)
+            self.__orders__[path] = order
+
+            key = (order['requested_type'], order['requested_issuer'])
+            bisect.insort(self.__by_request__.setdefault(key, []), (order['requested_count'], path))
+            self.__by_offered_type__.setdefault(order['offered_type'], set()).add(path)
+            self.__by_offered_issuer__.setdefault(order['offered_issuer'], set()).add(path)
+
+    # -----------------------------------------------------------------
+    def remove(self, path) :
+        """Remove an order from the indexes, return the order or None if it is not in the book
+        """
+        with self.__lock__ :
+            order = self.__orders__.pop(path, None)
+            if order is None :
+                return None
+
+            key = (order['requested_type'], order['requested_issuer'])
+            entries = self.__by_request__[key]
+            index = bisect.bisect_left(entries, (order['requested_count'], path))
+            del entries[index]
+            if not entries :
+                del self.__by_request__[key]
+
+            for (index, value) in ((self.__by_offered_type__, order['offered_type']),
+                                   (self.__by_offered_issuer__, order['offered_issuer'])) :
+                index[value].discard(path)
+                if not index[value] :
+                    del index[value]
+
+            return order
+
+    # -----------------------------------------------------------------
+    def query(self, offered_type = None, offered_issuer = None, requested_type = None, requested_issuer = None) :
+        """Return the orders that match every criterion that is not None
+        """
+        with self.__lock__ :
+            candidates = None
+            if offered_type is not None :
+                candidates = set(self.__by_offered_type__.get(offered_type, ()))
+            if offered_issuer is not None :
+                paths = self.__by_offered_issuer__.get(offered_issuer, set())
+                candidates = set(paths) if candidates is None else candidates & paths
+            if candidates is None :
+                candidates = self.__orders__.keys()
+
+            orders = [ self.__orders__[p] for p in candidates ]
+
+        if requested_type is not None :
+            orders = [ o for o in orders if o['requested_type'] == requested_type ]
+        if requested_issuer is not None :
+            orders = [ o for o in orders if o['requested_issuer'] == requested_issuer ]
+
+        return orders
+
+    # -----------------------------------------------------------------
+    def fillable(self, asset_type, issuer, count, owner = None, offered_type = None, offered_issuer = None) :
+        """Return the orders that a counterparty holding assets can fill
+
+        An order can be filled if it requests the asset type from the
+        issuer, requests no more than count assets and is either open to
+        any owner or restricted to owner. Orders are returned with the
+        best rate (offered assets per requested asset) first.
+
+        :param asset_type: asset type identifier of the assets held by the counterparty
+        :param issuer: verifying key of the issuer of the assets held by the counterparty
+        :param count: number of assets the counterparty holds
+        :param owner: verifying key of the counterparty
+        """
+        with self.__lock__ :
+            entries = self.__by_request__.get((asset_type, issuer), [])
+            limit = bisect.bisect_left(entries, (count + 1,))
+            orders = [ self.__orders__[path] for (_, path) in entries[:limit] ]
+
+        orders = [ o for o in orders if o['requested_owner'] in ('', owner) ]
+        if offered_type is not None :
+            orders = [ o for o in orders if o['offered_type'] == offered_type ]
+        if offered_issuer is not None :
+            orders = [ o for o in orders if o['offered_issuer'] == offered_issuer ]
+
+        orders.sort(key=lambda o : o['offered_count'] / max(1, o['requested_count']), reverse=True)
+        return orders
+
+    # -----------------------------------------------------------------
+    def refresh(self, state, order_paths, parallelism = 8) :
+        """Bring the book up to date with a set of order contexts
+
+        New orders are examined, known orders are examined again only if
+        the state of the order contract changed on the ledger, and orders
+        that are not in order_paths or can no longer be examined are
+        removed.
+
+        :param order_paths: list of context paths for exchange orders
+        :return: tuple with the number of orders examined and removed
+        """
+        order_paths = list(dict.fromkeys(order_paths))
+        removed = 0
+        for path in set(self.__orders__) - set(order_paths) :
+            self.remove(path)
+            removed += 1
+
+        # resolve the contract for every context, orders that have not been created are skipped
+        def resolve(path) :
+            try :
+                context = pbuilder.Context(state, path)
+                save_file = pcontract_cmd.get_contract_from_context(state, context)
+                if save_file :
+                    return (path, save_file, pcontract_cmd.get_contract(state, save_file).contract_id)
+            except Exception as e :
+                logger.debug('unable to resolve order %s; %s', path, e)
+            return None
+
+        with ThreadPoolExecutor(max_workers=max(1, parallelism)) as executor :
+            resolved = [ r for r in executor.map(resolve, order_paths) if r ]
+
+        ledger_access = ledger.get_ledger_access(state)
+        state_hashes = ledger_access.get_current_state_hashes([ contract_id for (_, _, contract_id) in resolved ])
+
+        def examine(path, save_file, contract_id) :
+            state_hash = state_hashes[contract_id]['state_hash']
+            order = self.get(path)
+            if order and order['contract_id'] == contract_id and order['state_hash'] == state_hash :
+                return False
+
+            session = pbuilder.SessionParameters(save_file=save_file)
+            try :
+                (offered_asset, requested_asset) = read_batch.send_read_requests(
+                    state, session, ['examine_offered_asset', 'examine_requested_asset'])
+                offered_asset = json.loads(offered_asset)
+                requested_asset = json.loads(requested_asset)
+            except Exception as e :
+                # the exchange contract only allows the order to be examined while it is open
+                logger.debug('order %s is not open; %s', path, e)
+                return None if self.remove(path) else False
+
+            self.add(self.create_order(path, contract_id, state_hash, offered_asset, requested_asset))
+            return True
+
+        with ThreadPoolExecutor(max_workers=max(1, parallelism)) as executor :
+            results = list(executor.map(lambda r : examine(*r), resolved))
+
+        resolved_paths = set(path for (path, _, _) in resolved)
+        for path in set(self.__orders__) - resolved_paths :
+            self.remove(path)
+            removed += 1
+
+        self.save()
+
+        examined = sum(1 for r in results if r)
+        removed += sum(1 for r in results if r is None)
+        logger.debug('order book refreshed, examined %d orders, removed %d', examined, removed)
+        return (examined, removed)
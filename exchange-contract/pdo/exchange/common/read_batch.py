@@ -0,0 +1,118 @@
+# Copyright 2022 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Batching of read-only invocations on a single contract. Reads do not
+commit state, so they can be sent concurrently; every read in a batch is
+pinned to the same enclave service so that all of the results reflect
+the same replica of the contract state. Results are returned together,
+in the order the requests were added.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from pdo.contract import invocation_request
+
+import pdo.client.commands.contract as pcontract_cmd
+from pdo.client.commands.eservice import get_eservice_from_contract
+
+import logging
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    'ReadBatch',
+    'send_read_requests',
+]
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class ReadBatch(object) :
+    """Collect read-only requests for one contract and send them together
+
+    batch = ReadBatch(state, session_params)
+    batch.add('get_name')
+    batch.add('get_description')
+    (name, description) = batch.execute()
+    """
+
+    # -----------------------------------------------------------------
+    def __init__(self, state, session_params, max_workers = 4, log_invocation = None) :
+        self.state = state
+        self.session_params = session_params.clone(commit=False)
+        self.max_workers = max(1, max_workers)
+        self.log_invocation = log_invocation
+        self.messages = []
+
+    # -----------------------------------------------------------------
+    def add(self, method, **parameters) :
+        """Add a read-only method invocation to the batch, return its position in the results
+        """
+        self.messages.append(invocation_request(method, **parameters))
+        return len(self.messages) - 1
+
+    # -----------------------------------------------------------------
+    def __pin_eservice__(self) :
+        """Resolve the enclave service once so that every read goes to the same replica
+        """
+        if self.session_params.eservice_url :
+            return self.session_params
+
+        try :
+            eservice_client = get_eservice_from_contract(self.state, self.session_params.save_file)
+            if eservice_client :
+                return self.session_params.clone(eservice_url=eservice_client.ServiceURL)
+        except Exception as e :
+            logger.debug('unable to pin the enclave service for the batch; %s', e)
+
+        return self.session_params
+
+    # -----------------------------------------------------------------
+    def execute(self) :
+        """Send the requests and return the results in the order they were added
+
+        The first failed request raises its exception after all requests complete.
+        """
+        if not self.messages :
+            return []
+
+        session_params = self.__pin_eservice__() if len(self.messages) > 1 else self.session_params
+
+        def send(message) :
+            result = pcontract_cmd.send_to_contract(self.state, message, **session_params)
+            if self.log_invocation :
+                self.log_invocation(message, result)
+            return result
+
+        if len(self.messages) == 1 :
+            return [ send(self.messages[0]) ]
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(self.messages))) as executor :
+            futures = [ executor.submit(send, message) for message in self.messages ]
+
+        return [ f.result() for f in futures ]
+
+# -----------------------------------------------------------------
+def send_read_requests(state, session_params, methods, max_workers = 4, log_invocation = None) :
+    """Send several read-only requests to one contract and return the results together
+
+    :param methods: list of method names or (method, parameters) tuples
+    """
+    batch = ReadBatch(state, session_params, max_workers, log_invocation)
+    for method in methods :
+        if isinstance(method, str) :
+            batch.add(method)
+        else :
+            batch.add(method[0], **method[1])
+
+    return batch.execute()
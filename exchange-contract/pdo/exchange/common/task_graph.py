@@ -0,0 +1,97 @@
+# Copyright 2022 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+A small dependency graph runner for multi-step contract commands. Each
+task names the tasks it depends on and receives their results as keyword
+arguments; a task is started as soon as all of its dependencies complete,
+so independent invocations overlap and the command takes as long as its
+longest chain of dependent steps.
+
+graph = TaskGraph()
+graph.add('key', get_verifying_key)
+graph.add('contract', create_contract)
+graph.add('escrow', escrow_assets, 'key', 'contract')
+results = graph.run()
+"""
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import logging
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    'TaskGraph',
+]
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class TaskGraph(object) :
+
+    # -----------------------------------------------------------------
+    def __init__(self, max_workers = 4) :
+        self.max_workers = max(1, max_workers)
+        self.__tasks__ = {}
+
+    # -----------------------------------------------------------------
+    def add(self, name, function, *dependencies) :
+        """Add a task to the graph
+
+        :param name: unique name of the task, also the keyword used to pass its result
+        :param function: called with the results of the dependencies as keyword arguments
+        :param dependencies: names of tasks that must complete first, they must already be in the graph
+        """
+        if name in self.__tasks__ :
+            raise ValueError('duplicate task {}'.format(name))
+        for dependency in dependencies :
+            if dependency not in self.__tasks__ :
+                raise ValueError('unknown dependency {} for task {}'.format(dependency, name))
+
+        self.__tasks__[name] = (function, dependencies)
+        return name
+
+    # -----------------------------------------------------------------
+    def run(self) :
+        """Run the tasks and return a dictionary that maps task names to results
+
+        If a task fails no further tasks are started, the tasks that are
+        running are allowed to finish and the first exception is raised.
+        """
+        results = {}
+        waiting = dict(self.__tasks__)
+        running = {}
+
+        def start_ready_tasks(executor) :
+            for (name, (function, dependencies)) in list(waiting.items()) :
+                if all(d in results for d in dependencies) :
+                    del waiting[name]
+                    kwargs = { d : results[d] for d in dependencies }
+                    running[executor.submit(function, **kwargs)] = name
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor :
+            start_ready_tasks(executor)
+            while running :
+                (done, _) = wait(running, return_when=FIRST_COMPLETED)
+                for future in done :
+                    name = running.pop(future)
+                    try :
+                        results[name] = future.result()
+                    except Exception :
+                        logger.debug('task %s failed', name)
+                        wait(running)
+                        raise
+
+                start_ready_tasks(executor)
+
+        return results
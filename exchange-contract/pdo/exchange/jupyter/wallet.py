@@ -17,15 +17,22 @@ import logging
 import re
 import tempfile
 import time
+import typing
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from pdo.contract import Contract
 
 import pdo.contracts.jupyter.keys as jp_keys
 import pdo.contracts.jupyter.utility as jp_util
 
 import pdo.client.builder as pbuilder
 import pdo.client.builder.command as pcommand
+import pdo.client.builder.contract as pcontract
 import pdo.client.commands.contract as pcontract_cmd
 
 import pdo.exchange.plugins.issuer as ex_issuer
+from pdo.exchange.common.balance_cache import BalanceSnapshotCache
 
 _logger = logging.getLogger(__name__)
 
@@ -33,7 +40,9 @@ __all__ = [
     'get_asset_type',
     'get_asset_owner',
     'get_asset_balance',
+    'get_asset_entry',
     'transfer_assets',
+    'transfer_assets_bulk',
     'AssetBalanceWidget',
     'AssetTransferWidget',
     'ImportIssuerWidget',
@@ -68,6 +77,9 @@ def get_asset_balance(state, wallet_path, asset_handle, owner=None) :
     issuer_context = wallet_context.get_context('issuer')
     owner = owner or issuer_context.get('identity')
 
+    return _get_issuer_balance_(state, issuer_context, owner)
+
+def _get_issuer_balance_(state, issuer_context, owner) :
     # check the balance, if the account has no balance a value error exception will be thrown; in
     # this case, that is not a problem, the value is simply assumed to be 0 (and assets may be
     # transferred to this account in the future
@@ -77,6 +89,93 @@ def get_asset_balance(state, wallet_path, asset_handle, owner=None) :
     except ValueError as ve :
         return 0
 
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+def get_asset_entry(state, wallet_path, asset_handle, owner=None) :
+    """Get the balance, ledger entry and authority for assets held by an issuer
+
+    The three reads are sent to the issuer together rather than one after
+    another. Returns a dictionary with balance, entry and authority keys;
+    an owner with no entry has a balance of 0 and no entry.
+    """
+    wallet_context = pbuilder.Context(state, f'{wallet_path}.{asset_handle}')
+    issuer_context = wallet_context.get_context('issuer')
+    owner = owner or issuer_context.get('identity')
+
+    save_file = pcontract_cmd.get_contract_from_context(state, issuer_context)
+    if not save_file :
+        raise ValueError('issuer contract must be created and initialized')
+
+    session = pbuilder.SessionParameters(save_file=save_file)
+    try :
+        return pcontract.invoke_contract_op(
+            ex_issuer.op_describe_entry, state, issuer_context, session, identity=owner)
+    except ValueError as ve :
+        authority = pcontract.invoke_contract_op(
+            ex_issuer.op_get_authority, state, issuer_context, session, identity=owner)
+        return dict(balance=0, entry=None, authority=authority)
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+def _resolve_wallet_assets_(state, wallet_path) -> list :
+    """Resolve the contexts for every asset in the wallet
+
+    Returns a list of (asset handle, issuer context, owner, asset type name) tuples.
+    """
+    wallet_context = pbuilder.Context(state, wallet_path)
+
+    assets = []
+    for asset_handle in wallet_context.get('asset_list', []) :
+        asset_context = pbuilder.Context(state, f'{wallet_path}.{asset_handle}')
+        issuer_context = asset_context.get_context('issuer')
+        asset_type_info = asset_context.get_context('asset_type').context
+        assets.append((asset_handle, issuer_context, issuer_context.get('identity'), asset_type_info['name']))
+
+    return assets
+
+def _issuer_contract_id_(state, issuer_context) :
+    """Return the contract identifier for an issuer or None if the issuer contract is unknown
+    """
+    save_file = pcontract_cmd.get_contract_from_context(state, issuer_context)
+    if not save_file :
+        return None
+    return pcontract_cmd.get_contract(state, save_file).contract_id
+
+def _issuer_state_hash_(state, issuer_context) :
+    """Return the state hash of the cached contract object for an issuer or None if it is unknown
+    """
+    save_file = pcontract_cmd.get_contract_from_context(state, issuer_context)
+    if not save_file :
+        return None
+    return pcontract_cmd.get_contract(state, save_file).contract_state.get_state_hash(encoding='b64')
+
+def _refresh_issuer_contracts_(state, issuer_contexts, max_workers = 8) :
+    """Reload the current state of a set of issuer contracts from the ledger
+
+    The save files are read directly rather than through the contract
+    cache, and the fresh state replaces the state of the cached contract
+    objects. Contracts other than these issuers keep their cached state.
+    """
+    ledger_config = state.get(['Ledger'])
+    data_directory = state.get(['Contract', 'DataDirectory'])
+
+    save_files = set()
+    for issuer_context in issuer_contexts :
+        save_file = pcontract_cmd.get_contract_from_context(state, issuer_context)
+        if save_file :
+            save_files.add(save_file)
+
+    def refresh(save_file) :
+        try :
+            contract = Contract.read_from_file(ledger_config, save_file, data_dir=data_directory)
+            pcontract_cmd.get_contract(state, save_file).contract_state = contract.contract_state
+        except Exception as e :
+            _logger.warning('unable to refresh the issuer contract in %s; %s', save_file, e)
+
+    if save_files :
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(save_files)))) as executor :
+            list(executor.map(refresh, save_files))
+
 # -----------------------------------------------------------------
 # -----------------------------------------------------------------
 def transfer_assets(state, wallet_path, asset_handle, count, new_owner, old_owner=None) :
@@ -92,6 +191,21 @@ def transfer_assets(state, wallet_path, asset_handle, count, new_owner, old_owne
     return pcommand.invoke_contract_cmd(
         ex_issuer.cmd_transfer_assets, state, issuer_context, new_owner=new_owner, count=count, identity=old_owner)
 
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+def transfer_assets_bulk(state, wallet_path, asset_handle, manifest, old_owner=None, log_file=None) :
+    """Transfer assets from the current owner to the recipients listed in a manifest
+
+    The manifest is a CSV or JSON lines file with new_owner and count for
+    each recipient; see the issuer transfer_bulk command.
+    """
+    wallet_context = pbuilder.Context(state, f'{wallet_path}.{asset_handle}')
+    issuer_context = wallet_context.get_context('issuer')
+    old_owner = old_owner or issuer_context.get('identity')
+
+    return pcommand.invoke_contract_cmd(
+        ex_issuer.cmd_transfer_bulk, state, issuer_context, manifest=manifest, log_file=log_file, identity=old_owner)
+
 # -----------------------------------------------------------------
 # -----------------------------------------------------------------
 class AssetBalanceWidget(ipywidgets.VBox) :
@@ -124,48 +238,120 @@ class AssetBalanceWidget(ipywidgets.VBox) :
 </table>
 """
 
+    pending_balance = '...'
+
     def __init__(self,
                  state : pbuilder.state.State,
                  bindings : pbuilder.bindings.Bindings,
-                 wallet_path : str) :
+                 wallet_path : str,
+                 max_workers : int = 8) :
 
         self.state = state
         self.bindings = bindings
         self.wallet_path = wallet_path
+        self.max_workers = max_workers
 
         self.balance_table = ipywidgets.HTML()
-        self.balance_table.value = self.create_balance_list()
+        self.update_balance_table()
 
         self.refresh = ipywidgets.Button(description="Refresh", button_style='info')
         self.refresh.on_click(self.refresh_button_click)
 
         super().__init__([self.balance_table, self.refresh])
 
-    def create_balance_list(self) :
+    def create_balance_list(self, callback : typing.Callable = None, invalidate : bool = False) -> str :
         """Create an HTML table with the current balances
-        """
-        wallet_context = pbuilder.Context(self.state, self.wallet_path)
-        asset_list = wallet_context.get('asset_list', [])
-
-        result = self.table_header
-        for asset_handle in asset_list :
-            balance = get_asset_balance(self.state, self.wallet_path, asset_handle)
-            owner = get_asset_owner(self.state, self.wallet_path, asset_handle)
-            asset_type_info = get_asset_type(self.state, self.wallet_path, asset_handle)
 
-            result += self.table_row.format(asset_handle, owner, asset_type_info['name'], balance)
-
-        result += self.table_footer
-        return result
+        Balances are retrieved concurrently; if a callback is provided it
+        is called with the partially filled table each time a balance
+        arrives. If invalidate is True, the issuer contracts are first
+        reloaded from the ledger. Balances for issuers whose state on the
+        ledger has not changed since the last snapshot are taken from the
+        snapshot cache without invoking the issuer; other balances are snapshotted at the
+        state of the contract object that computed them.
+        """
+        assets = _resolve_wallet_assets_(self.state, self.wallet_path)
+        if invalidate :
+            _refresh_issuer_contracts_(self.state, [ a[1] for a in assets ], self.max_workers)
+
+        snapshots = BalanceSnapshotCache.get_cache(self.state, self.wallet_path)
+        contract_ids = {}
+        for (handle, issuer_context, owner, _) in assets :
+            try :
+                contract_ids[handle] = _issuer_contract_id_(self.state, issuer_context)
+            except Exception as e :
+                _logger.debug('unable to load the issuer for %s; %s', handle, e)
+                contract_ids[handle] = None
+
+        requests = [ (contract_ids[h], owner) for (h, _, owner, _) in assets if contract_ids[h] ]
+        (cached, state_hashes) = snapshots.lookup(self.state, requests)
+
+        balances = {}
+        for (handle, _, owner, _) in assets :
+            if (contract_ids[handle], owner) in cached :
+                balances[handle] = cached[(contract_ids[handle], owner)]
+        stale = [ a for a in assets if a[0] not in balances ]
+        def render() :
+            rows = [
+                self.table_row.format(handle, owner, name, balances.get(handle, self.pending_balance))
+                for (handle, _, owner, name) in assets ]
+            return self.table_header + ''.join(rows) + self.table_footer
+
+        if callback :
+            callback(render())
+
+        if stale :
+            # balances are computed from the cached contract objects, which
+            # may be older than the state on the ledger
+            if not invalidate :
+                outdated = [
+                    issuer_context for (handle, issuer_context, _, _) in stale
+                    if contract_ids[handle] in state_hashes
+                    and _issuer_state_hash_(self.state, issuer_context) != state_hashes[contract_ids[handle]] ]
+                _refresh_issuer_contracts_(self.state, outdated, self.max_workers)
+
+            # the snapshot is recorded at the state of the contract object used for the balance
+            def get_balance(issuer_context, owner) :
+                balance = _get_issuer_balance_(self.state, issuer_context, owner)
+                return (balance, _issuer_state_hash_(self.state, issuer_context))
+
+            with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(stale)))) as executor :
+                futures = {
+                    executor.submit(get_balance, issuer_context, owner) : (handle, owner)
+                    for (handle, issuer_context, owner, _) in stale }
+                for future in as_completed(futures) :
+                    (handle, owner) = futures[future]
+                    try :
+                        (balances[handle], state_hash) = future.result()
+                    except Exception as e :
+                        _logger.warning('failed to get the balance for %s; %s', handle, e)
+                        balances[handle] = 'unavailable'
+                        continue
+                    finally :
+                        if callback :
+                            callback(render())
+
+                    if contract_ids[handle] and state_hash :
+                        snapshots.put(contract_ids[handle], owner, state_hash, balances[handle])
+
+            snapshots.save()
+
+        return render()
+
+    def update_balance_table(self, invalidate : bool = False) :
+        """Fill the balance table, rows are updated as the balances arrive
+        """
+        def update(value) :
+            self.balance_table.value = value
+        self.create_balance_list(callback=update, invalidate=invalidate)
 
     def refresh_button_click(self, b) :
         """Recompute the balance list and update the widget
 
-        In order to get most recent version of the contract, this will flush the
-        contract cache.
+        In order to get most recent version of the issuer contracts, this will
+        reload them from the ledger.
         """
-        pcontract_cmd.flush_contract_cache()
-        self.balance_table.value = self.create_balance_list()
+        self.update_balance_table(invalidate=True)
 
 # -----------------------------------------------------------------
 # -----------------------------------------------------------------
@@ -287,12 +473,13 @@ class AssetTransferWidget(ipywidgets.VBox) :
     def refresh_button_click(self, b) :
         """Handle the refresh button click
 
-        In order to get most recent version of the contract, this will flush the
-        contract cache.
+        In order to get most recent version of the issuer contracts, this will
+        reload them from the ledger.
         """
         self.feedback.clear_output()
 
-        pcontract_cmd.flush_contract_cache()
+        assets = _resolve_wallet_assets_(self.state, self.wallet_path)
+        _refresh_issuer_contracts_(self.state, [ a[1] for a in assets ])
         self.reset_widget()
 
     def submit_button_click(self, b) :
@@ -22,6 +22,8 @@ import pdo.client.builder.contract as pcontract
 import pdo.client.builder.shell as pshell
 import pdo.client.commands.contract as pcontract_cmd
 
+import pdo.exchange.common.read_batch as read_batch
+
 __all__ = [
     'op_initialize',
     'op_get_asset_type_identifier',
@@ -80,16 +82,8 @@ class op_describe(pcontract.contract_op_base) :
 
     @classmethod
     def invoke(cls, state, session_params, **kwargs) :
-        session_params['commit'] = False
-
-        message = invocation_request('get_name')
-        name = pcontract_cmd.send_to_contract(state, message, **session_params)
-
-        message = invocation_request('get_description')
-        description = pcontract_cmd.send_to_contract(state, message, **session_params)
-
-        message = invocation_request('get_link')
-        link = pcontract_cmd.send_to_contract(state, message, **session_params)
+        (name, description, link) = read_batch.send_read_requests(
+            state, session_params, ['get_name', 'get_description', 'get_link'])
 
         cls.display("NAME: {0}".format(name))
         cls.display("DESC: {0}".format(description))
@@ -22,9 +22,13 @@ import pdo.client.builder.command as pcommand
 import pdo.client.builder.contract as pcontract
 import pdo.client.builder.shell as pshell
 import pdo.client.commands.contract as pcontract_cmd
-import pdo.common.utility as putils
 
 import pdo.client.plugins.common as common
+import pdo.contracts.key_index as key_index
+import pdo.exchange.common.immutable_cache as immutable_cache
+import pdo.exchange.common.order_book as order_book
+import pdo.exchange.common.read_batch as read_batch
+import pdo.exchange.common.task_graph as task_graph
 import pdo.exchange.plugins.issuer as pi_issuer
 
 __all__ = [
@@ -33,6 +37,7 @@ __all__ = [
     'op_cancel_exchange',
     'op_examine_offered_asset',
     'op_examine_requested_asset',
+    'op_examine_order',
     'op_exchange',
     'op_claim_offered_asset',
     'op_claim_exchanged_asset',
@@ -40,6 +45,7 @@ __all__ = [
     'cmd_match_order',
     'cmd_cancel_order',
     'cmd_examine_order',
+    'cmd_find_orders',
     'cmd_claim_offer',
     'cmd_claim_payment',
     'cmd_release',
@@ -158,6 +164,21 @@ class op_examine_requested_asset(pcontract.contract_op_base) :
 
         return result
 
+## -----------------------------------------------------------------
+## -----------------------------------------------------------------
+class op_examine_order(pcontract.contract_op_base) :
+
+    name = "examine_order"
+    help = "retrieve the offered and requested assets in one batch of reads"
+
+    @classmethod
+    def invoke(cls, state, session_params, **kwargs) :
+        (offered_asset, requested_asset) = read_batch.send_read_requests(
+            state, session_params, ['examine_offered_asset', 'examine_requested_asset'],
+            log_invocation=cls.log_invocation)
+
+        return (offered_asset, requested_asset)
+
 ## -----------------------------------------------------------------
 ## -----------------------------------------------------------------
 class op_exchange(pcontract.contract_op_base) :
@@ -217,6 +238,16 @@ class op_claim_exchanged_asset(pcontract.contract_op_base) :
 
         return result
 
+## -----------------------------------------------------------------
+def _load_contract_session_(state, save_file) :
+    """Load a contract ahead of its first invocation and return a session for it
+
+    Loading the contract reads the save file and the contract state; doing
+    this in a task lets it overlap with invocations on other contracts.
+    """
+    pcontract_cmd.get_contract(state, save_file)
+    return pbuilder.SessionParameters(save_file=save_file)
+
 ## -----------------------------------------------------------------
 ## -----------------------------------------------------------------
 class cmd_create_order(pcommand.contract_command_base) :
@@ -314,26 +345,12 @@ class cmd_create_order(pcommand.contract_command_base) :
             raise ValueError("request issuer contract has not been created or is unknown")
 
         request_issuer_session = pbuilder.SessionParameters(save_file=request_issuer_save_file)
-        request_issuer_verifying_key = pcontract.invoke_contract_op(
-            common.op_get_verifying_key,
-            state, request_issuer_context, request_issuer_session,
-            **kwargs)
-        request_issuer_verifying_key = json.loads(request_issuer_verifying_key)
-
-        asset_type_contract_id = pcontract.invoke_contract_op(
-            pi_issuer.op_get_asset_type_identifier,
-            state, request_issuer_context, request_issuer_session,
-            **kwargs)
-        asset_type_contract_id = json.loads(asset_type_contract_id)
 
         # now see if there is a specific user specified
         user_verifying_key = ""
         user_identity = request_user or context.get('request.user_identity')
         if user_identity is not None :
-            keypath = state.get(['Key', 'SearchPath'])
-            keyfile = putils.find_file_in_path("{0}_public.pem".format(user_identity), keypath)
-            with open (keyfile, "r") as myfile:
-                user_verifying_key = myfile.read()
+            user_verifying_key = key_index.find_public_key(state, user_identity)
 
         # lastly make sure the count is set
         request_count = int(request_count) if request_count is not None else int(context.get('request.count', 1))
@@ -352,8 +369,6 @@ class cmd_create_order(pcommand.contract_command_base) :
         if offer_issuer_save_file is None :
             raise ValueError("issuer contract has not been created")
 
-        offer_issuer_session = pbuilder.SessionParameters(save_file=offer_issuer_save_file)
-
         # make sure there is a count
         offer_count = int(offer_count) if offer_count is not None else int(context.get('offer.count', 1))
 
@@ -363,40 +378,74 @@ class cmd_create_order(pcommand.contract_command_base) :
         if  pcontract_cmd.get_contract_from_context(state,context) :
             raise ValueError("exchange contract already exists")
 
-        save_file = pcontract_cmd.create_contract_from_context(state, context, 'exchange_contract', **kwargs)
-        context['save_file'] = save_file
+        # the reads from the request issuer and loading the offer issuer run
+        # concurrently; the exchange contract is created only after the
+        # request issuer reads succeed so that a bad request issuer does not
+        # leave an orphaned contract behind, the escrow waits for the
+        # contract and the offer issuer, and initialization waits for the escrow
+        def get_request_issuer_verifying_key() :
+            result = immutable_cache.invoke_contract_op(
+                common.op_get_verifying_key,
+                state, request_issuer_context, request_issuer_session,
+                **kwargs)
+            return json.loads(result)
 
-        # prepare the material to initialize the exchange contract
-        session = pbuilder.SessionParameters(save_file=save_file)
-        verifying_key = pcontract.invoke_contract_op(common.op_get_verifying_key, state, context, session)
-        verifying_key = json.loads(verifying_key)
+        def get_asset_type_contract_id() :
+            result = immutable_cache.invoke_contract_op(
+                pi_issuer.op_get_asset_type_identifier,
+                state, request_issuer_context, request_issuer_session,
+                **kwargs)
+            return json.loads(result)
 
-        # escrow the offered assets to the exchange contract
-        escrow_attestation = pcontract.invoke_contract_op(
-            pi_issuer.op_escrow,
-            state, offer_issuer_context, offer_issuer_session,
-            verifying_key,
-            offer_count,
-            **kwargs)
-        escrow_attestation = json.loads(escrow_attestation)
+        def create_exchange_contract(**_) :
+            save_file = pcontract_cmd.create_contract_from_context(state, context, 'exchange_contract', **kwargs)
+            context['save_file'] = save_file
+            return save_file
 
-        # initialize
-        try :
-            pcontract.invoke_contract_op(
-                op_initialize,
-                state, context, session,
-                escrow_attestation,
-                request_issuer_verifying_key,
-                asset_type_contract_id,
-                user_verifying_key,
-                request_count,
-                **kwargs)
-        except Exception as e :
-            # eventually we need to release the assets from escrow when
-            # the contract fails to initialize correctly
-            raise e
+        def get_verifying_key(save_file) :
+            session = pbuilder.SessionParameters(save_file=save_file)
+            result = immutable_cache.invoke_contract_op(common.op_get_verifying_key, state, context, session)
+            return json.loads(result)
 
-        return save_file
+        # escrow the offered assets to the exchange contract
+        def escrow_offered_assets(verifying_key, offer_issuer) :
+            result = pcontract.invoke_contract_op(
+                pi_issuer.op_escrow,
+                state, offer_issuer_context, offer_issuer,
+                verifying_key,
+                offer_count,
+                **kwargs)
+            return json.loads(result)
+
+        def initialize(save_file, escrow_attestation, request_issuer_verifying_key, asset_type_contract_id) :
+            session = pbuilder.SessionParameters(save_file=save_file)
+            try :
+                pcontract.invoke_contract_op(
+                    op_initialize,
+                    state, context, session,
+                    escrow_attestation,
+                    request_issuer_verifying_key,
+                    asset_type_contract_id,
+                    user_verifying_key,
+                    request_count,
+                    **kwargs)
+            except Exception as e :
+                # eventually we need to release the assets from escrow when
+                # the contract fails to initialize correctly
+                raise e
+
+        graph = task_graph.TaskGraph()
+        graph.add('request_issuer_verifying_key', get_request_issuer_verifying_key)
+        graph.add('asset_type_contract_id', get_asset_type_contract_id)
+        graph.add('offer_issuer', lambda : _load_contract_session_(state, offer_issuer_save_file))
+        graph.add('save_file', create_exchange_contract, 'request_issuer_verifying_key', 'asset_type_contract_id')
+        graph.add('verifying_key', get_verifying_key, 'save_file')
+        graph.add('escrow_attestation', escrow_offered_assets, 'verifying_key', 'offer_issuer')
+        graph.add('initialize', initialize,
+                  'save_file', 'escrow_attestation', 'request_issuer_verifying_key', 'asset_type_contract_id')
+        results = graph.run()
+
+        return results['save_file']
 
 ## -----------------------------------------------------------------
 ## -----------------------------------------------------------------
@@ -432,34 +481,42 @@ class cmd_match_order(pcommand.contract_command_base) :
         if issuer_save_file is None :
             raise ValueError("unable to locate issuer contract")
 
-        issuer_session = pbuilder.SessionParameters(save_file=issuer_save_file)
-
         # make sure there is a count
         count = int(count) if count is not None else context['request.count']
 
         # prepare the material to initialize the exchange contract
-        verifying_key = pcontract.invoke_contract_op(common.op_get_verifying_key, state, context, session)
-        verifying_key = json.loads(verifying_key)
+        def get_verifying_key() :
+            result = immutable_cache.invoke_contract_op(common.op_get_verifying_key, state, context, session)
+            return json.loads(result)
 
         # escrow the offered assets to the exchange contract
-        escrow_attestation = pcontract.invoke_contract_op(
-            pi_issuer.op_escrow,
-            state, issuer_context, issuer_session,
-            verifying_key,
-            count,
-            **kwargs)
-        escrow_attestation = json.loads(escrow_attestation)
-
-        try :
-            pcontract.invoke_contract_op(
-                op_exchange,
-                state, context, session,
-                escrow_attestation,
+        def escrow_assets(verifying_key, issuer_session) :
+            result = pcontract.invoke_contract_op(
+                pi_issuer.op_escrow,
+                state, issuer_context, issuer_session,
+                verifying_key,
+                count,
                 **kwargs)
-        except Exception as e :
-            # eventually we need to release the assets from escrow when
-            # the offer is rejected
-            raise e
+            return json.loads(result)
+
+        def exchange(escrow_attestation) :
+            try :
+                pcontract.invoke_contract_op(
+                    op_exchange,
+                    state, context, session,
+                    escrow_attestation,
+                    **kwargs)
+            except Exception as e :
+                # eventually we need to release the assets from escrow when
+                # the offer is rejected
+                raise e
+
+        graph = task_graph.TaskGraph()
+        graph.add('verifying_key', get_verifying_key)
+        graph.add('issuer_session', lambda : _load_contract_session_(state, issuer_save_file))
+        graph.add('escrow_attestation', escrow_assets, 'verifying_key', 'issuer_session')
+        graph.add('exchange', exchange, 'escrow_attestation')
+        graph.run()
 
         cls.display('offer made and accepted')
         return save_file
@@ -478,7 +535,6 @@ class cmd_cancel_order(pcommand.contract_command_base) :
         issuer_save_file = pcontract_cmd.get_contract_from_context(state, issuer_context)
         if not issuer_save_file :
             raise ValueError('failed to find the issuer contract')
-        issuer_session = pbuilder.SessionParameters(save_file=issuer_save_file)
 
         # get the exchange contract reference
         save_file = pcontract_cmd.get_contract_from_context(state, context)
@@ -487,18 +543,26 @@ class cmd_cancel_order(pcommand.contract_command_base) :
         session = pbuilder.SessionParameters(save_file=save_file)
 
         # cancel the exchange
-        escrow_release_attestation = pcontract.invoke_contract_op(
-            op_cancel_exchange,
-            state, context, session,
-            **kwargs)
-        escrow_release_attestation = json.loads(escrow_release_attestation)
+        def cancel_exchange() :
+            result = pcontract.invoke_contract_op(
+                op_cancel_exchange,
+                state, context, session,
+                **kwargs)
+            return json.loads(result)
 
-        # release the assets from escro
-        pcontract.invoke_contract_op(
-            pi_issuer.op_release,
-            state, context, issuer_session,
-            escrow_release_attestation,
-            **kwargs)
+        # release the assets from escrow
+        def release_assets(escrow_release_attestation, issuer_session) :
+            pcontract.invoke_contract_op(
+                pi_issuer.op_release,
+                state, context, issuer_session,
+                escrow_release_attestation,
+                **kwargs)
+
+        graph = task_graph.TaskGraph()
+        graph.add('escrow_release_attestation', cancel_exchange)
+        graph.add('issuer_session', lambda : _load_contract_session_(state, issuer_save_file))
+        graph.add('release', release_assets, 'escrow_release_attestation', 'issuer_session')
+        graph.run()
 
         cls.display('exchange cancelled')
         return save_file
@@ -521,26 +585,84 @@ class cmd_examine_order(pcommand.contract_command_base) :
 
         session = pbuilder.SessionParameters(save_file=save_file)
 
-        offered_asset = pcontract.invoke_contract_op(
-            op_examine_offered_asset,
+        (offered_asset, requested_asset) = pcontract.invoke_contract_op(
+            op_examine_order,
             state, context, session,
             **kwargs)
         offered_asset = json.loads(offered_asset)
+        requested_asset = json.loads(requested_asset)
 
         cls.display_highlight('offered asset is:')
         cls.display(json.dumps(offered_asset, indent=4))
 
-        requested_asset = pcontract.invoke_contract_op(
-            op_examine_requested_asset,
-            state, context, session,
-            **kwargs)
-        requested_asset = json.loads(requested_asset)
-
         cls.display('')
         cls.display_highlight('requested asset is:')
         cls.display(json.dumps(requested_asset, indent=4))
 
 
+## -----------------------------------------------------------------
+## -----------------------------------------------------------------
+class cmd_find_orders(pcommand.contract_command_base) :
+    name = "find_orders"
+    help = "script to find open orders that can be filled with assets from an issuer"
+
+    @classmethod
+    def add_arguments(cls, parser) :
+        parser.add_argument(
+            '--issuer',
+            help='context identifier for the issuer of the assets used to fill the order',
+            type=str, required=True)
+        parser.add_argument(
+            '--count',
+            help='maximum number of assets to pay for an order',
+            type=int, required=True)
+        parser.add_argument(
+            '--offer-issuer',
+            help='context identifier for the issuer of the assets wanted in return',
+            type=str)
+        parser.add_argument(
+            '--prefix',
+            help='context prefix where order contexts are located',
+            type=str, default='')
+        parser.add_argument(
+            '--no-refresh',
+            help='query the order book without examining new or changed orders',
+            action='store_true')
+
+    @classmethod
+    def invoke(cls, state, context, issuer, count, offer_issuer=None, prefix='', no_refresh=False, **kwargs) :
+        book = order_book.OrderBook.get_order_book(state)
+        if not no_refresh :
+            book.refresh(state, order_book.find_order_contexts(state, prefix))
+
+        def issuer_information(issuer_path) :
+            issuer_context = pbuilder.Context(state, issuer_path)
+            issuer_save_file = pcontract_cmd.get_contract_from_context(state, issuer_context)
+            if issuer_save_file is None :
+                raise ValueError("unable to locate issuer contract {}".format(issuer_path))
+
+            issuer_session = pbuilder.SessionParameters(save_file=issuer_save_file)
+            verifying_key = immutable_cache.invoke_contract_op(
+                common.op_get_verifying_key, state, issuer_context, issuer_session)
+            asset_type_id = immutable_cache.invoke_contract_op(
+                pi_issuer.op_get_asset_type_identifier, state, issuer_context, issuer_session)
+            return (json.loads(asset_type_id), json.loads(verifying_key))
+
+        (asset_type_id, issuer_verifying_key) = issuer_information(issuer)
+        (offered_type, offered_issuer) = issuer_information(offer_issuer) if offer_issuer else (None, None)
+
+        # orders may be restricted to a specific counterparty
+        owner = key_index.find_public_key(state, kwargs.get('identity') or state.identity)
+
+        orders = book.fillable(
+            asset_type_id, issuer_verifying_key, count,
+            owner=owner, offered_type=offered_type, offered_issuer=offered_issuer)
+
+        for order in orders :
+            cls.display('{} offers {} for {}'.format(order['path'], order['offered_count'], order['requested_count']))
+
+        return [ order['path'] for order in orders ]
+
 ## -----------------------------------------------------------------
 ## -----------------------------------------------------------------
 class cmd_claim_offer(pcommand.contract_command_base) :
@@ -570,21 +692,28 @@ class cmd_claim_offer(pcommand.contract_command_base) :
         if offer_issuer_save_file is None :
             raise ValueError("issuer contract has not been created")
 
-        offer_issuer_session = pbuilder.SessionParameters(save_file=offer_issuer_save_file)
-
-        # now get the claim attestation
-        offered_asset_claim = pcontract.invoke_contract_op(
-            op_claim_offered_asset,
-            state, context, session,
-            **kwargs)
-        offered_asset_claim = json.loads(offered_asset_claim)
+        # now get the claim attestation, the issuer is loaded while the
+        # exchange contract produces the claim
+        def get_claim() :
+            result = pcontract.invoke_contract_op(
+                op_claim_offered_asset,
+                state, context, session,
+                **kwargs)
+            return json.loads(result)
 
         # and send it to the offer issuer to transfer the assets & release the escrow
-        pcontract.invoke_contract_op(
-            pi_issuer.op_claim,
-            state, offer_issuer_context, offer_issuer_session,
-            offered_asset_claim,
-            **kwargs)
+        def claim_assets(asset_claim, issuer_session) :
+            pcontract.invoke_contract_op(
+                pi_issuer.op_claim,
+                state, offer_issuer_context, issuer_session,
+                asset_claim,
+                **kwargs)
+
+        graph = task_graph.TaskGraph()
+        graph.add('asset_claim', get_claim)
+        graph.add('issuer_session', lambda : _load_contract_session_(state, offer_issuer_save_file))
+        graph.add('claim', claim_assets, 'asset_claim', 'issuer_session')
+        graph.run()
 
         cls.display('offered assets claimed')
         return save_file
@@ -618,21 +747,28 @@ class cmd_claim_payment(pcommand.contract_command_base) :
         if request_issuer_save_file is None :
             raise ValueError("issuer contract has not been created")
 
-        request_issuer_session = pbuilder.SessionParameters(save_file=request_issuer_save_file)
-
-        # now get the claim attestation
-        requested_asset_claim = pcontract.invoke_contract_op(
-            op_claim_exchanged_asset,
-            state, context, session,
-            **kwargs)
-        requested_asset_claim = json.loads(requested_asset_claim)
+        # now get the claim attestation, the issuer is loaded while the
+        # exchange contract produces the claim
+        def get_claim() :
+            result = pcontract.invoke_contract_op(
+                op_claim_exchanged_asset,
+                state, context, session,
+                **kwargs)
+            return json.loads(result)
 
         # and send it to the offer issuer to transfer the assets & release the escrow
-        pcontract.invoke_contract_op(
-            pi_issuer.op_claim,
-            state, request_issuer_context, request_issuer_session,
-            requested_asset_claim,
-            **kwargs)
+        def claim_assets(asset_claim, issuer_session) :
+            pcontract.invoke_contract_op(
+                pi_issuer.op_claim,
+                state, request_issuer_context, issuer_session,
+                asset_claim,
+                **kwargs)
+
+        graph = task_graph.TaskGraph()
+        graph.add('asset_claim', get_claim)
+        graph.add('issuer_session', lambda : _load_contract_session_(state, request_issuer_save_file))
+        graph.add('claim', claim_assets, 'asset_claim', 'issuer_session')
+        graph.run()
 
         cls.display('requested assets claimed')
         return save_file
@@ -672,6 +808,7 @@ __commands__ = [
     cmd_match_order,
     cmd_cancel_order,
     cmd_examine_order,
+    cmd_find_orders,
     cmd_claim_offer,
     cmd_claim_payment,
     cmd_release,
@@ -18,7 +18,6 @@ import logging
 import pdo.common.crypto as pcrypto
 from pdo.contract import ContractCode
 from pdo.contract import invocation_request
-from pdo.submitter.create import create_submitter
 
 import pdo.client.builder as pbuilder
 import pdo.client.builder.command as pcommand
@@ -27,6 +26,7 @@ import pdo.client.builder.shell as pshell
 import pdo.client.commands.contract as pcontract_cmd
 
 import pdo.client.plugins.common as common
+import pdo.exchange.common.ledger as ledger
 
 __all__ = [
     'op_initialize',
@@ -203,8 +203,7 @@ class cmd_create_guardian(pcommand.contract_command_base) :
             return
 
         # need the ledger key as the root of trust for binding to the issuer
-        ledger_submitter = create_submitter(state.get(['Ledger']))
-        ledger_key = ledger_submitter.get_ledger_info()
+        ledger_key = ledger.get_ledger_access(state).ledger_key
 
         # create the guardian contract
         save_file = pcontract_cmd.create_contract_from_context(state, context, 'guardian', **kwargs)
@@ -16,7 +16,6 @@ import importlib
 import json
 import logging
 
-import pdo.common.utility as putils
 from pdo.contract import invocation_request
 
 import pdo.client.builder as pbuilder
@@ -26,6 +25,11 @@ import pdo.client.builder.shell as pshell
 import pdo.client.commands.contract as pcontract_cmd
 
 import pdo.client.plugins.common as common
+import pdo.contracts.key_index as key_index
+import pdo.exchange.common.bulk as bulk
+import pdo.exchange.common.immutable_cache as immutable_cache
+import pdo.exchange.common.ledger as ledger
+import pdo.exchange.common.read_batch as read_batch
 import pdo.exchange.plugins.asset_type as asset_type
 import pdo.exchange.plugins.vetting as vetting
 
@@ -34,6 +38,7 @@ __all__ = [
     'op_get_authority',
     'op_get_balance',
     'op_get_entry',
+    'op_describe_entry',
     'op_issue',
     'op_transfer',
     'op_escrow',
@@ -46,6 +51,8 @@ __all__ = [
     'cmd_create_issuer',
     'cmd_initialize_issuer',
     'cmd_issue_assets',
+    'cmd_issue_bulk',
+    'cmd_transfer_bulk',
     'cmd_get_balance',
     'cmd_transfer_assets',
     'do_issuer',
@@ -136,6 +143,21 @@ class op_get_entry(pcontract.contract_op_base) :
 
         return result
 
+## -----------------------------------------------------------------
+## -----------------------------------------------------------------
+class op_describe_entry(pcontract.contract_op_base) :
+
+    name = "describe_entry"
+    help = "retrieve the balance, ledger entry and authority in one batch of reads"
+
+    @classmethod
+    def invoke(cls, state, session_params, **kwargs) :
+        (balance, entry, authority) = read_batch.send_read_requests(
+            state, session_params, ['get_balance', 'get_entry', 'get_authority'],
+            log_invocation=cls.log_invocation)
+
+        return dict(balance=balance, entry=entry, authority=authority)
+
 ## -----------------------------------------------------------------
 ## -----------------------------------------------------------------
 class op_issue(pcontract.contract_op_base) :
@@ -303,7 +325,7 @@ class cmd_create_issuer(pcommand.contract_command_base) :
         context['save_file'] = save_file
 
         session = pbuilder.SessionParameters(save_file=save_file)
-        verifying_key = pcontract.invoke_contract_op(
+        verifying_key = immutable_cache.invoke_contract_op(
             common.op_get_verifying_key,
             state, context, session,
             **kwargs)
@@ -332,7 +354,7 @@ class cmd_initialize_issuer(pcommand.contract_command_base) :
         session = pbuilder.SessionParameters(save_file=save_file)
         verifying_key = context.get('verifying_key')
         if verifying_key is None :
-            verifying_key = pcontract.invoke_contract_op(common.op_get_verifying_key, state, context, session)
+            verifying_key = immutable_cache.invoke_contract_op(common.op_get_verifying_key, state, context, session)
             verifying_key = json.loads(verifying_key)
 
         # get the approved authority from the vetting organization
@@ -377,10 +399,7 @@ class cmd_issue_assets(pcommand.contract_command_base) :
             raise ValueError('issuer contract must be created and initialized')
 
         # get all the information necessary to register this contract as an endpoint with the guardian
-        keypath = state.get(['Key', 'SearchPath'])
-        keyfile = putils.find_file_in_path("{0}_public.pem".format(owner), keypath)
-        with open (keyfile, "r") as myfile:
-            verifying_key = myfile.read()
+        verifying_key = key_index.find_public_key(state, owner)
 
         session = pbuilder.SessionParameters(save_file=save_file)
         pcontract.invoke_contract_op(
@@ -393,6 +412,208 @@ class cmd_issue_assets(pcommand.contract_command_base) :
         cls.display('issued {} assets to {}'.format(count, owner))
         return True
 
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+class cmd_issue_bulk(pcommand.contract_command_base) :
+    """Issue assets to the owners listed in a manifest
+
+    The manifest is a CSV file with owner and count columns or a JSON lines
+    file with owner and count fields; owners are names of public key files
+    in the key search path. Issue invocations are sent without waiting for
+    the ledger to commit them; after every in_flight invocations the
+    command waits for the pending commits and records the completed rows
+    in the result log. Running the command again with the same log skips
+    the completed rows. An owner may appear only once in the manifest.
+    """
+
+    name = "issue_bulk"
+    help = "issue assets to the owners listed in a manifest"
+
+    @classmethod
+    def add_arguments(cls, parser) :
+        parser.add_argument('-m', '--manifest', help='CSV or JSON lines file with owner and count for each issuance', type=str, required=True)
+        parser.add_argument('--log-file', help='file where the result of each issuance is recorded', type=str)
+        parser.add_argument('--in-flight', help='number of issuances sent before waiting for commits', type=int, default=8)
+
+    @classmethod
+    def invoke(cls, state, context, manifest, log_file=None, in_flight=8, **kwargs) :
+        save_file = pcontract_cmd.get_contract_from_context(state, context)
+        if not save_file :
+            raise ValueError('issuer contract must be created and initialized')
+
+        result_log = bulk.ResultLog(log_file or manifest + '.log')
+        keys = key_index.get_key_index(state)
+        session = pbuilder.SessionParameters(save_file=save_file)
+
+        # the contract rejects a second issuance to the same owner, so a
+        # manifest that lists an owner twice is rejected before anything is issued
+        owners = set()
+        for (row_number, row) in bulk.read_manifest(manifest, { 'owner' : str, 'count' : int }) :
+            if row['owner'] in owners :
+                raise ValueError('duplicate owner {} in manifest row {}'.format(row['owner'], row_number))
+            owners.add(row['owner'])
+
+        skipped = []
+        unknown = []
+
+        # generate the rows that still need to be issued along with the owner
+        # key and whether an earlier run sent the issuance without completing it
+        def pending() :
+            for (_, row) in bulk.read_manifest(manifest, { 'owner' : str, 'count' : int }) :
+                # owners are unique in the manifest, so the log is keyed by
+                # owner and stays valid if rows are reordered between runs
+                record = dict(row, key=row['owner'])
+                if result_log.completed(record['key']) :
+                    skipped.append(record['key'])
+                    continue
+                attempted = result_log.latest(record['key']) is not None
+                try :
+                    yield (record, (keys.public_key(row['owner']), attempted))
+                except ValueError as e :
+                    result_log.write([ dict(record, status='failed', error=str(e)) ])
+                    unknown.append(record['key'])
+
+        # the issuance is logged as sent before it is invoked so that an
+        # interrupted run leaves a record of the rows that may have been applied
+        def issue(record, payload, wait) :
+            (verifying_key, _) = payload
+            result_log.write([ dict(record, status='sent') ])
+            pcontract.invoke_contract_op(
+                op_issue,
+                state, context, session.clone(wait=wait),
+                verifying_key,
+                record['count'],
+                **kwargs)
+
+        # a duplicate issuance for a row that an earlier run logged but did not
+        # complete means that the earlier issuance was committed
+        def duplicate(record, payload, e) :
+            (_, attempted) = payload
+            return attempted and 'duplicate issuance' in str(e)
+
+        def sync() :
+            ledger.wait_for_commit(state, save_file)
+
+        counts = bulk.pipeline(pending(), issue, result_log, in_flight=in_flight, recover=duplicate, sync=sync)
+        failed = counts['failed'] + len(unknown)
+
+        cls.display('issued assets to {} owners, skipped {}, failed {}'.format(counts['complete'], len(skipped), failed))
+        return failed == 0
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+class cmd_transfer_bulk(pcommand.contract_command_base) :
+    """Transfer assets to the recipients listed in a manifest
+
+    The manifest is a CSV file with new_owner and count columns or a JSON
+    lines file with new_owner and count fields. The total is checked
+    against the current balance before any transfer is made. Transfers
+    are pipelined as for issue_bulk and the result log is keyed by
+    recipient. Each transfer is logged as sent before it is invoked; when
+    the command is run again after an interruption, the current balance
+    determines which of the sent transfers were applied. If the balance
+    does not match, the command stops and lists the unconfirmed recipients
+    so the operator can resolve them before anything else is transferred.
+    """
+
+    name = "transfer_bulk"
+    help = "transfer assets to the recipients listed in a manifest"
+
+    @classmethod
+    def add_arguments(cls, parser) :
+        parser.add_argument('-m', '--manifest', help='CSV or JSON lines file with new_owner and count for each transfer', type=str, required=True)
+        parser.add_argument('--log-file', help='file where the result of each transfer is recorded', type=str)
+        parser.add_argument('--in-flight', help='number of transfers sent before waiting for commits', type=int, default=8)
+        parser.add_argument('--retries', help='number of times a failed transfer is retried', type=int, default=2)
+
+    @classmethod
+    def invoke(cls, state, context, manifest, log_file=None, in_flight=8, retries=2, **kwargs) :
+        save_file = pcontract_cmd.get_contract_from_context(state, context)
+        if not save_file :
+            raise ValueError('issuer contract must be created and initialized')
+
+        result_log = bulk.ResultLog(log_file or manifest + '.log')
+        keys = key_index.get_key_index(state)
+        session = pbuilder.SessionParameters(save_file=save_file)
+
+        # read the recipients and resolve their keys before anything is transferred
+        transfers = []
+        recipients = set()
+        for (row_number, row) in bulk.read_manifest(manifest, { 'new_owner' : str, 'count' : int }) :
+            if row['new_owner'] in recipients :
+                raise ValueError('duplicate recipient {} in manifest row {}'.format(row['new_owner'], row_number))
+            recipients.add(row['new_owner'])
+
+            record = dict(row, key=row['new_owner'])
+            if row['count'] <= 0 :
+                raise ValueError('invalid count in manifest row {}'.format(row_number))
+            if not result_log.completed(record['key']) :
+                transfers.append((record, keys.public_key(row['new_owner'])))
+
+        def get_balance() :
+            try :
+                return int(pcontract.invoke_contract_op(op_get_balance, state, context, session, **kwargs))
+            except ValueError :
+                return 0
+
+        balance = get_balance()
+
+        # transfers that an interrupted run sent but did not log are found from
+        # the balance; commits are applied in the order the transfers were sent
+        # so the balance identifies the last one that was applied
+        unconfirmed = [ result_log.latest(record['key']) for (record, _) in transfers ]
+        unconfirmed = [ r for r in unconfirmed if r and r.get('status') == 'sent' ]
+        if unconfirmed :
+            expected = set()
+            if all('balance' in r for r in unconfirmed) :
+                expected = { r['balance'] for r in unconfirmed } | { max(r['balance'] + r['count'] for r in unconfirmed) }
+            if balance not in expected :
+                raise ValueError('balance {} does not match the unconfirmed transfers to {}; check the recipients and update {}'.format(
+                    balance, ', '.join(sorted(r['key'] for r in unconfirmed)), result_log.filename))
+
+            result_log.write([
+                dict(r, status='complete', recovered=True) if r['balance'] >= balance else
+                dict(r, status='failed', error='not applied by an interrupted run')
+                for r in unconfirmed ])
+            transfers = [ (record, verifying_key) for (record, verifying_key) in transfers if not result_log.completed(record['key']) ]
+
+        total = sum(record['count'] for (record, _) in transfers)
+        if total > balance :
+            raise ValueError('insufficient balance, {} assets requested, {} available'.format(total, balance))
+
+        # each transfer is logged as sent, with the balance expected once it is
+        # applied, before it is invoked
+        expected = { 'balance' : balance }
+        def transfer(record, verifying_key, wait) :
+            result_log.write([ dict(record, status='sent', balance=expected['balance'] - record['count']) ])
+            pcontract.invoke_contract_op(
+                op_transfer,
+                state, context, session.clone(wait=wait),
+                new_owner=verifying_key,
+                count=record['count'],
+                **kwargs)
+            expected['balance'] -= record['count']
+
+        # a transfer that failed after it was applied shows up in the balance
+        def applied(record, verifying_key, e) :
+            if get_balance() != expected['balance'] - record['count'] :
+                return False
+            expected['balance'] -= record['count']
+            return True
+
+        def sync() :
+            ledger.wait_for_commit(state, save_file)
+
+        counts = bulk.pipeline(transfers, transfer, result_log, in_flight=in_flight, retries=retries, recover=applied, sync=sync)
+
+        for recipient in sorted(recipients) :
+            record = result_log.latest(recipient) or { 'status' : 'unconfirmed', 'count' : '' }
+            cls.display('{}: {} {}'.format(recipient, record['status'], record.get('error', record['count'])))
+
+        cls.display('transferred assets to {} recipients, skipped {}, failed {}'.format(
+            counts['complete'], len(recipients) - len(transfers), counts['failed']))
+        return counts['failed'] == 0
+
 # -----------------------------------------------------------------
 # -----------------------------------------------------------------
 class cmd_get_balance(pcommand.contract_command_base) :
@@ -451,10 +672,7 @@ class cmd_transfer_assets(pcommand.contract_command_base) :
         if not save_file :
             raise ValueError('issuer contract must be created and initialized')
 
-        keypath = state.get(['Key', 'SearchPath'])
-        new_owner_key_file = putils.find_file_in_path("{0}_public.pem".format(new_owner), keypath)
-        with open (new_owner_key_file, "r") as myfile:
-            new_owner_key = myfile.read()
+        new_owner_key = key_index.find_public_key(state, new_owner)
 
         session = pbuilder.SessionParameters(save_file=save_file)
         pcontract.invoke_contract_op(
@@ -492,8 +710,10 @@ __commands__ = [
     cmd_create_issuer,
     cmd_initialize_issuer,
     cmd_issue_assets,
+    cmd_issue_bulk,
     cmd_get_balance,
     cmd_transfer_assets,
+    cmd_transfer_bulk,
     vetting.cmd_approve_issuer,
 ]
 
@@ -19,7 +19,6 @@ import logging
 import pdo.common.crypto as crypto
 from pdo.contract import ContractCode
 from pdo.contract import invocation_request
-from pdo.submitter.create import create_submitter
 
 import pdo.client.builder as pbuilder
 import pdo.client.builder.command as pcommand
@@ -28,6 +27,8 @@ import pdo.client.builder.shell as pshell
 import pdo.client.commands.contract as pcontract_cmd
 
 import pdo.client.plugins.common as common
+import pdo.exchange.common.immutable_cache as immutable_cache
+import pdo.exchange.common.ledger as ledger
 import pdo.exchange.plugins.asset_type as asset_type
 import pdo.exchange.plugins.vetting as vetting
 import pdo.exchange.plugins.guardian as guardian
@@ -226,18 +227,18 @@ class cmd_create_token_issuer(pcommand.contract_command_base) :
         contract_object = pcontract_cmd.get_contract(state, save_file)
 
         # get all the information necessary to register this contract as an endpoint with the guardian
-        ledger_submitter = create_submitter(state.get(['Ledger']))
-        ledger_key = ledger_submitter.get_ledger_info()
-        ledger_attestation = ledger_submitter.get_contract_info(contract_object.contract_id)
+        ledger_access = ledger.get_ledger_access(state)
+        ledger_key = ledger_access.ledger_key
+        ledger_attestation = ledger_access.get_contract_info(contract_object.contract_id)
 
-        contract_metadata = pcontract.invoke_contract_op(
+        contract_metadata = immutable_cache.invoke_contract_op(
             common.op_get_contract_metadata,
             state, context, session,
             **kwargs)
         contract_metadata = json.loads(contract_metadata)
         verifying_key = contract_metadata['verifying_key']
 
-        code_metadata = pcontract.invoke_contract_op(
+        code_metadata = immutable_cache.invoke_contract_op(
             common.op_get_contract_code_metadata,
             state, context, session,
             **kwargs)
@@ -14,10 +14,11 @@
 
 import json
 import logging
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
 
-import pdo.common.utility as putils
 from pdo.contract import invocation_request
-from pdo.submitter.create import create_submitter
 
 import pdo.client.builder as pbuilder
 import pdo.client.builder.command as pcommand
@@ -26,6 +27,10 @@ import pdo.client.builder.shell as pshell
 import pdo.client.commands.contract as pcontract_cmd
 
 import pdo.client.plugins.common as common
+import pdo.contracts.key_index as key_index
+import pdo.exchange.common.bulk as bulk
+import pdo.exchange.common.immutable_cache as immutable_cache
+import pdo.exchange.common.ledger as ledger
 import pdo.exchange.plugins.asset_type as asset_type
 import pdo.exchange.plugins.guardian as guardian
 import pdo.exchange.plugins.issuer as issuer
@@ -48,6 +53,7 @@ __all__ = [
     'op_claim',
     'cmd_mint_tokens',
     'cmd_transfer_assets',
+    'cmd_transfer_bulk',
     'cmd_echo',
     'do_token_object',
     'do_token_object_contract',
@@ -138,11 +144,21 @@ class op_echo(pcontract.contract_op_base) :
 class cmd_mint_tokens(pcommand.contract_command_base) :
     """Mint token objects
     For now the required context is the token object context.
+
+    Token object contracts are created and initialized concurrently on a
+    bounded pool of workers; the steps that update the token issuer or
+    the data guardian are serialized. The progress of each token is
+    recorded in its context so that an interrupted run resumes with the
+    first incomplete step of each token.
     """
 
     name = "mint_tokens"
     help = "mint tokens for a token issuer"
 
+    # the steps of minting a token in the order they complete, the last
+    # completed step is saved in the token context as mint_stage
+    __mint_stages__ = [ 'created', 'registered', 'minted', 'approved', 'initialized' ]
+
     @classmethod
     def add_arguments(cls, subparser) :
         subparser.add_argument('-c', '--contract-class', help='Name of the contract class', type=str)
@@ -152,34 +168,88 @@ class cmd_mint_tokens(pcommand.contract_command_base) :
         subparser.add_argument('-r', '--sservice-group', help='Name of the storage service group to use', type=str)
         subparser.add_argument('--source', help='File that contains contract source code', type=str)
         subparser.add_argument('--extra', help='Extra data associated with the contract file', nargs=2, action='append')
+        subparser.add_argument('--parallelism', help='Number of tokens minted concurrently', type=int, default=4)
+        subparser.add_argument('--checkpoint-file', help='Context file saved after each minting step', type=str)
+        subparser.add_argument('--checkpoint-prefix', help='Context prefix saved in the checkpoint file', type=str)
+
+    @classmethod
+    def __reached__(cls, token_context, stage) :
+        """Return True if the token has completed the minting step
+        """
+        current = token_context.get('mint_stage')
+        if current not in cls.__mint_stages__ :
+            return False
+        return cls.__mint_stages__.index(current) >= cls.__mint_stages__.index(stage)
 
     @classmethod
-    def mint_one_token(cls, state, to_context, ti_context, dg_context, ledger_submitter, **kwargs) :
+    def __token_minted__(cls, state, ti_context, ti_session, ti_contract_id, to_contract_id, ledger_access) :
+        """Return True if the token issuer has registered and minted a token for the token object
+
+        The issuer provisions a token object only after both steps have
+        committed, so a successful provisioning request confirms them.
+        """
+        state_attestation = ledger_access.get_current_state_hash(ti_contract_id)
+        try :
+            pcontract.invoke_contract_op(
+                token_issuer.op_provision_token_object,
+                state, ti_context, ti_session,
+                to_contract_id,
+                state_attestation['signature'])
+            return True
+        except Exception as e :
+            logger.debug('token object %s has not been minted; %s', to_contract_id, e)
+            return False
+
+    @classmethod
+    def mint_one_token(cls, state, to_context, ti_context, dg_context, ledger_access, token_context=None, locks=None, checkpoint=None, **kwargs) :
         """Mint a token from the token issuer
 
         @param state : configuration for current session
-        @param ti_session : information for interacting with the token issuer
-        @param to_save_file : name of the file to store the token object contract
-        @param to_source : name of the file that contains token object contract source
+        @param to_context : context used to create the token object contract
+        @param ti_context : context for the token issuer
+        @param dg_context : context for the data guardian
+        @param ledger_access : shared access to the ledger, see pdo.exchange.common.ledger
+        @param token_context : dictionary where the progress of the token is recorded
+        @param locks : dictionary with the 'issuer' and 'guardian' locks that serialize updates
+        @param checkpoint : function called after each completed step
         """
 
-        ledger_key = ledger_submitter.get_ledger_info()
+        if token_context is None :
+            token_context = {}
+        if locks is None :
+            locks = { 'issuer' : threading.Lock(), 'guardian' : threading.Lock() }
 
-        to_save_file = pcontract_cmd.create_contract_from_context(state, to_context, 'token_object', **kwargs)
-        to_session = pbuilder.SessionParameters(save_file=to_save_file, wait=True)
+        def complete(stage) :
+            token_context['mint_stage'] = stage
+            if checkpoint :
+                checkpoint()
 
+        ledger_key = ledger_access.ledger_key
+
+        # a step may have committed in an interrupted run without being
+        # recorded; the issuer rejects a second registration or mint for the
+        # same contract, so the issuer state is checked before repeating them
+        resuming = cls.__reached__(token_context, 'created')
+
+        to_save_file = token_context.get('save_file')
+        if not cls.__reached__(token_context, 'created') or not to_save_file :
+            to_save_file = pcontract_cmd.create_contract_from_context(state, to_context, 'token_object', **kwargs)
+            token_context['save_file'] = to_save_file
+            complete('created')
+
+        to_session = pbuilder.SessionParameters(save_file=to_save_file, wait=True)
         to_contract = pcontract_cmd.get_contract(state, to_save_file)
 
         # set up the attested connection between the token object and the token
         # issuer, we need to collect a bunch of information from the contract and ledger
-        ledger_attestation = ledger_submitter.get_contract_info(to_contract.contract_id)
+        ledger_attestation = ledger_access.get_contract_info(to_contract.contract_id)
 
-        to_metadata = pcontract.invoke_contract_op(
+        to_metadata = immutable_cache.invoke_contract_op(
             common.op_get_contract_metadata,
             state, to_context, to_session)
         to_metadata = json.loads(to_metadata)
 
-        to_code_metadata = pcontract.invoke_contract_op(
+        to_code_metadata = immutable_cache.invoke_contract_op(
             common.op_get_contract_code_metadata,
             state, to_context, to_session)
         to_code_metadata = json.loads(to_code_metadata)
@@ -190,49 +260,76 @@ class cmd_mint_tokens(pcommand.contract_command_base) :
 
         ti_session = pbuilder.SessionParameters(save_file=ti_save_file)
 
-        pcontract.invoke_contract_op(
-            token_issuer.op_add_endpoint,
-            state, ti_context, ti_session,
-            to_contract.contract_id,
-            ledger_attestation,
-            to_metadata,
-            to_code_metadata)
-
-        pcontract.invoke_contract_op(
-            token_issuer.op_mint_token_object,
-            state, ti_context, ti_session.clone(wait=True),
-            to_contract.contract_id)
-
-        # get the token information package to hand to the data guardian, this
-        # will cause the guardian to create the capability generation key
-        ti_contract = pcontract_cmd.get_contract(state, ti_save_file)
-        state_attestation = ledger_submitter.get_current_state_hash(ti_contract.contract_id)
-        dg_package = pcontract.invoke_contract_op (
-            token_issuer.op_provision_token_object,
-            state, ti_context, ti_session,
-            to_contract.contract_id,
-            state_attestation['signature'])
-        dg_package = json.loads(dg_package)
-
-        # the token object is an issuer, this is kind of weird in a sense but it
-        # makes buying & selling token objects fit with the rest of the contract family
-        # that is, token objects can be used in exchanges and auctions as you would expect
-        pcontract.invoke_contract_op(
-            token_issuer.op_approve_issuer,
-            state, ti_context, ti_session,
-            to_metadata['verifying_key'])
-        authority = pcontract.invoke_contract_op(
-            token_issuer.op_get_issuer_authority,
-            state, ti_context, ti_session,
-            to_metadata['verifying_key'])
-        authority = json.loads(authority)
+        # the token issuer steps commit changes to the issuer state and must
+        # not be interleaved with the steps for other tokens
+        with locks['issuer'] :
+            ti_contract = pcontract_cmd.get_contract(state, ti_save_file)
+
+            if resuming and not cls.__reached__(token_context, 'minted') :
+                if cls.__token_minted__(state, ti_context, ti_session, ti_contract.contract_id, to_contract.contract_id, ledger_access) :
+                    complete('minted')
+
+            if not cls.__reached__(token_context, 'registered') :
+                try :
+                    pcontract.invoke_contract_op(
+                        token_issuer.op_add_endpoint,
+                        state, ti_context, ti_session,
+                        to_contract.contract_id,
+                        ledger_attestation,
+                        to_metadata,
+                        to_code_metadata)
+                    complete('registered')
+                except Exception as e :
+                    if not resuming :
+                        raise
+                    # the interrupted run may have registered the token object, if
+                    # it did not then minting the token below fails
+                    logger.warning('failed to register token object %s, continuing with mint; %s',
+                                   to_contract.contract_id, e)
+
+            if not cls.__reached__(token_context, 'minted') :
+                pcontract.invoke_contract_op(
+                    token_issuer.op_mint_token_object,
+                    state, ti_context, ti_session.clone(wait=True),
+                    to_contract.contract_id)
+                complete('minted')
+
+            # get the token information package to hand to the data guardian, this
+            # will cause the guardian to create the capability generation key;
+            # the issuer state changed with the steps above so the attestation is always read from the ledger
+            state_attestation = ledger_access.get_current_state_hash(ti_contract.contract_id)
+            dg_package = pcontract.invoke_contract_op (
+                token_issuer.op_provision_token_object,
+                state, ti_context, ti_session,
+                to_contract.contract_id,
+                state_attestation['signature'])
+            dg_package = json.loads(dg_package)
+
+            # the token object is an issuer, this is kind of weird in a sense but it
+            # makes buying & selling token objects fit with the rest of the contract family
+            # that is, token objects can be used in exchanges and auctions as you would expect;
+            # approving an issuer that is already approved has no effect so this step is
+            # simply repeated after an interruption
+            if not cls.__reached__(token_context, 'approved') :
+                pcontract.invoke_contract_op(
+                    token_issuer.op_approve_issuer,
+                    state, ti_context, ti_session,
+                    to_metadata['verifying_key'])
+                complete('approved')
+
+            authority = pcontract.invoke_contract_op(
+                token_issuer.op_get_issuer_authority,
+                state, ti_context, ti_session,
+                to_metadata['verifying_key'])
+            authority = json.loads(authority)
 
         # get the token initialization package from the data guardian
-        to_package = pcommand.invoke_contract_cmd(
-            guardian.cmd_provision_token_object,
-            state, dg_context,
-            dg_package,
-            **kwargs)
+        with locks['guardian'] :
+            to_package = pcommand.invoke_contract_cmd(
+                guardian.cmd_provision_token_object,
+                state, dg_context,
+                dg_package,
+                **kwargs)
 
         # and push the token initialization package into the token object
         pcontract.invoke_contract_op(
@@ -242,10 +339,12 @@ class cmd_mint_tokens(pcommand.contract_command_base) :
             to_package,
             authority,
             **kwargs)
+        complete('initialized')
+
         return to_save_file
 
     @classmethod
-    def invoke(cls, state, context, **kwargs) :
+    def invoke(cls, state, context, parallelism=4, checkpoint_file=None, checkpoint_prefix=None, **kwargs) :
         save_file = pcontract_cmd.get_contract_from_context(state, context)
 
         token_issuer_context = context.get_context('token_issuer_context')
@@ -260,32 +359,85 @@ class cmd_mint_tokens(pcommand.contract_command_base) :
         if token_count == 0 :
             raise ValueError('invalid configuration, missing token count')
 
-        minted_tokens = context.get('token_save_file_list', [])
+        if checkpoint_file and not checkpoint_prefix :
+            raise ValueError('missing required parameter checkpoint_prefix')
 
-        # need the ledger key as the root of trust for binding to the issuer
-        ledger_submitter = create_submitter(state.get(['Ledger']))
+        # the ledger key and contract information are shared by all of the tokens
+        ledger_access = ledger.get_ledger_access(state)
+
+        # each token has a slot in the context; the slot records the save file
+        # and the last completed step so that an interrupted run can resume
+        context_lock = threading.RLock()
+        locks = { 'issuer' : threading.Lock(), 'guardian' : threading.Lock() }
+
+        def token_slot(index) :
+            key = 'token_{}'.format(index)
+            token_context = context.get(key) or {}
+            if token_context.get('save_file') and 'mint_stage' not in token_context :
+                # tokens minted before progress was recorded are complete
+                token_context['mint_stage'] = 'initialized'
+            token_context.update({
+                'module' : '${..module}',
+                'identity' : '${..identity}',
+                'source' : '${..source}',
+                'token_issuer_context' : '@{..token_issuer_context}',
+                'data_guardian_context' : '@{..data_guardian_context}',
+            })
+            return token_context
+
+        slots = [ token_slot(index) for index in range(1, token_count + 1) ]
+
+        # when resuming, read the registration information for the token objects
+        # that were created but not registered in one concurrent pass
+        pending = [ t['save_file'] for t in slots if t.get('save_file') and not cls.__reached__(t, 'registered') ]
+        if pending :
+            ledger_access.get_contract_infos(
+                [ pcontract_cmd.get_contract(state, f).contract_id for f in pending ])
+
+        def checkpoint(index = None) :
+            with context_lock :
+                if index is not None :
+                    context['token_{}'.format(index)] = dict(slots[index - 1])
+                if checkpoint_file :
+                    pbuilder.Context.SaveContextFile(state, checkpoint_file, prefix=checkpoint_prefix)
+
+        def mint(index) :
+            token_context = slots[index - 1]
+            if cls.__reached__(token_context, 'initialized') :
+                return token_context['save_file']
 
-        while len(minted_tokens) < token_count :
             to_save_file = cls.mint_one_token(
                 state,
                 context,
                 token_issuer_context,
                 data_guardian_context,
-                ledger_submitter,
+                ledger_access,
+                token_context=token_context,
+                locks=locks,
+                checkpoint=lambda : checkpoint(index),
                 **kwargs)
-            minted_tokens.append(to_save_file)
-            context['token_{}'.format(len(minted_tokens))] = {
-                'module' : '${..module}',
-                'identity' : '${..identity}',
-                'source' : '${..source}',
-                'token_issuer_context' : '@{..token_issuer_context}',
-                'data_guardian_context' : '@{..data_guardian_context}',
-                'save_file' : to_save_file
-            }
 
             cls.display('created token object in {}'.format(to_save_file))
+            return to_save_file
+
+        errors = []
+        with ThreadPoolExecutor(max_workers=max(1, parallelism)) as executor :
+            futures = [ executor.submit(mint, index) for index in range(1, token_count + 1) ]
+            for (index, future) in enumerate(futures, start=1) :
+                try :
+                    future.result()
+                except Exception as e :
+                    logger.error('failed to mint token %d; %s', index, e)
+                    errors.append(e)
+
+        minted_tokens = [ t['save_file'] for t in slots if cls.__reached__(t, 'initialized') ]
+        with context_lock :
+            context['token_save_file_list'] = minted_tokens
+        checkpoint()
+
+        if errors :
+            raise errors[0]
 
-        context['token_save_file_list'] = minted_tokens
         return minted_tokens
 
 # -----------------------------------------------------------------
@@ -310,10 +462,7 @@ class cmd_transfer_assets(pcommand.contract_command_base) :
         if not save_file :
             raise ValueError('issuer contract must be created and initialized')
 
-        keypath = state.get(['Key', 'SearchPath'])
-        keyfile = putils.find_file_in_path("{0}_public.pem".format(new_owner), keypath)
-        with open (keyfile, "r") as myfile:
-            verifying_key = myfile.read()
+        verifying_key = key_index.find_public_key(state, new_owner)
 
         # in case count was specified, it must be 1 and we must remove it since it is set explicitly
         # in the op invocation below
@@ -328,6 +477,121 @@ class cmd_transfer_assets(pcommand.contract_command_base) :
         cls.display('transfered token to {}'.format(new_owner))
         return save_file
 
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+class cmd_transfer_bulk(pcommand.contract_command_base) :
+    """Transfer ownership of the token objects listed in a manifest
+
+    The manifest is a CSV file with token and new_owner columns or a JSON
+    lines file with token and new_owner fields; token is the context path
+    of a token object. Every token is a separate contract so the transfers
+    run concurrently. The result log is keyed by token so a token that was
+    transferred is skipped when the command is run again. A token that is
+    no longer held by the current identity is recorded as transferred if
+    the new owner holds it; this check requires the private key of the
+    new owner. A transfer whose outcome cannot be confirmed is recorded as
+    sent, any other error is recorded as failed for its token.
+    """
+
+    name = "transfer_bulk"
+    help = "transfer ownership of the tokens listed in a manifest"
+
+    @classmethod
+    def add_arguments(cls, parser) :
+        parser.add_argument('-m', '--manifest', help='CSV or JSON lines file with token and new_owner for each transfer', type=str, required=True)
+        parser.add_argument('--log-file', help='file where the result of each transfer is recorded', type=str)
+        parser.add_argument('--parallelism', help='number of concurrent transfers', type=int, default=4)
+        parser.add_argument('--retries', help='number of times a failed transfer is retried', type=int, default=2)
+
+    @classmethod
+    def invoke(cls, state, context, manifest, log_file=None, parallelism=4, retries=2, **kwargs) :
+        result_log = bulk.ResultLog(log_file or manifest + '.log')
+        keys = key_index.get_key_index(state)
+
+        transfers = []
+        tokens = set()
+        for (row_number, row) in bulk.read_manifest(manifest, { 'token' : str, 'new_owner' : str }) :
+            if row['token'] in tokens :
+                raise ValueError('duplicate token {} in manifest row {}'.format(row['token'], row_number))
+            tokens.add(row['token'])
+
+            record = dict(row, key=row['token'])
+            if not result_log.completed(record['key']) :
+                token_context = pbuilder.Context(state, row['token'])
+                save_file = pcontract_cmd.get_contract_from_context(state, token_context)
+                if not save_file :
+                    raise ValueError('token object {} must be created and initialized'.format(row['token']))
+                transfers.append((record, (token_context, save_file, keys.public_key(row['new_owner']))))
+
+        def transfer(record, token_context, save_file, verifying_key) :
+            session = pbuilder.SessionParameters(save_file=save_file)
+
+            # the token object reports a balance of one only to its owner; the
+            # identity keyword selects the invoking key for invoke_contract_op,
+            # the same way the inference notebooks invoke as the new owner
+            def held(identity = None) :
+                params = dict(kwargs, identity=identity) if identity else kwargs
+                try :
+                    return int(pcontract.invoke_contract_op(op_get_balance, state, token_context, session.clone(), **params)) > 0
+                except ValueError :
+                    return False
+
+            # the owner can only be checked as the new owner, which requires its private key
+            def transferred() :
+                try :
+                    keys.find_private_key_file(record['new_owner'])
+                except ValueError :
+                    return False
+                return held(record['new_owner'])
+
+            if not held() :
+                if transferred() :
+                    return dict(record, status='complete', recovered=True)
+                if (result_log.latest(record['key']) or {}).get('status') == 'sent' :
+                    return dict(record, status='sent', error='token was sent by an earlier run, confirm with the new owner')
+                return dict(record, status='failed', error='token is not held by the current identity')
+
+            result_log.write([ dict(record, status='sent') ])
+            for attempt in range(retries + 1) :
+                try :
+                    pcontract.invoke_contract_op(
+                        issuer.op_transfer, state, token_context, session.clone(wait=True), verifying_key, 1, **kwargs)
+                    return dict(record, status='complete')
+                except Exception as e :
+                    error = e
+
+                # the token was transferred if the current owner no longer holds it,
+                # if the owner cannot be checked the transfer may have been applied
+                status = 'sent'
+                try :
+                    if not held() :
+                        return dict(record, status='complete', recovered=True)
+                    status = 'failed'
+                except Exception as e :
+                    logger.info('unable to check the owner of %s; %s', record['key'], e)
+
+            return dict(record, status=status, error=str(error))
+
+        # any error is recorded against its token so the remaining rows are still reported
+        def safe_transfer(record, *payload) :
+            try :
+                return transfer(record, *payload)
+            except Exception as e :
+                return dict(record, status='failed', error=str(e))
+
+        with ThreadPoolExecutor(max_workers=max(1, parallelism)) as executor :
+            futures = [ executor.submit(safe_transfer, record, *payload) for (record, payload) in transfers ]
+            results = []
+            for future in futures :
+                record = future.result()
+                results.append(record)
+                result_log.write([ record ])
+                cls.display('{}: {} {}'.format(record['token'], record['status'], record.get('error', record['new_owner'])))
+
+        failed = sum(1 for record in results if record['status'] != 'complete')
+        cls.display('transferred {} tokens, failed {}'.format(len(transfers) - failed, failed))
+        return failed == 0
+
 # -----------------------------------------------------------------
 # -----------------------------------------------------------------
 class cmd_echo(pcommand.contract_command_base) :
@@ -394,6 +658,7 @@ do_token_object_contract = pcontract.create_shell_command('token_object_contract
 __commands__ = [
     cmd_mint_tokens,
     cmd_transfer_assets,
+    cmd_transfer_bulk,
     cmd_echo,
 ]
 
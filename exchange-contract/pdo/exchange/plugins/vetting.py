@@ -24,6 +24,7 @@ import pdo.client.builder.shell as pshell
 import pdo.client.commands.contract as pcontract_cmd
 
 import pdo.client.plugins.common as common
+import pdo.exchange.common.immutable_cache as immutable_cache
 import pdo.exchange.plugins.asset_type as asset_type
 
 __all__ = [
@@ -152,7 +153,7 @@ class cmd_create_vetting_organization(pcommand.contract_command_base) :
                 **kwargs)
 
         asset_type_session = pbuilder.SessionParameters(save_file=asset_type_save_file)
-        asset_type_id = pcontract.invoke_contract_op(
+        asset_type_id = immutable_cache.invoke_contract_op(
             asset_type.op_get_asset_type_identifier,
             state, asset_type_context, asset_type_session,
             **kwargs)
@@ -214,7 +215,7 @@ class cmd_approve_issuer(pcommand.contract_command_base) :
                     raise ValueError('issuer contract not created')
 
                 issuer_session = pbuilder.SessionParameters(save_file=issuer_save_file)
-                verifying_key = pcontract.invoke_contract_op(
+                verifying_key = immutable_cache.invoke_contract_op(
                     common.op_get_verifying_key,
                     state, issuer_context, issuer_session,
                     **kwargs)
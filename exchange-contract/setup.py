@@ -66,6 +66,7 @@ setup(
     packages = [
         'pdo',
         'pdo.exchange',
+        'pdo.exchange.common',
         'pdo.exchange.jupyter',
         'pdo.exchange.plugins',
         'pdo.exchange.scripts',
@@ -242,6 +242,7 @@ done
 yell create the exchange
 try ex_exchange create_order ${OPTS} --contract order.marble1
 try ex_exchange examine ${OPTS} --contract order.marble1
+try ex_exchange find_orders ${OPTS} --contract order.marble1 --issuer marbles.green.issuer --count 20 --prefix order --identity user2
 try ex_exchange match_order ${OPTS} --contract order.marble1 --identity user2
 try ex_exchange claim_payment ${OPTS} --contract order.marble1
 try ex_exchange claim_offer ${OPTS} --contract order.marble1 --identity user2
@@ -0,0 +1,144 @@
+# Copyright 2024 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+import pytest
+
+@pytest.fixture
+def bulk(load_source) :
+    return load_source('pdo/exchange/common/bulk.py')
+
+@pytest.fixture
+def result_log(bulk, tmp_path) :
+    return bulk.ResultLog(str(tmp_path / 'result.log'))
+
+def rows(count) :
+    return [ ({ 'key' : str(i) }, i) for i in range(count) ]
+
+def statuses(result_log) :
+    with open(result_log.filename) as fp :
+        return [ (r['key'], r['status']) for r in map(json.loads, fp) ]
+
+# -----------------------------------------------------------------
+def test_pipeline_waits_at_window_boundaries(bulk, result_log) :
+    waits = []
+    counts = bulk.pipeline(rows(5), lambda r, p, w : waits.append(w), result_log, in_flight=2)
+
+    assert counts == { 'complete' : 5, 'failed' : 0 }
+    assert waits == [ False, True, False, True, True ]
+    assert all(result_log.completed(str(i)) for i in range(5))
+
+def test_pipeline_failure_without_sync_waits_on_next_invocation(bulk, result_log) :
+    waits = []
+    def invoke(record, payload, wait) :
+        waits.append(wait)
+        if payload == 1 :
+            raise ValueError('rejected')
+
+    counts = bulk.pipeline(rows(4), invoke, result_log, in_flight=4)
+
+    assert counts == { 'complete' : 3, 'failed' : 1 }
+    assert waits == [ False, False, True, True ]
+    assert statuses(result_log) == [ ('1', 'failed'), ('0', 'complete'), ('2', 'complete'), ('3', 'complete') ]
+
+def test_pipeline_failure_with_sync_confirms_window(bulk, result_log) :
+    synced = []
+    def invoke(record, payload, wait) :
+        if payload == 1 :
+            raise ValueError('rejected')
+
+    counts = bulk.pipeline(rows(3), invoke, result_log, in_flight=4, sync=lambda : synced.append(True))
+
+    assert counts == { 'complete' : 2, 'failed' : 1 }
+    assert synced == [ True ]
+    assert statuses(result_log) == [ ('1', 'failed'), ('0', 'complete'), ('2', 'complete') ]
+
+def test_pipeline_unconfirmed_rows_are_logged_as_sent(bulk, result_log) :
+    def invoke(record, payload, wait) :
+        if payload == 2 :
+            raise ValueError('rejected')
+
+    counts = bulk.pipeline(rows(3), invoke, result_log, in_flight=4)
+
+    assert counts == { 'complete' : 0, 'failed' : 1 }
+    assert statuses(result_log) == [ ('2', 'failed'), ('0', 'sent'), ('1', 'sent') ]
+    assert result_log.completed('0') is None
+
+def test_pipeline_recovered_wait_is_not_a_commit(bulk, result_log) :
+    waits = []
+    def invoke(record, payload, wait) :
+        waits.append(wait)
+        if payload == 1 :
+            raise ValueError('duplicate issuance')
+
+    recover = lambda record, payload, e : 'duplicate' in str(e)
+    counts = bulk.pipeline(rows(3), invoke, result_log, in_flight=2, recover=recover)
+
+    # the recovered row closed the first window, so the next row waits instead
+    assert waits == [ False, True, True ]
+    assert counts == { 'complete' : 3, 'failed' : 0 }
+    assert result_log.completed('1')['recovered'] is True
+
+def test_pipeline_recovered_wait_calls_sync(bulk, result_log) :
+    synced = []
+    def invoke(record, payload, wait) :
+        if payload == 1 :
+            raise ValueError('duplicate issuance')
+
+    recover = lambda record, payload, e : True
+    counts = bulk.pipeline(rows(2), invoke, result_log, in_flight=2, recover=recover, sync=lambda : synced.append(True))
+
+    assert synced == [ True ]
+    assert counts == { 'complete' : 2, 'failed' : 0 }
+
+def test_pipeline_retries_before_failing(bulk, result_log, monkeypatch) :
+    monkeypatch.setattr(bulk.time, 'sleep', lambda s : None)
+    attempts = []
+    def invoke(record, payload, wait) :
+        attempts.append(payload)
+        if len(attempts) < 3 :
+            raise ValueError('busy')
+
+    counts = bulk.pipeline(rows(1), invoke, result_log, retries=2)
+
+    assert attempts == [ 0, 0, 0 ]
+    assert counts == { 'complete' : 1, 'failed' : 0 }
+
+def test_result_log_reloads_completed_rows(bulk, result_log) :
+    result_log.write([ { 'key' : 'a', 'status' : 'sent' } ])
+    result_log.write([ { 'key' : 'a', 'status' : 'complete' }, { 'key' : 'b', 'status' : 'sent' } ])
+    with open(result_log.filename, 'a') as fp :
+        fp.write('{"key" : "c", "sta')
+
+    reloaded = bulk.ResultLog(result_log.filename)
+    assert reloaded.completed('a')['status'] == 'complete'
+    assert reloaded.completed('b') is None
+    assert reloaded.latest('b')['status'] == 'sent'
+    assert reloaded.latest('c') is None
+
+def test_read_manifest_csv_and_jsonl(bulk, tmp_path) :
+    csv_file = tmp_path / 'manifest.csv'
+    csv_file.write_text('owner, count\nalice, 5\nbob, 7\n')
+    jsonl_file = tmp_path / 'manifest.jsonl'
+    jsonl_file.write_text('{"owner" : "alice", "count" : 5}\n\n{"owner" : "bob", "count" : 7}\n')
+
+    fields = { 'owner' : str, 'count' : int }
+    expected = [ (1, { 'owner' : 'alice', 'count' : 5 }), (2, { 'owner' : 'bob', 'count' : 7 }) ]
+    assert list(bulk.read_manifest(str(csv_file), fields)) == expected
+    assert list(bulk.read_manifest(str(jsonl_file), fields)) == expected
+
+    jsonl_file.write_text('{"owner" : "alice"}\n')
+    with pytest.raises(ValueError) :
+        list(bulk.read_manifest(str(jsonl_file), fields))
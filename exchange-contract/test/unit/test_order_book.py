@@ -0,0 +1,88 @@
+# Copyright 2024 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+order_book = pytest.importorskip('pdo.exchange.common.order_book')
+
+def order(path, requested_count, offered_count = 10, requested_owner = '', offered_type = 'gold') :
+    return {
+        'path' : path,
+        'contract_id' : 'contract-' + path,
+        'state_hash' : 'hash-' + path,
+        'offered_type' : offered_type,
+        'offered_issuer' : 'offer-issuer',
+        'offered_count' : offered_count,
+        'offered_owner' : 'seller',
+        'requested_type' : 'silver',
+        'requested_issuer' : 'request-issuer',
+        'requested_count' : requested_count,
+        'requested_owner' : requested_owner,
+    }
+
+@pytest.fixture
+def book() :
+    book = order_book.OrderBook()
+    book.add(order('a', 5, offered_count=10))
+    book.add(order('b', 10, offered_count=40))
+    book.add(order('c', 20, offered_count=20))
+    return book
+
+# -----------------------------------------------------------------
+def test_fillable_limits_by_count_and_sorts_by_rate(book) :
+    assert [ o['path'] for o in book.fillable('silver', 'request-issuer', 10) ] == [ 'b', 'a' ]
+    assert [ o['path'] for o in book.fillable('silver', 'request-issuer', 4) ] == []
+    assert [ o['path'] for o in book.fillable('silver', 'request-issuer', 100) ] == [ 'b', 'a', 'c' ]
+    assert book.fillable('silver', 'other-issuer', 100) == []
+
+def test_fillable_respects_requested_owner(book) :
+    book.add(order('d', 1, offered_count=100, requested_owner='alice'))
+
+    assert [ o['path'] for o in book.fillable('silver', 'request-issuer', 1, owner='alice') ] == [ 'd' ]
+    assert book.fillable('silver', 'request-issuer', 1, owner='bob') == []
+
+def test_add_replaces_an_order_with_the_same_path(book) :
+    book.add(order('a', 50, offered_count=10))
+
+    assert len(book) == 3
+    assert book.get('a')['requested_count'] == 50
+    assert [ o['path'] for o in book.fillable('silver', 'request-issuer', 10) ] == [ 'b' ]
+
+def test_remove_clears_every_index(book) :
+    assert book.remove('b')['path'] == 'b'
+    assert book.remove('b') is None
+
+    assert len(book) == 2
+    assert [ o['path'] for o in book.fillable('silver', 'request-issuer', 100) ] == [ 'a', 'c' ]
+    assert sorted(o['path'] for o in book.query(offered_issuer='offer-issuer')) == [ 'a', 'c' ]
+
+    book.remove('a')
+    book.remove('c')
+    assert book.query(offered_type='gold') == []
+    assert book.fillable('silver', 'request-issuer', 100) == []
+
+def test_query_combines_criteria(book) :
+    book.add(order('d', 1, offered_type='copper'))
+
+    assert [ o['path'] for o in book.query(offered_type='copper') ] == [ 'd' ]
+    assert sorted(o['path'] for o in book.query(offered_type='gold', offered_issuer='offer-issuer')) == [ 'a', 'b', 'c' ]
+    assert book.query(offered_type='gold', requested_issuer='other-issuer') == []
+
+def test_save_and_reload(book, tmp_path) :
+    book.book_file = str(tmp_path / 'book.json')
+    book.save()
+
+    reloaded = order_book.OrderBook(book.book_file)
+    assert len(reloaded) == 3
+    assert reloaded.get('b') == book.get('b')
@@ -0,0 +1,80 @@
+# Copyright 2024 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+
+import pytest
+
+@pytest.fixture
+def task_graph(load_source) :
+    return load_source('pdo/exchange/common/task_graph.py')
+
+# -----------------------------------------------------------------
+def test_results_are_passed_to_dependents(task_graph) :
+    graph = task_graph.TaskGraph()
+    graph.add('a', lambda : 2)
+    graph.add('b', lambda : 3)
+    graph.add('c', lambda a, b : a * b, 'a', 'b')
+
+    assert graph.run() == { 'a' : 2, 'b' : 3, 'c' : 6 }
+
+def test_independent_tasks_overlap(task_graph) :
+    barrier = threading.Barrier(2, timeout=5)
+    graph = task_graph.TaskGraph(max_workers=2)
+    graph.add('a', barrier.wait)
+    graph.add('b', barrier.wait)
+
+    # each task waits for the other, so this only completes if both run at once
+    assert set(graph.run()) == { 'a', 'b' }
+
+def test_failure_skips_dependents_and_propagates(task_graph) :
+    started = []
+    def fail() :
+        raise ValueError('request issuer is unknown')
+
+    graph = task_graph.TaskGraph()
+    graph.add('key', fail)
+    graph.add('contract', lambda key : started.append('contract'), 'key')
+    graph.add('escrow', lambda contract : started.append('escrow'), 'contract')
+
+    with pytest.raises(ValueError, match='request issuer is unknown') :
+        graph.run()
+    assert started == []
+
+def test_failure_waits_for_running_tasks(task_graph) :
+    finished = []
+    def slow() :
+        time.sleep(0.2)
+        finished.append('slow')
+
+    def fail() :
+        raise RuntimeError('failed')
+
+    graph = task_graph.TaskGraph(max_workers=2)
+    graph.add('slow', slow)
+    graph.add('fail', fail)
+    graph.add('after', lambda slow : finished.append('after'), 'slow')
+
+    with pytest.raises(RuntimeError) :
+        graph.run()
+    assert finished == [ 'slow' ]
+
+def test_add_rejects_duplicate_and_unknown_tasks(task_graph) :
+    graph = task_graph.TaskGraph()
+    graph.add('a', lambda : None)
+    with pytest.raises(ValueError) :
+        graph.add('a', lambda : None)
+    with pytest.raises(ValueError) :
+        graph.add('b', lambda c : None, 'c')
@@ -63,6 +63,8 @@ contract_method_reference_t contract_method_dispatch_table[] = {
 
     // use the asset
     CONTRACT_METHOD2(do_inference, ww::inference::token_object::do_inference),
+    CONTRACT_METHOD2(do_batch_inference, ww::inference::token_object::do_batch_inference),
+    CONTRACT_METHOD2(do_video_inference, ww::inference::token_object::do_video_inference),
 
     // object transfer, escrow & claim methods
     CONTRACT_METHOD2(transfer,ww::exchange::token_object::transfer),
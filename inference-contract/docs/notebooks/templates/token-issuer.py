@@ -128,7 +128,8 @@ print('token issuer contract in {}'.format(token_issuer_save_file))
 token_object_context = pc_jupyter.pbuilder.Context(state, token_path + '.token_object')
 
 minted_token_save_files = pc_jupyter.pcommand.invoke_contract_cmd(
-    pc_jupyter.ml_inference_token_object.cmd_mint_tokens, state, token_object_context)
+    pc_jupyter.ml_inference_token_object.cmd_mint_tokens, state, token_object_context,
+    checkpoint_file=context_file, checkpoint_prefix=token_path)
 pc_jupyter.pbuilder.Context.SaveContextFile(state, context_file, prefix=token_path)
 
 minted_token_contexts = []
@@ -37,7 +37,9 @@
 // do_inference
 //
 // This generates a capability that can be fed to the sample guardian
-// contract to do inference with an openvino model
+// contract to do inference with an openvino model; the model_id selects
+// one of the models served by the guardian, an empty model_id selects
+// the default model
 // -----------------------------------------------------------------
 bool ww::inference::token_object::do_inference(
     const Message& msg,
@@ -52,6 +54,7 @@ bool ww::inference::token_object::do_inference(
 
     const std::string encoded_encryption_key(msg.get_string("encryption_key"));
     const std::string encoded_state_hash(msg.get_string("state_hash"));
+    const std::string model_id(msg.get_string("model_id"));
     const std::string image_key(msg.get_string("image_key"));
 
     ww::value::Structure params(INFERENCE_PARAM_SCHEMA);
@@ -61,6 +64,8 @@ bool ww::inference::token_object::do_inference(
                    "unexpected error: failed to store parameter");
     ASSERT_SUCCESS(rsp, params.set_string("image_key", image_key.c_str()),
                    "unexpected error: failed to store parameter");
+    ASSERT_SUCCESS(rsp, params.set_string("model_id", model_id.c_str()),
+                   "unexpected error: failed to store parameter");
 
     ww::value::Object result;
     ASSERT_SUCCESS(rsp, ww::exchange::token_object::create_operation_package("do_inference", params, result),
@@ -70,3 +75,110 @@ bool ww::inference::token_object::do_inference(
     // how the nonce is created this may need to change.
     return rsp.value(result, false);
 }
+
+// -----------------------------------------------------------------
+// do_batch_inference
+//
+// This generates a single capability that covers a batch of images
+// stored in one key value store under the keys <image_key>_<n> for
+// n in [0, image_count)
+// -----------------------------------------------------------------
+bool ww::inference::token_object::do_batch_inference(
+    const Message& msg,
+    const Environment& env,
+    Response& rsp)
+{
+    ASSERT_SENDER_IS_OWNER(env, rsp);
+    ASSERT_INITIALIZED(rsp);
+
+    ASSERT_SUCCESS(rsp, msg.validate_schema(INFERENCE_BATCH_PARAM_SCHEMA),
+                   "invalid request, missing required parameters");
+
+    const std::string encoded_encryption_key(msg.get_string("encryption_key"));
+    const std::string encoded_state_hash(msg.get_string("state_hash"));
+    const std::string model_id(msg.get_string("model_id"));
+    const std::string image_key(msg.get_string("image_key"));
+    const uint32_t image_count = (uint32_t)msg.get_number("image_count");
+    ASSERT_SUCCESS(rsp, 0 < image_count, "image count must be a positive integer");
+
+    ww::value::Structure params(INFERENCE_BATCH_PARAM_SCHEMA);
+    ASSERT_SUCCESS(rsp, params.set_string("encryption_key", encoded_encryption_key.c_str()),
+                   "unexpected error: failed to store parameter");
+    ASSERT_SUCCESS(rsp, params.set_string("state_hash", encoded_state_hash.c_str()),
+                   "unexpected error: failed to store parameter");
+    ASSERT_SUCCESS(rsp, params.set_string("image_key", image_key.c_str()),
+                   "unexpected error: failed to store parameter");
+    ASSERT_SUCCESS(rsp, params.set_number("image_count", image_count),
+                   "unexpected error: failed to store parameter");
+    ASSERT_SUCCESS(rsp, params.set_string("model_id", model_id.c_str()),
+                   "unexpected error: failed to store parameter");
+
+    ww::value::Object result;
+    ASSERT_SUCCESS(rsp, ww::exchange::token_object::create_operation_package("do_batch_inference", params, result),
+                   "unexpected error: failed to generate capability");
+
+    // this assumes that generating the capability does not change state, depending on
+    // how the nonce is created this may need to change.
+    return rsp.value(result, false);
+}
+
+// -----------------------------------------------------------------
+// do_video_inference
+//
+// This generates a capability for streaming inference over a video
+// or a sequence of frames. The media is stored in a key value store
+// under the keys <media_key>_<n> for n in [0, key_count); for a video
+// the keys hold consecutive chunks of the file, for a frame sequence
+// each key holds one encoded frame. The frame stride and segment
+// length are signed into the capability with the media.
+// -----------------------------------------------------------------
+bool ww::inference::token_object::do_video_inference(
+    const Message& msg,
+    const Environment& env,
+    Response& rsp)
+{
+    ASSERT_SENDER_IS_OWNER(env, rsp);
+    ASSERT_INITIALIZED(rsp);
+
+    ASSERT_SUCCESS(rsp, msg.validate_schema(INFERENCE_VIDEO_PARAM_SCHEMA),
+                   "invalid request, missing required parameters");
+
+    const std::string encoded_encryption_key(msg.get_string("encryption_key"));
+    const std::string encoded_state_hash(msg.get_string("state_hash"));
+    const std::string model_id(msg.get_string("model_id"));
+    const std::string media_key(msg.get_string("media_key"));
+    const std::string media_type(msg.get_string("media_type"));
+    ASSERT_SUCCESS(rsp, media_type == "video" || media_type == "frames", "unknown media type");
+
+    const uint32_t key_count = (uint32_t)msg.get_number("key_count");
+    ASSERT_SUCCESS(rsp, 0 < key_count, "key count must be a positive integer");
+
+    const uint32_t frame_stride = (uint32_t)msg.get_number("frame_stride");
+    ASSERT_SUCCESS(rsp, 0 < frame_stride, "frame stride must be a positive integer");
+
+    const uint32_t segment_length = (uint32_t)msg.get_number("segment_length");
+
+    ww::value::Structure params(INFERENCE_VIDEO_PARAM_SCHEMA);
+    ASSERT_SUCCESS(rsp, params.set_string("encryption_key", encoded_encryption_key.c_str()),
+                   "unexpected error: failed to store parameter");
+    ASSERT_SUCCESS(rsp, params.set_string("state_hash", encoded_state_hash.c_str()),
+                   "unexpected error: failed to store parameter");
+    ASSERT_SUCCESS(rsp, params.set_string("media_key", media_key.c_str()),
+                   "unexpected error: failed to store parameter");
+    ASSERT_SUCCESS(rsp, params.set_string("media_type", media_type.c_str()),
+                   "unexpected error: failed to store parameter");
+    ASSERT_SUCCESS(rsp, params.set_number("key_count", key_count),
+                   "unexpected error: failed to store parameter");
+    ASSERT_SUCCESS(rsp, params.set_number("frame_stride", frame_stride),
+                   "unexpected error: failed to store parameter");
+    ASSERT_SUCCESS(rsp, params.set_number("segment_length", segment_length),
+                   "unexpected error: failed to store parameter");
+    ASSERT_SUCCESS(rsp, params.set_string("model_id", model_id.c_str()),
+                   "unexpected error: failed to store parameter");
+
+    ww::value::Object result;
+    ASSERT_SUCCESS(rsp, ww::exchange::token_object::create_operation_package("do_video_inference", params, result),
+                   "unexpected error: failed to generate capability");
+
+    return rsp.value(result, false);
+}
@@ -28,7 +28,29 @@
     "{"                                         \
         SCHEMA_KW(encryption_key, "") ","       \
         SCHEMA_KW(state_hash, "") ","           \
-        SCHEMA_KW(image_key, "")                \
+        SCHEMA_KW(image_key, "") ","            \
+        SCHEMA_KW(model_id, "")                 \
+    "}"
+
+#define INFERENCE_BATCH_PARAM_SCHEMA            \
+    "{"                                         \
+        SCHEMA_KW(encryption_key, "") ","       \
+        SCHEMA_KW(state_hash, "") ","           \
+        SCHEMA_KW(image_key, "") ","            \
+        SCHEMA_KW(image_count, 0) ","           \
+        SCHEMA_KW(model_id, "")                 \
+    "}"
+
+#define INFERENCE_VIDEO_PARAM_SCHEMA            \
+    "{"                                         \
+        SCHEMA_KW(encryption_key, "") ","       \
+        SCHEMA_KW(state_hash, "") ","           \
+        SCHEMA_KW(media_key, "") ","            \
+        SCHEMA_KW(media_type, "") ","           \
+        SCHEMA_KW(key_count, 0) ","             \
+        SCHEMA_KW(frame_stride, 0) ","          \
+        SCHEMA_KW(segment_length, 0) ","        \
+        SCHEMA_KW(model_id, "")                 \
     "}"
 
 namespace ww
@@ -39,6 +61,8 @@ namespace token_object
 {
     // methods
     bool do_inference(const Message& msg, const Environment& env, Response& rsp);
+    bool do_batch_inference(const Message& msg, const Environment& env, Response& rsp);
+    bool do_video_inference(const Message& msg, const Environment& env, Response& rsp);
 }; // token_object
 }; // inference
 }; // ww
@@ -13,6 +13,8 @@
 # limitations under the License.
 
 __all__ = [
+    'input_loader',
+    'model_registry',
     'ovms_predict',
     'utility',
     ]
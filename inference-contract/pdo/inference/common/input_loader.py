@@ -0,0 +1,108 @@
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+This file defines the InputLoader class used by the guardian operations to
+read request inputs from the key value stores pushed by the token owner.
+The time spent loading the inputs of each request is recorded so that
+input loading can be separated from model latency.
+
+Block prefetch and a cache of open stores are not provided. The guardian
+reads blocks from the local block store kept by its storage service, so
+the blocks that the token owner pushed are already local when the
+request arrives. Building a KeyValueStore handle costs nothing; the cost
+is in opening the store, which happens once for each call to load.
+"""
+
+import collections
+import threading
+import time
+
+from pdo.common.key_value import KeyValueStore
+
+import logging
+logger = logging.getLogger(__name__)
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class InputLoader(object) :
+
+    # -----------------------------------------------------------------
+    def __init__(self, history_size = 1024) :
+        self.__lock__ = threading.Lock()
+        self.__latency_history__ = collections.deque(maxlen=history_size)
+
+    # -----------------------------------------------------------------
+    @classmethod
+    def create_from_config(cls, config) :
+        """Create a loader from the optional [InputLoader] configuration section
+        """
+        loader_config = config.get('InputLoader', {})
+        history_size = int(loader_config.get('HistorySize', 1024))
+        return cls(history_size)
+
+    # -----------------------------------------------------------------
+    def open_store(self, encryption_key, state_hash) :
+        """Return a key value store for the state hash
+        """
+        return KeyValueStore(encryption_key, state_hash)
+
+    # -----------------------------------------------------------------
+    def load(self, encryption_key, state_hash, keys, input_encoding = 'str') :
+        """Load the raw values for a list of keys from a store
+
+        The store is opened once for all of the keys.
+
+        :param encryption_key: base64 encoded encryption key for the store
+        :param state_hash: base64 encoded hash identity of the store
+        :param keys: list of keys to read from the store
+        :return: list of values as bytes, in the same order as the keys
+        """
+        start_time = time.perf_counter()
+
+        kv = self.open_store(encryption_key, state_hash)
+        with kv :
+            values = [bytes(kv.get(k, input_encoding=input_encoding, output_encoding='raw')) for k in keys]
+
+        latency = time.perf_counter() - start_time
+        with self.__lock__ :
+            self.__latency_history__.append(latency)
+
+        logger.debug('loaded %d inputs from store %s in %.4f seconds', len(keys), state_hash, latency)
+        return values
+
+    # -----------------------------------------------------------------
+    @property
+    def last_latency(self) :
+        with self.__lock__ :
+            return self.__latency_history__[-1] if self.__latency_history__ else None
+
+    # -----------------------------------------------------------------
+    def statistics(self) :
+        """Return summary statistics for recent input load latencies in seconds
+        """
+        with self.__lock__ :
+            history = sorted(self.__latency_history__)
+
+        if not history :
+            return { 'count' : 0 }
+
+        result = {}
+        result['count'] = len(history)
+        result['mean'] = sum(history) / len(history)
+        result['p50'] = history[len(history) // 2]
+        result['p95'] = history[min(len(history) - 1, int(len(history) * 0.95))]
+        result['max'] = history[-1]
+        return result
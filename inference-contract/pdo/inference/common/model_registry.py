@@ -0,0 +1,185 @@
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+This file defines the ModelRegistry class that holds the models served by
+an inference guardian. Models are configured either with the single
+[Model] section or with a list of [[Models]] entries; each entry has its
+own scoring script, model server endpoint, batch limits and a cap on the
+number of concurrent requests sent to the model server. Capabilities
+select a model by its identifier, an empty identifier selects the first
+(default) model.
+"""
+
+import threading
+
+import numpy as np
+
+from pdo.inference.model_scoring_scripts import model_scoring_scripts_map
+from pdo.inference.common.ovms_predict import OVMSPredict, input_precision_map
+
+import logging
+logger = logging.getLogger(__name__)
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class ModelEndpoint(OVMSPredict) :
+    """A model served by the OpenVINO model server and its scoring script
+    """
+
+    # -----------------------------------------------------------------
+    def __init__(self, model_config) :
+        super().__init__()
+
+        self.model_id = model_config.get('Id', model_config['Name'])
+        self.model_name = model_config['Name']
+        self.input_tensor_name = model_config['InputTensorName']
+        self.output_tensor_name = model_config['OutputTensorName']
+        self.input_precision = model_config.get('InputPrecision', 'FP32')
+        if self.input_precision not in input_precision_map :
+            raise ValueError('unsupported input precision {}'.format(self.input_precision))
+
+        self.max_batch_size = max(1, int(model_config.get('MaxBatchSize', 1)))
+        self.pipeline_depth = max(1, int(model_config.get('VideoPipelineDepth', 4)))
+        self.warm_up_requests = max(0, int(model_config.get('WarmUpRequests', 1)))
+
+        # the cap on concurrent requests protects the model server from
+        # being flooded by overlapping batch and video requests
+        max_concurrent_requests = int(model_config.get('MaxConcurrentRequests', 0))
+        self.__request_slots__ = None
+        if max_concurrent_requests > 0 :
+            self.__request_slots__ = threading.BoundedSemaphore(max_concurrent_requests)
+
+        # scoring scripts read their parameters from the [Model] section
+        scoring_script_name = model_config['ScoringScriptModule']
+        scoring_scripts_handler = model_scoring_scripts_map[scoring_script_name]
+        self.model_scorer = scoring_scripts_handler({ 'Model' : model_config })
+
+        grpc_address = model_config['OpenVINOModelServerAddress']
+        grpc_port = model_config['OpenVINOModelServerPort']
+        self.create_channel_to_ovms(grpc_address, grpc_port)
+
+    # -----------------------------------------------------------------
+    def predict(self, img) :
+        """Send a pre-processed input tensor to the model server and return the output tensor
+        """
+        request = self.create_request_package_for_image_input(
+            self.model_name, self.input_tensor_name, img, self.input_precision)
+
+        if self.__request_slots__ is None :
+            return self.invoke_predict(request, self.output_tensor_name)
+
+        with self.__request_slots__ :
+            return self.invoke_predict(request, self.output_tensor_name)
+
+    # -----------------------------------------------------------------
+    def warm_up(self) :
+        """Send synthetic requests so the model server compiles the graph before real requests arrive
+
+        A single image request is sent and, when batching is enabled, a
+        full batch so that both input shapes are prepared. Failures are
+        logged and ignored; the model server may not be available yet.
+        """
+        if self.warm_up_requests == 0 :
+            return
+
+        img = self.model_scorer.synthetic_input()
+        if img is None :
+            logger.info('no synthetic input for model %s, skipping warm up', self.model_id)
+            return
+
+        inputs = [img]
+        if self.max_batch_size > 1 :
+            inputs.append(np.concatenate([img] * self.max_batch_size, axis=0))
+
+        try :
+            for _ in range(self.warm_up_requests) :
+                for warm_up_input in inputs :
+                    self.predict(warm_up_input)
+            logger.info('warmed up model %s', self.model_id)
+        except Exception as e :
+            logger.warning('failed to warm up model %s; %s', self.model_id, e)
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class ModelRegistry(object) :
+
+    __lock__ = threading.Lock()
+    __registries__ = {}
+
+    # -----------------------------------------------------------------
+    def __init__(self, model_configs) :
+        if not model_configs :
+            raise ValueError('no models configured')
+
+        self.models = {}
+        self.default_model_id = None
+        for model_config in model_configs :
+            model = ModelEndpoint(model_config)
+            if model.model_id in self.models :
+                raise ValueError('duplicate model identifier {}'.format(model.model_id))
+
+            self.models[model.model_id] = model
+            if self.default_model_id is None :
+                self.default_model_id = model.model_id
+
+    # -----------------------------------------------------------------
+    @classmethod
+    def create_from_config(cls, config) :
+        """Return the registry for the configuration, creating and warming up the models once
+
+        Every capability handler in the guardian shares the same registry
+        so that the models are only loaded and warmed up once.
+        """
+        with cls.__lock__ :
+            registry = cls.__registries__.get(id(config))
+            if registry is None :
+                model_configs = config.get('Models')
+                if model_configs is None :
+                    model_configs = [ config['Model'] ]
+
+                registry = cls(model_configs)
+                for model in registry.models.values() :
+                    model.warm_up()
+
+                cls.__registries__[id(config)] = registry
+
+        return registry
+
+    # -----------------------------------------------------------------
+    def describe(self) :
+        """Return the description of the served models that is published by the guardian
+        """
+        result = {}
+        result['default_model'] = self.default_model_id
+        result['models'] = {}
+        for (model_id, model) in self.models.items() :
+            result['models'][model_id] = model.model_scorer.input_description() or {}
+
+        return result
+
+    # -----------------------------------------------------------------
+    def get_model(self, model_id = '') :
+        """Return the model with the identifier, an empty identifier selects the default model
+
+        Returns None if the guardian does not serve the model.
+        """
+        if not model_id :
+            model_id = self.default_model_id
+
+        model = self.models.get(model_id)
+        if model is None :
+            logger.info('unknown model %s', model_id)
+        return model
@@ -23,6 +23,7 @@ output postprocessing, result packaging etc.
 """
 
 import grpc
+import numpy as np
 from tensorflow import make_tensor_proto, make_ndarray
 from tensorflow_serving.apis import predict_pb2
 from tensorflow_serving.apis import prediction_service_pb2_grpc
@@ -30,9 +31,14 @@ from tensorflow_serving.apis import prediction_service_pb2_grpc
 import logging
 logger = logging.getLogger(__name__)
 
-
-import logging
-logger = logging.getLogger(__name__)
+# map from the InputPrecision configuration values to the numpy type of
+# the input tensor sent to the model server; U8 tensors are a quarter of
+# the size of FP32 tensors on the wire and are suitable for models that
+# normalize the input inside the graph
+input_precision_map = {
+    'FP32' : np.float32,
+    'U8' : np.uint8,
+}
 
 ## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
 ## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
@@ -49,13 +55,24 @@ class OVMSPredict(object) :
         self.inferenceservice_channel = grpc.insecure_channel(address)
         self.stub = prediction_service_pb2_grpc.PredictionServiceStub(self.inferenceservice_channel)
 
-    def create_request_package_for_image_input(self, model_name, input_name, img):
+    def create_request_package_for_image_input(self, model_name, input_name, img, input_precision=None):
         """
             model_name: name of the model (to be used to process the request) as specified while starting the docker container
             input_name: Input tensor name
             img: opencv image in Mat format
+            input_precision: optional precision of the input tensor (FP32 or U8), defaults to the type of img
         """
 
+        if input_precision is not None :
+            dtype = input_precision_map[input_precision]
+            if img.dtype != dtype :
+                if dtype == np.uint8 :
+                    img = np.clip(np.rint(img), 0, 255)
+                img = img.astype(dtype)
+
+        # a contiguous array is copied into the tensor content in a single pass
+        img = np.ascontiguousarray(img)
+
         request = predict_pb2.PredictRequest()
         request.model_spec.name = model_name
         request.inputs[input_name].CopyFrom(make_tensor_proto(img, shape=(img.shape)))
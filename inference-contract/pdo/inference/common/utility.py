@@ -13,6 +13,7 @@
 # limitations under the License.
 
 import cv2
+import numpy as np
 
 # -----------------------------------------------------------------
 def CropResize(img,cropx,cropy):
@@ -26,3 +27,34 @@ def CropResize(img,cropx,cropy):
     startx = x//2-(cropx//2)
     starty = y//2-(cropy//2)
     return img[starty:starty+cropy,startx:startx+cropx,:]
+
+# -----------------------------------------------------------------
+def CropImageBytes(image_bytes,cropx,cropy):
+    """Crop an encoded image to the region that CropResize keeps
+
+    Only dimensions larger than the crop are reduced so that applying
+    CropResize to the result gives the same pixels as applying it to
+    the original image. The cropped image is re-encoded as PNG to avoid
+    further loss; the original bytes are returned if the image cannot
+    be decoded or cropping does not make the payload smaller.
+    """
+    img = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        return image_bytes
+
+    y,x,c = img.shape
+    if y <= cropy and x <= cropx:
+        return image_bytes
+
+    if y > cropy:
+        starty = y//2-(cropy//2)
+        img = img[starty:starty+cropy,:,:]
+    if x > cropx:
+        startx = x//2-(cropx//2)
+        img = img[:,startx:startx+cropx,:]
+
+    (success, encoded) = cv2.imencode('.png', img)
+    if not success or len(encoded) >= len(image_bytes):
+        return image_bytes
+
+    return encoded.tobytes()
@@ -21,6 +21,8 @@ https://github.com/openvinotoolkit/model_server/tree/main/demos/image_classifica
 """
 
 
+import collections
+
 import cv2
 import numpy as np
 
@@ -33,6 +35,10 @@ from pdo.inference.model_scoring_scripts.image_classes import imagenet_classes
 import logging
 logger = logging.getLogger(__name__)
 
+# labels indexed by class so that a block of class indices can be mapped
+# to labels in a single operation
+imagenet_labels = np.array([imagenet_classes[i] for i in range(len(imagenet_classes))])
+
 
 ## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
 ## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
@@ -45,6 +51,9 @@ class ImageClassification(ModelScoringScriptBase) :
         "properties" : {
             "size" : { "type" : "integer" },
             "rgb_image" : { "type" : "integer" },
+            "precision" : { "enum" : [ "FP32", "U8" ] },
+            "layout" : { "enum" : [ "NCHW", "NHWC" ] },
+            "top_k" : { "type" : "integer", "minimum" : 1 },
         }
     }
 
@@ -56,7 +65,11 @@ class ImageClassification(ModelScoringScriptBase) :
         params = dict()
         params['size'] = config['Model']['InputImageCropSize']
         params['rgb_image'] = config['Model']['InputImageIsRGB']
-        self.set_misc_params(params)
+        params['precision'] = config['Model'].get('InputPrecision', 'FP32')
+        params['layout'] = config['Model'].get('InputLayout', 'NCHW')
+        params['top_k'] = config['Model'].get('TopK', 1)
+        if not self.set_misc_params(params) :
+            raise ValueError('invalid model parameters')
 
     # -----------------------------------------------------------------
     def set_misc_params(self,
@@ -79,19 +92,57 @@ class ImageClassification(ModelScoringScriptBase) :
         img = np.frombuffer(image_bytes, dtype=np.uint8)
         img = cv2.imdecode(img, cv2.IMREAD_COLOR)
 
+        return self.preprocess_frame(img)
+
+    # -----------------------------------------------------------------
+    def preprocess_frame(self,
+        img,
+        **extra_params):
+        """ decoded image in cv2 Mat format (BGR). return cv2 image Mat format"""
+
         size = self.misc_params['size']
         rgb_image = self.misc_params['rgb_image']
+        precision = self.misc_params.get('precision', 'FP32')
+        layout = self.misc_params.get('layout', 'NCHW')
 
         img = CropResize(img, size, size)
-        img = img.astype('float32')
+        # models with U8 input normalize inside the graph, keep the
+        # decoded pixels as they are to reduce the size of the request
+        if precision == 'FP32':
+            img = img.astype('float32')
         #convert to RGB instead of BGR if required by model
         if rgb_image:
             img = img[:, :, [2, 1, 0]]
-        # switch from HWC to CHW and reshape to 1,3,size,size for model blob input requirements
-        img = img.transpose(2,0,1).reshape(1,3,size,size)
+        if layout == 'NHWC':
+            # the model server converts NHWC input to the layout of the model
+            img = img.reshape(1,size,size,3)
+        else:
+            # switch from HWC to CHW and reshape to 1,3,size,size for model blob input requirements
+            img = img.transpose(2,0,1).reshape(1,3,size,size)
 
         return img
 
+    # -----------------------------------------------------------------
+    def input_description(self,
+        **extra_params):
+        """ images are center cropped to size x size, clients may crop before upload"""
+
+        size = self.misc_params['size']
+
+        result = {}
+        result['input_size'] = [size, size]
+        result['input_transform'] = 'center_crop'
+
+        return result
+
+    # -----------------------------------------------------------------
+    def synthetic_input(self,
+        **extra_params):
+        """ return a pre-processed blank image used to warm up the model"""
+
+        size = self.misc_params['size']
+        return self.preprocess_frame(np.zeros((size, size, 3), dtype=np.uint8))
+
     # -----------------------------------------------------------------
     def postprocess_inference_output(self,
         img,
@@ -100,14 +151,57 @@ class ImageClassification(ModelScoringScriptBase) :
         """ return result dict that should be part of dict returned back to the caller of the inference App.
         Specifically, returns the the classification label for the image"""
 
-        result = {}
+        return self.postprocess_inference_outputs([img], output)[0]
 
-        nu = np.array(output)
-        offset = 0
-        if nu.shape[1] == 1001:
-            offset = 1
-        ma = np.argmax(nu) - offset
-        classification_label = imagenet_classes[int(ma)]
-        result['image_class'] = classification_label
+    # -----------------------------------------------------------------
+    def postprocess_inference_outputs(self,
+        images,
+        output,
+        **extra_params):
+        """ output is an (N, C) block of scores, one row per image. return a list of result dicts with
+        the classification label and score of each image and, when top_k is more than 1, the top_k
+        labels and scores"""
+
+        scores = np.asarray(output).reshape(len(images), -1)
+
+        # models trained with a background class have 1001 outputs, the
+        # background column is dropped once for the whole batch
+        if scores.shape[1] == len(imagenet_labels) + 1:
+            scores = scores[:, 1:]
+
+        top_k = min(self.misc_params.get('top_k', 1), scores.shape[1])
+        if top_k == 1:
+            top_classes = np.argmax(scores, axis=1)[:, np.newaxis]
+        else:
+            top_classes = np.argpartition(scores, -top_k, axis=1)[:, -top_k:]
+            order = np.argsort(-np.take_along_axis(scores, top_classes, axis=1), axis=1)
+            top_classes = np.take_along_axis(top_classes, order, axis=1)
+
+        top_scores = np.take_along_axis(scores, top_classes, axis=1).tolist()
+        top_labels = imagenet_labels[top_classes].tolist()
+
+        results = []
+        for (labels, label_scores) in zip(top_labels, top_scores):
+            result = {}
+            result['image_class'] = labels[0]
+            result['score'] = label_scores[0]
+            if top_k > 1:
+                result['top_classes'] = [ { 'image_class' : l, 'score' : c } for (l, c) in zip(labels, label_scores) ]
+            results.append(result)
+
+        return results
+
+    # -----------------------------------------------------------------
+    def aggregate_inference_outputs(self,
+        results,
+        **extra_params):
+        """ combine the classification labels for a segment of frames; the
+        segment is labeled with the most common class among its frames"""
+
+        votes = collections.Counter(r['image_class'] for r in results)
+
+        result = {}
+        result['image_class'] = votes.most_common(1)[0][0] if votes else None
+        result['votes'] = dict(votes)
 
         return result
@@ -50,8 +50,34 @@ class ModelScoringScriptBase(object):
         raise NotImplementedError("Must override preprocess_image")
 
 
+# -----------------------------------------------------------------
+    def preprocess_frame(self, frame, **extra_params):
+        """ frame is a decoded cv2 image Mat (e.g. a video frame). return cv2 image Mat format"""
+        raise NotImplementedError("Must override preprocess_frame to support video inference")
+
+# -----------------------------------------------------------------
+    def input_description(self, **extra_params):
+        """ return a dict describing the input expected by the model (published to clients), or None"""
+        return None
+
+# -----------------------------------------------------------------
+    def synthetic_input(self, **extra_params):
+        """ return a pre-processed input used to warm up the model, or None if warm up is not supported"""
+        return None
+
 # -----------------------------------------------------------------
     @abstractmethod
     def postprocess_inference_output(self, image, inference_output, **extra_params):
         """ return result dict that should be part of dict returned back to the caller of the inference App"""
         raise NotImplementedError("Must override postprocess_inference_output")
+
+# -----------------------------------------------------------------
+    def postprocess_inference_outputs(self, images, inference_output, **extra_params):
+        """ inference_output holds one row per image in images. return a list with one result dict per image"""
+        return [self.postprocess_inference_output(image, inference_output[index:index+1], **extra_params)
+                for (index, image) in enumerate(images)]
+
+# -----------------------------------------------------------------
+    def aggregate_inference_outputs(self, results, **extra_params):
+        """ combine the post-processed results for a segment of frames into a single result dict"""
+        return { 'results' : results }
@@ -13,10 +13,20 @@
 # limitations under the License.
 
 
-__all__ = [ 'inference']
+__all__ = [ 'inference', 'video_inference' ]
 
 from pdo.inference.operations.inference import InferenceOperation
+from pdo.inference.operations.inference import BatchInferenceOperation
+from pdo.inference.operations.video_inference import VideoInferenceOperation
+from pdo.inference.common.model_registry import ModelRegistry
 
 capability_handler_map = {
     'do_inference' : InferenceOperation,
+    'do_batch_inference' : BatchInferenceOperation,
+    'do_video_inference' : VideoInferenceOperation,
 }
+
+def service_metadata(config) :
+    """Describe the inputs of the served models in the guardian info response
+    """
+    return ModelRegistry.create_from_config(config).describe()
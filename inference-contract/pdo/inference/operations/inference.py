@@ -18,11 +18,12 @@ This file defines the InvokeApp class, a WSGI interface class for
 handling contract method invocation requests.
 """
 
+import numpy as np
+
 from pdo.contracts.guardian.common.utility import ValidateJSON
-from pdo.common.key_value import KeyValueStore
 
-from pdo.inference.model_scoring_scripts import model_scoring_scripts_map
-from pdo.inference.common.ovms_predict import OVMSPredict
+from pdo.inference.common.input_loader import InputLoader
+from pdo.inference.common.model_registry import ModelRegistry
 
 import logging
 logger = logging.getLogger(__name__)
@@ -30,7 +31,7 @@ logger = logging.getLogger(__name__)
 
 ## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
 ## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
-class InferenceOperation(OVMSPredict) :
+class InferenceOperation(object) :
     # -----------------------------------------------------------------
     __schema__ = {
         "type" : "object",
@@ -38,49 +39,100 @@ class InferenceOperation(OVMSPredict) :
             "encryption_key" : { "type" : "string" },
             "state_hash" : { "type" : "string" },
             "image_key" : { "type" : "string" },
+            "model_id" : { "type" : "string" },
         }
     }
 
 
     # -----------------------------------------------------------------
     def __init__(self, config) :
-        # Model Parameters to be used during inference
-        self.model_name = config['Model']['Name']
-        self.input_tensor_name = config['Model']['InputTensorName']
-        self.output_tensor_name = config['Model']['OutputTensorName']
-
-        # Init Model Scoring Scoring Script
-        scoring_script_name = config['Model']['ScoringScriptModule']
-        scoring_scripts_handler = model_scoring_scripts_map[scoring_script_name]
-        self.model_scorer = scoring_scripts_handler(config)
+        # Models served by the guardian, shared by all of the operations;
+        # the model used for a request is selected by the model_id signed
+        # into the capability
+        self.models = ModelRegistry.create_from_config(config)
 
-        # Create the Channel to the OpenVINO Model Server backend
-        grpc_address = config['Model']['OpenVINOModelServerAddress']
-        grpc_port = config['Model']['OpenVINOModelServerPort']
-        self.create_channel_to_ovms(grpc_address, grpc_port)
+        # Loader for request inputs pushed to the local storage service
+        self.input_loader = InputLoader.create_from_config(config)
 
     # -----------------------------------------------------------------
     def __call__(self, params) :
         if not ValidateJSON(params, self.__schema__) :
             return None
 
+        model = self.models.get_model(params.get('model_id', ''))
+        if model is None :
+            return None
+
         encryption_key = params['encryption_key']
         state_hash = params['state_hash']
         image_key = params['image_key']
 
         # load the input image from local storage
-        kv = KeyValueStore(encryption_key, state_hash)
-        with kv :
-            image_bytes = kv.get(image_key,output_encoding='raw')
+        (image_bytes,) = self.input_loader.load(encryption_key, state_hash, [image_key])
 
         # pre-process the image input using the scoring script
-        img = self.model_scorer.preprocess_image(bytes(image_bytes))
-
-        #Create the inference request package
-        request = self.create_request_package_for_image_input(self.model_name, self.input_tensor_name, img)
+        img = model.model_scorer.preprocess_image(image_bytes)
 
         # do inference using the OVMS backend
-        output = self.invoke_predict(request, self.output_tensor_name)
+        output = model.predict(img)
 
         # post-process the output using the scoring script
-        return self.model_scorer.postprocess_inference_output(img, output)
+        return model.model_scorer.postprocess_inference_output(img, output)
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class BatchInferenceOperation(InferenceOperation) :
+    """Run inference over a batch of images covered by a single capability
+
+    The images are stored in a single key value store under the keys
+    <image_key>_<n>. Images are packed into tensors of at most the
+    MaxBatchSize of the selected model so that each call to the model server handles
+    a full batch; the result contains one entry per image in the order
+    of the keys.
+    """
+
+    # -----------------------------------------------------------------
+    __schema__ = {
+        "type" : "object",
+        "properties" : {
+            "encryption_key" : { "type" : "string" },
+            "state_hash" : { "type" : "string" },
+            "image_key" : { "type" : "string" },
+            "image_count" : { "type" : "integer", "minimum" : 1 },
+            "model_id" : { "type" : "string" },
+        },
+        "required" : [ "encryption_key", "state_hash", "image_key", "image_count" ],
+    }
+
+    # -----------------------------------------------------------------
+    def __call__(self, params) :
+        if not ValidateJSON(params, self.__schema__) :
+            return None
+
+        model = self.models.get_model(params.get('model_id', ''))
+        if model is None :
+            return None
+
+        encryption_key = params['encryption_key']
+        state_hash = params['state_hash']
+        image_key = params['image_key']
+        image_count = params['image_count']
+
+        results = []
+
+        for batch_start in range(0, image_count, model.max_batch_size) :
+            batch_end = min(batch_start + model.max_batch_size, image_count)
+
+            # load and pre-process the images in this batch
+            batch_keys = ['{}_{}'.format(image_key, index) for index in range(batch_start, batch_end)]
+            batch_bytes = self.input_loader.load(encryption_key, state_hash, batch_keys)
+            images = [model.model_scorer.preprocess_image(image_bytes) for image_bytes in batch_bytes]
+
+            # each pre-processed image has a leading batch dimension of 1
+            batch = np.concatenate(images, axis=0)
+
+            output = model.predict(batch)
+
+            results += model.model_scorer.postprocess_inference_outputs(images, output)
+
+        return { 'results' : results }
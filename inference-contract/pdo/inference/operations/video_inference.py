@@ -0,0 +1,227 @@
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+This file defines the VideoInferenceOperation class, a capability handler
+for streaming inference over a video file or a sequence of frames. Frames
+are decoded lazily and sampled at a configurable stride; pre-processing,
+model invocation and post-processing are overlapped in a bounded pipeline
+so that memory use does not depend on the length of the video. A video
+is decoded from a private temporary file, which uses disk space equal to
+the size of the video while the request is processed.
+"""
+
+import collections
+import os
+import tempfile
+
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from pdo.contracts.guardian.common.utility import ValidateJSON
+
+from pdo.inference.operations.inference import InferenceOperation
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class VideoInferenceOperation(InferenceOperation) :
+    # -----------------------------------------------------------------
+    __schema__ = {
+        "type" : "object",
+        "properties" : {
+            "encryption_key" : { "type" : "string" },
+            "state_hash" : { "type" : "string" },
+            "media_key" : { "type" : "string" },
+            "media_type" : { "enum" : [ "video", "frames" ] },
+            "key_count" : { "type" : "integer", "minimum" : 1 },
+            "frame_stride" : { "type" : "integer", "minimum" : 1 },
+            "segment_length" : { "type" : "integer", "minimum" : 0 },
+            "model_id" : { "type" : "string" },
+        },
+        "required" : [
+            "encryption_key", "state_hash", "media_key", "media_type",
+            "key_count", "frame_stride", "segment_length"
+        ],
+    }
+
+    # -----------------------------------------------------------------
+    # number of keys read from the store each time it is opened
+    __chunk_batch_size__ = 256
+    __frame_batch_size__ = 8
+
+    # -----------------------------------------------------------------
+    @staticmethod
+    def __video_buffer__() :
+        """Create the buffer that holds the decrypted video for decoding
+
+        OpenCV requires a seekable file to decode most video containers,
+        so the video is written to a temporary file readable only by the
+        guardian. Where the platform allows it the file is unlinked as soon
+        as it is created and decoded through the descriptor of this
+        process; otherwise it is removed when decoding completes. The file
+        uses disk space equal to the size of the video for the duration of
+        the request, memory use does not depend on the size of the video.
+
+        :return: tuple of the file descriptor, the path to pass to OpenCV and the file to remove or None
+        """
+        (fd, video_file) = tempfile.mkstemp(prefix='video_')
+        fd_path = '/proc/self/fd/{}'.format(fd)
+        if os.path.exists(fd_path) :
+            os.remove(video_file)
+            return (fd, fd_path, None)
+
+        return (fd, video_file, video_file)
+
+    # -----------------------------------------------------------------
+    def __load_keys__(self, encryption_key, state_hash, media_key, key_count, batch_size) :
+        """Generate the values stored under the indexed keys of the media
+
+        Keys are read in batches so that the store is opened once for each
+        batch rather than once for each key.
+        """
+        for batch_start in range(0, key_count, batch_size) :
+            batch_keys = [ f'{media_key}_{n}' for n in range(batch_start, min(batch_start + batch_size, key_count)) ]
+            for value in self.input_loader.load(encryption_key, state_hash, batch_keys) :
+                yield value
+
+    # -----------------------------------------------------------------
+    def __video_frames__(self, encryption_key, state_hash, media_key, key_count) :
+        """Generate the decoded frames of a video stored as chunks
+
+        The chunks are decrypted into a private temporary file that is
+        released when the generator completes.
+        """
+        (fd, video_path, video_file) = self.__video_buffer__()
+        try :
+            with os.fdopen(fd, 'wb', closefd=False) as fp :
+                for chunk in self.__load_keys__(encryption_key, state_hash, media_key, key_count, self.__chunk_batch_size__) :
+                    fp.write(chunk)
+
+            capture = cv2.VideoCapture(video_path)
+            try :
+                while True :
+                    (success, frame) = capture.read()
+                    if not success :
+                        break
+                    yield frame
+            finally :
+                capture.release()
+        finally :
+            os.close(fd)
+            if video_file :
+                os.remove(video_file)
+
+    # -----------------------------------------------------------------
+    def __sequence_frames__(self, encryption_key, state_hash, media_key, key_count) :
+        """Generate the decoded frames of a frame sequence, one encoded frame per key
+        """
+        frames = self.__load_keys__(encryption_key, state_hash, media_key, key_count, self.__frame_batch_size__)
+        for (frame_number, frame_bytes) in enumerate(frames) :
+            frame = cv2.imdecode(np.frombuffer(frame_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if frame is None :
+                raise ValueError('unable to decode frame {}'.format(frame_number))
+            yield frame
+
+    # -----------------------------------------------------------------
+    def __pipeline__(self, model, frames, frame_stride) :
+        """Run the sampled frames through the model with bounded overlap
+
+        Decoding and pre-processing happen in the calling thread, model
+        invocations run on a small pool of workers and post-processing is
+        done in frame order as each invocation completes. At most the
+        VideoPipelineDepth of the model frames are held at any time.
+        """
+        pending = collections.deque()
+        with ThreadPoolExecutor(max_workers=model.pipeline_depth) as executor :
+            for (frame_number, frame) in enumerate(frames) :
+                if frame_number % frame_stride != 0 :
+                    continue
+
+                img = model.model_scorer.preprocess_frame(frame)
+                pending.append((frame_number, img, executor.submit(model.predict, img)))
+
+                if len(pending) >= model.pipeline_depth :
+                    (number, img, future) = pending.popleft()
+                    yield (number, model.model_scorer.postprocess_inference_output(img, future.result()))
+
+            while pending :
+                (number, img, future) = pending.popleft()
+                yield (number, model.model_scorer.postprocess_inference_output(img, future.result()))
+
+    # -----------------------------------------------------------------
+    def __call__(self, params) :
+        if not ValidateJSON(params, self.__schema__) :
+            return None
+
+        model = self.models.get_model(params.get('model_id', ''))
+        if model is None :
+            return None
+
+        encryption_key = params['encryption_key']
+        state_hash = params['state_hash']
+        media_key = params['media_key']
+        key_count = params['key_count']
+        frame_stride = params['frame_stride']
+        segment_length = params['segment_length']
+
+        if params['media_type'] == 'video' :
+            frames = self.__video_frames__(encryption_key, state_hash, media_key, key_count)
+        else :
+            frames = self.__sequence_frames__(encryption_key, state_hash, media_key, key_count)
+
+        # the frame generator is closed explicitly so the decrypted video is
+        # released even when the pipeline fails
+        try :
+            # without a segment length the results are reported per frame
+            if segment_length == 0 :
+                results = []
+                for (frame_number, result) in self.__pipeline__(model, frames, frame_stride) :
+                    result['frame'] = frame_number
+                    results.append(result)
+                return { 'frames' : results }
+
+            # otherwise aggregate the frame results for each segment, only the
+            # results for the current segment are held in memory
+            segments = []
+            segment_number = 0
+            segment_results = []
+
+            def close_segment() :
+                result = model.model_scorer.aggregate_inference_outputs(segment_results)
+                result['start_frame'] = segment_number * segment_length
+                result['end_frame'] = (segment_number + 1) * segment_length - 1
+                result['sampled_frames'] = len(segment_results)
+                segments.append(result)
+
+            for (frame_number, result) in self.__pipeline__(model, frames, frame_stride) :
+                if frame_number // segment_length != segment_number :
+                    if segment_results :
+                        close_segment()
+                    segment_number = frame_number // segment_length
+                    segment_results = []
+                segment_results.append(result)
+
+            if segment_results :
+                close_segment()
+
+            return { 'segments' : segments }
+        finally :
+            frames.close()
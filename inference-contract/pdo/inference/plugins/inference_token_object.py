@@ -12,8 +12,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import glob
 import json
 import logging
+import os
 
 from pdo.contract import invocation_request
 from pdo.common.key_value import KeyValueStore
@@ -28,7 +30,10 @@ import pdo.client.commands.contract as pcontract_cmd
 
 import pdo.exchange.plugins.token_object as token_object
 
+from pdo.contracts.guardian.common import block_transfer
 from pdo.contracts.guardian.common.guardian_service import GuardianServiceClient
+from pdo.contracts.guardian.common.utility import send_file
+from pdo.inference.common.utility import CropImageBytes
 
 __all__ = [
     'op_initialize',
@@ -42,10 +47,14 @@ __all__ = [
     'op_escrow',
     'op_release',
     'op_claim',
-    'op_do_inference'
+    'op_do_inference',
+    'op_do_batch_inference',
+    'op_do_video_inference',
     'cmd_mint_tokens',
     'cmd_transfer_assets',
     'cmd_do_inference',
+    'cmd_do_batch_inference',
+    'cmd_do_video_inference',
     'do_inference_token',
     'do_inference_token_contract',
     'load_commands',
@@ -98,14 +107,31 @@ class op_do_inference(pcontract.contract_op_base) :
             help='URL for the guardian service',
             type=str, required=True)
 
+        subparser.add_argument(
+            '-m', '--model',
+            help='Identifier of the model served by the guardian, defaults to the guardian default model',
+            type=str, default='')
+
+        subparser.add_argument(
+            '--resize-input',
+            help='Shrink images to the input size advertised by the guardian before upload',
+            action='store_true')
+
     @classmethod
-    def invoke(cls, state, session_params, image, search_path, url, **kwargs) :
+    def invoke(cls, state, session_params, image, search_path, url, model='', resize_input=False, **kwargs) :
         session_params['commit'] = False
 
+        service_client = GuardianServiceClient(url)
+
         image_file = putils.find_file_in_path(image, search_path)
         with open(image_file, 'rb') as bf :
             image_bytes = bf.read()
 
+        # only the region of the image used by the model is uploaded
+        if resize_input :
+            input_description = __model_input_description__(service_client, model)
+            image_bytes = __shrink_image__(image_bytes, input_description)
+
         image_key = crypto.string_to_byte_array("__image__")
         image_bytes = crypto.string_to_byte_array(image_bytes)
 
@@ -116,6 +142,7 @@ class op_do_inference(pcontract.contract_op_base) :
         # send the request to the contract to create a capability for the guardian
         params = {}
         params['image_key'] = "__image__"
+        params['model_id'] = model
         params['encryption_key'] = kv.encryption_key
         params['state_hash'] = kv.hash_identity
 
@@ -126,11 +153,313 @@ class op_do_inference(pcontract.contract_op_base) :
 
         cls.log_invocation(message, capability)
 
-        # process the capability that was created
+        # push the KV store blocks to the storage service associated with the guardian
+        block_transfer.sync_to_block_store(kv, service_client)
+
+        # send the capability to the guardian, this returns a dictionary
+        result = service_client.process_capability(**capability)
+        return result
+
+## -----------------------------------------------------------------
+## some utility functions
+## -----------------------------------------------------------------
+
+## -----------------------------------------------------------------
+def __model_input_description__(service_client, model) :
+    """Return the input description the guardian publishes for a model
+
+    Returns None if the guardian does not publish a description for
+    the model, in which case images are uploaded unchanged.
+    """
+    try :
+        service_metadata = service_client.get_guardian_metadata()['service_metadata']
+        model_id = model or service_metadata['default_model']
+        return service_metadata['models'][model_id]
+    except Exception as e :
+        logger.info('guardian does not describe the input for model %s; %s', model, e)
+        return None
+
+## -----------------------------------------------------------------
+def __shrink_image__(image_bytes, input_description) :
+    """Reduce an encoded image to the region that the model uses
+
+    The image is only changed when the guardian describes the transform
+    it applies so that inference results are unchanged.
+    """
+    if not input_description :
+        return image_bytes
+
+    if input_description.get('input_transform') != 'center_crop' :
+        logger.info('unsupported input transform %s', input_description.get('input_transform'))
+        return image_bytes
+
+    (height, width) = input_description['input_size']
+    return CropImageBytes(image_bytes, width, height)
+
+## -----------------------------------------------------------------
+def __expand_image_list__(images, search_path) :
+    """Expand a list of image specifications into a list of file names
+
+    Each specification may be a directory (all files in the directory
+    are used), a glob pattern or a file name; glob patterns and file
+    names are resolved relative to the directories in the search path.
+    """
+    image_files = []
+    for image in images :
+        if os.path.isdir(image) :
+            image_files += sorted(filter(os.path.isfile, glob.glob(os.path.join(image, '*'))))
+            continue
+
+        if glob.has_magic(image) :
+            for path in search_path :
+                matches = sorted(filter(os.path.isfile, glob.glob(os.path.join(path, image))))
+                if matches :
+                    image_files += matches
+                    break
+            continue
+
+        image_files.append(putils.find_file_in_path(image, search_path))
+
+    return image_files
+
+## -----------------------------------------------------------------
+## -----------------------------------------------------------------
+class op_do_batch_inference(pcontract.contract_op_base) :
+    """op_do_batch_inference implements end-to-end inference over a batch of images
+
+    The images are split into chunks of chunk_size images, or kept in a
+    single chunk when chunk_size is 0. Each chunk is packed into a key
+    value store under indexed keys, a capability covering the chunk is
+    requested from the token object and the guardian processes the chunk
+    in one request. The guardian request timeout grows by image_timeout
+    seconds for every image in the chunk. The result is a list of (image
+    file, result) pairs in the order the images were found.
+    """
+
+    name = "do_batch_inference"
+    help = "batch inference over a set of images using openvino model"
+
+    @classmethod
+    def add_arguments(cls, subparser) :
+        subparser.add_argument(
+            '--images',
+            help='Directories, glob patterns or filenames of the images to use as inference input',
+            nargs='+', type=str, required=True)
+
+        subparser.add_argument(
+            '--search-path',
+            help='Directories to search for the data files',
+            nargs='+', type=str, default=['.', './data'])
+
+        subparser.add_argument(
+            '-u', '--url',
+            help='URL for the guardian service',
+            type=str, required=True)
+
+        subparser.add_argument(
+            '-m', '--model',
+            help='Identifier of the model served by the guardian, defaults to the guardian default model',
+            type=str, default='')
+
+        subparser.add_argument(
+            '--resize-input',
+            help='Shrink images to the input size advertised by the guardian before upload',
+            action='store_true')
+
+        subparser.add_argument(
+            '--chunk-size',
+            help='Number of images covered by each capability, 0 for a single capability',
+            type=int, default=256)
+
+        subparser.add_argument(
+            '--image-timeout',
+            help='Seconds added to the guardian request timeout for each image in a chunk',
+            type=float, default=0.5)
+
+    @classmethod
+    def invoke(cls, state, session_params, images, search_path, url, model='', resize_input=False,
+               chunk_size=256, image_timeout=0.5, **kwargs) :
+        session_params['commit'] = False
+
+        image_files = __expand_image_list__(images, search_path)
+        if not image_files :
+            raise ValueError('no images found for batch inference')
+
         service_client = GuardianServiceClient(url)
 
+        input_description = None
+        if resize_input :
+            input_description = __model_input_description__(service_client, model)
+
+        # each chunk of images is stored in its own key value store and
+        # covered by its own capability; with the default of 256 images,
+        # 10,000 images take 40 capabilities and 40 guardian requests, each
+        # allowed 20 + 256 * 0.5 seconds to complete
+        chunk_size = int(chunk_size) if chunk_size and int(chunk_size) > 0 else len(image_files)
+        results = []
+        for chunk_start in range(0, len(image_files), chunk_size) :
+            chunk_files = image_files[chunk_start:chunk_start + chunk_size]
+            service_client.default_timeout = \
+                GuardianServiceClient.default_timeout + max(0.0, image_timeout) * len(chunk_files)
+            chunk_results = cls.__process_chunk__(
+                state, session_params, service_client, chunk_files, input_description, model)
+            results.extend(zip(chunk_files, chunk_results))
+
+        return results
+
+    @classmethod
+    def __process_chunk__(cls, state, session_params, service_client, image_files, input_description, model) :
+        image_key_base = "__image__"
+
+        kv = KeyValueStore()
+        with kv :
+            for (index, image_file) in enumerate(image_files) :
+                with open(image_file, 'rb') as bf :
+                    image_bytes = bf.read()
+
+                # only the region of the image used by the model is uploaded
+                if input_description :
+                    image_bytes = __shrink_image__(image_bytes, input_description)
+
+                image_key = crypto.string_to_byte_array('{}_{}'.format(image_key_base, index))
+                _ = kv.set(image_key, image_bytes, input_encoding='raw', output_encoding='raw')
+
+        # send the request to the contract to create a single capability for the chunk
+        params = {}
+        params['image_key'] = image_key_base
+        params['image_count'] = len(image_files)
+        params['model_id'] = model
+        params['encryption_key'] = kv.encryption_key
+        params['state_hash'] = kv.hash_identity
+
+        message = invocation_request('do_batch_inference', **params)
+        capability = pcontract_cmd.send_to_contract(state,  message, **session_params)
+
+        capability = json.loads(capability)
+
+        cls.log_invocation(message, capability)
+
         # push the KV store blocks to the storage service associated with the guardian
-        kv.sync_to_block_store(service_client)
+        block_transfer.sync_to_block_store(kv, service_client)
+
+        # send the capability to the guardian, the results are returned in the
+        # same order as the images were stored
+        result = service_client.process_capability(**capability)
+        if len(result['results']) != len(image_files) :
+            raise ValueError('guardian returned {} results for {} images'.format(len(result['results']), len(image_files)))
+
+        return result['results']
+
+## -----------------------------------------------------------------
+## -----------------------------------------------------------------
+class op_do_video_inference(pcontract.contract_op_base) :
+    """op_do_video_inference implements streaming inference over a video or frame sequence
+
+    A video file is stored in chunks using the common file transfer
+    layout; a frame sequence is stored with one encoded frame per key.
+    The guardian samples every frame_stride frames and reports results
+    per frame or, when segment_length is positive, per segment.
+    """
+
+    name = "do_video_inference"
+    help = "streaming inference over a video or a sequence of frames using openvino model"
+
+    @classmethod
+    def add_arguments(cls, subparser) :
+        media_action = subparser.add_mutually_exclusive_group(required=True)
+        media_action.add_argument(
+            '--video',
+            help='Filename of the video to use as inference input',
+            type=str)
+        media_action.add_argument(
+            '--frames',
+            help='Directories, glob patterns or filenames of the frames to use as inference input',
+            nargs='+', type=str)
+
+        subparser.add_argument(
+            '--frame-stride',
+            help='Run inference on every n-th frame',
+            type=int, default=1)
+
+        subparser.add_argument(
+            '--segment-length',
+            help='Number of frames aggregated into a segment, 0 to report results per frame',
+            type=int, default=0)
+
+        subparser.add_argument(
+            '--search-path',
+            help='Directories to search for the data files',
+            nargs='+', type=str, default=['.', './data'])
+
+        subparser.add_argument(
+            '-u', '--url',
+            help='URL for the guardian service',
+            type=str, required=True)
+
+        subparser.add_argument(
+            '-m', '--model',
+            help='Identifier of the model served by the guardian, defaults to the guardian default model',
+            type=str, default='')
+
+    @classmethod
+    def invoke(cls, state, session_params, video, frames, frame_stride, segment_length, search_path, url, model='', **kwargs) :
+        session_params['commit'] = False
+
+        if frame_stride < 1 :
+            raise ValueError('frame stride must be a positive integer')
+        if segment_length < 0 :
+            raise ValueError('segment length must not be negative')
+
+        service_client = GuardianServiceClient(url)
+
+        # store the media in a KV store and push the blocks to the
+        # storage service associated with the guardian
+        if video :
+            video_file = putils.find_file_in_path(video, search_path)
+            file_information = send_file(video_file, service_client)
+
+            media_type = 'video'
+            media_key = file_information['key_base']
+            key_count = file_information['chunks']
+            encryption_key = file_information['encryption_key']
+            state_hash = file_information['state_hash']
+        else :
+            frame_files = __expand_image_list__(frames, search_path)
+            if not frame_files :
+                raise ValueError('no frames found for video inference')
+
+            media_type = 'frames'
+            media_key = '__frame__'
+            key_count = len(frame_files)
+
+            kv = KeyValueStore()
+            for (index, frame_file) in enumerate(frame_files) :
+                with open(frame_file, 'rb') as bf :
+                    frame_bytes = bf.read()
+                with kv :
+                    _ = kv.set('{}_{}'.format(media_key, index), frame_bytes, input_encoding='str', output_encoding='raw')
+
+            block_transfer.sync_to_block_store(kv, service_client)
+            encryption_key = kv.encryption_key
+            state_hash = kv.hash_identity
+
+        # send the request to the contract to create a capability for the guardian
+        params = {}
+        params['media_key'] = media_key
+        params['media_type'] = media_type
+        params['key_count'] = key_count
+        params['frame_stride'] = frame_stride
+        params['segment_length'] = segment_length
+        params['model_id'] = model
+        params['encryption_key'] = encryption_key
+        params['state_hash'] = state_hash
+
+        message = invocation_request('do_video_inference', **params)
+        capability = pcontract_cmd.send_to_contract(state,  message, **session_params)
+
+        capability = json.loads(capability)
+
+        cls.log_invocation(message, capability)
 
         # send the capability to the guardian, this returns a dictionary
         result = service_client.process_capability(**capability)
@@ -163,8 +492,18 @@ class cmd_do_inference(pcommand.contract_command_base) :
             help='URL for the guardian service',
             type=str)
 
+        subparser.add_argument(
+            '-m', '--model',
+            help='Identifier of the model served by the guardian, defaults to the guardian default model',
+            type=str, default='')
+
+        subparser.add_argument(
+            '--resize-input',
+            help='Shrink images to the input size advertised by the guardian before upload',
+            action='store_true')
+
     @classmethod
-    def invoke(cls, state, context, image, search_path, url=None, **kwargs) :
+    def invoke(cls, state, context, image, search_path, url=None, model='', resize_input=False, **kwargs) :
         save_file = pcontract_cmd.get_contract_from_context(state, context)
         if not save_file :
             raise ValueError("token has not been created")
@@ -180,6 +519,160 @@ class cmd_do_inference(pcommand.contract_command_base) :
             image,
             search_path,
             url,
+            model,
+            resize_input,
+            **kwargs)
+
+        cls.display(result)
+
+        return result
+
+## -----------------------------------------------------------------
+## -----------------------------------------------------------------
+class cmd_do_batch_inference(pcommand.contract_command_base) :
+    """cmd_do_batch_inference implements end-to-end inference over a batch of images
+
+    The images may be specified as a directory, a glob pattern or a list of files.
+    """
+    name = "do_batch_inference"
+    help = "batch inference over a set of images using openvino model"
+
+    @classmethod
+    def add_arguments(cls, subparser) :
+        subparser.add_argument(
+            '--images',
+            help='Directories, glob patterns or filenames of the images to use as inference input',
+            nargs='+', type=str, required=True)
+
+        subparser.add_argument(
+            '--search-path',
+            help='Directories to search for the data files',
+            nargs='+', type=str, default=['.', './data'])
+
+        subparser.add_argument(
+            '-u', '--url',
+            help='URL for the guardian service',
+            type=str)
+
+        subparser.add_argument(
+            '-m', '--model',
+            help='Identifier of the model served by the guardian, defaults to the guardian default model',
+            type=str, default='')
+
+        subparser.add_argument(
+            '--resize-input',
+            help='Shrink images to the input size advertised by the guardian before upload',
+            action='store_true')
+
+        subparser.add_argument(
+            '--chunk-size',
+            help='Number of images covered by each capability, 0 for a single capability',
+            type=int, default=256)
+
+        subparser.add_argument(
+            '--image-timeout',
+            help='Seconds added to the guardian request timeout for each image in a chunk',
+            type=float, default=0.5)
+
+    @classmethod
+    def invoke(cls, state, context, images, search_path, url=None, model='', resize_input=False,
+               chunk_size=256, image_timeout=0.5, **kwargs) :
+        save_file = pcontract_cmd.get_contract_from_context(state, context)
+        if not save_file :
+            raise ValueError("token has not been created")
+
+        if url is None :
+            guardian_context = context.get_context('data_guardian_context')
+            url = guardian_context['url']
+
+        session = pbuilder.SessionParameters(save_file=save_file)
+        result = pcontract.invoke_contract_op(
+            op_do_batch_inference,
+            state, context, session,
+            images,
+            search_path,
+            url,
+            model,
+            resize_input,
+            chunk_size,
+            image_timeout,
+            **kwargs)
+
+        for (image_file, image_result) in result :
+            cls.display('{}: {}'.format(image_file, image_result))
+
+        return result
+
+## -----------------------------------------------------------------
+## -----------------------------------------------------------------
+class cmd_do_video_inference(pcommand.contract_command_base) :
+    """cmd_do_video_inference implements streaming inference over a video or frame sequence
+    """
+    name = "do_video_inference"
+    help = "streaming inference over a video or a sequence of frames using openvino model"
+
+    @classmethod
+    def add_arguments(cls, subparser) :
+        media_action = subparser.add_mutually_exclusive_group(required=True)
+        media_action.add_argument(
+            '--video',
+            help='Filename of the video to use as inference input',
+            type=str)
+        media_action.add_argument(
+            '--frames',
+            help='Directories, glob patterns or filenames of the frames to use as inference input',
+            nargs='+', type=str)
+
+        subparser.add_argument(
+            '--frame-stride',
+            help='Run inference on every n-th frame',
+            type=int, default=1)
+
+        subparser.add_argument(
+            '--segment-length',
+            help='Number of frames aggregated into a segment, 0 to report results per frame',
+            type=int, default=0)
+
+        subparser.add_argument(
+            '--search-path',
+            help='Directories to search for the data files',
+            nargs='+', type=str, default=['.', './data'])
+
+        subparser.add_argument(
+            '-u', '--url',
+            help='URL for the guardian service',
+            type=str)
+
+        subparser.add_argument(
+            '-m', '--model',
+            help='Identifier of the model served by the guardian, defaults to the guardian default model',
+            type=str, default='')
+
+    @classmethod
+    def invoke(cls, state, context, video=None, frames=None, frame_stride=1, segment_length=0,
+               search_path=None, url=None, model='', **kwargs) :
+        if search_path is None :
+            search_path = ['.', './data']
+
+        save_file = pcontract_cmd.get_contract_from_context(state, context)
+        if not save_file :
+            raise ValueError("token has not been created")
+
+        if url is None :
+            guardian_context = context.get_context('data_guardian_context')
+            url = guardian_context['url']
+
+        session = pbuilder.SessionParameters(save_file=save_file)
+        result = pcontract.invoke_contract_op(
+            op_do_video_inference,
+            state, context, session,
+            video,
+            frames,
+            frame_stride,
+            segment_length,
+            search_path,
+            url,
+            model,
             **kwargs)
 
         cls.display(result)
@@ -202,6 +695,8 @@ __operations__ = [
     op_release,
     op_claim,
     op_do_inference,
+    op_do_batch_inference,
+    op_do_video_inference,
 ]
 
 do_inference_token_contract = pcontract.create_shell_command('inference_token_contract', __operations__)
@@ -210,6 +705,8 @@ __commands__ = [
     cmd_mint_tokens,
     cmd_transfer_assets,
     cmd_do_inference,
+    cmd_do_batch_inference,
+    cmd_do_video_inference,
 ]
 
 do_inference_token = pcommand.create_shell_command('inference_token', __commands__)
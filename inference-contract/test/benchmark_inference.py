@@ -0,0 +1,417 @@
+#!/usr/bin/env python
+
+# Copyright 2023 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Offline throughput benchmark for the inference guardian operations.
+
+The benchmark starts a stand-in OpenVINO model server (a gRPC
+PredictionService with configurable latency and output shape) in a
+separate process. Request inputs are not read through a storage service;
+instead the input loader of each operation is replaced by an in-memory
+loader that serves the stored values directly, so the measurements do
+not include block transfer or key value store decryption. Requests are driven directly through
+InferenceOperation (or BatchInferenceOperation) and through the
+ProcessCapabilityApp WSGI handler at each of the requested concurrency
+levels. For each run the latency percentiles, images per second and
+guardian CPU time per request are reported. No network access, model
+server container or PDO services are required.
+
+Example:
+    python benchmark_inference.py --concurrency 1 4 16 --requests 200 --latency 5
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from concurrent import futures
+
+import cv2
+import grpc
+import numpy as np
+
+from tensorflow import make_tensor_proto
+from tensorflow_serving.apis import predict_pb2
+from tensorflow_serving.apis import prediction_service_pb2_grpc
+
+from pdo.contracts.guardian.common.capability_keystore import CapabilityKeyStore
+from pdo.contracts.guardian.common.secrets import send_secret
+from pdo.contracts.guardian.wsgi.process_capability import ProcessCapabilityApp
+
+from pdo.inference.common.input_loader import InputLoader
+from pdo.inference.operations import capability_handler_map
+
+import logging
+logger = logging.getLogger(__name__)
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## Stand-in model server
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class StandInPredictionService(prediction_service_pb2_grpc.PredictionServiceServicer) :
+    """PredictionService that returns random scores after a fixed delay
+
+    The output has one row of output_classes scores for each image in
+    the leading (batch) dimension of the input tensor.
+    """
+
+    # -----------------------------------------------------------------
+    def __init__(self, latency, output_name, output_classes) :
+        self.latency = latency
+        self.output_name = output_name
+        self.output_classes = output_classes
+
+    # -----------------------------------------------------------------
+    def Predict(self, request, context) :
+        input_tensor = next(iter(request.inputs.values()))
+        batch_size = input_tensor.tensor_shape.dim[0].size
+
+        if self.latency > 0 :
+            time.sleep(self.latency)
+
+        output = np.random.rand(batch_size, self.output_classes).astype(np.float32)
+
+        response = predict_pb2.PredictResponse()
+        response.model_spec.name = request.model_spec.name
+        response.outputs[self.output_name].CopyFrom(make_tensor_proto(output))
+        return response
+
+# -----------------------------------------------------------------
+def serve_prediction_service(port, latency, output_name, output_classes, workers, ready) :
+    """Run the stand-in model server until the process is terminated
+    """
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=workers))
+    prediction_service_pb2_grpc.add_PredictionServiceServicer_to_server(
+        StandInPredictionService(latency, output_name, output_classes), server)
+    server.add_insecure_port('127.0.0.1:{}'.format(port))
+    server.start()
+    ready.set()
+    server.wait_for_termination()
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## In-memory input loader
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class StandInKeyValueStore(object) :
+    """In-memory key value store with the interface used by InputLoader
+    """
+
+    # -----------------------------------------------------------------
+    def __init__(self, values) :
+        self.values = values
+
+    def __enter__(self) :
+        return self
+
+    def __exit__(self, *args) :
+        return False
+
+    # -----------------------------------------------------------------
+    def get(self, key, input_encoding='str', output_encoding='raw') :
+        return self.values[key]
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class InMemoryInputLoader(InputLoader) :
+    """Input loader that serves stores held in memory by the benchmark
+
+    This replaces the key value stores that the guardian would open from
+    its storage service; no blocks are stored, transferred or decrypted.
+    Only the store lookup is replaced, latency accounting is inherited
+    from InputLoader.
+    """
+
+    # -----------------------------------------------------------------
+    def __init__(self) :
+        super().__init__()
+        self.stores = {}
+
+    # -----------------------------------------------------------------
+    def push_store(self, values) :
+        """Hold a set of key/value pairs and return the (encryption_key, state_hash) of the store
+        """
+        state_hash = 'store_{}'.format(len(self.stores))
+        encryption_key = 'key_{}'.format(len(self.stores))
+        self.stores[(state_hash, encryption_key)] = StandInKeyValueStore(values)
+        return (encryption_key, state_hash)
+
+    # -----------------------------------------------------------------
+    def open_store(self, encryption_key, state_hash) :
+        return self.stores[(state_hash, encryption_key)]
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## Request drivers
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class OperationDriver(object) :
+    """Invoke the capability handler directly with the operation parameters
+    """
+    name = 'operation'
+
+    # -----------------------------------------------------------------
+    def __init__(self, config, storage, method_name) :
+        self.operation = capability_handler_map[method_name](config)
+        self.operation.input_loader = storage
+
+    # -----------------------------------------------------------------
+    def __call__(self, method_name, parameters) :
+        result = self.operation(parameters)
+        if result is None :
+            raise RuntimeError('operation failed')
+        return result
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+class CapabilityDriver(object) :
+    """Invoke the ProcessCapabilityApp WSGI handler with an encrypted capability
+
+    This includes the cost of decrypting the capability and of
+    serializing the result in addition to the operation itself.
+    """
+    name = 'capability'
+
+    # -----------------------------------------------------------------
+    def __init__(self, config, storage, method_name) :
+        self.capability_store = CapabilityKeyStore(os.path.join(config['Data']['Path'], 'keystore.db'))
+        self.minted_identity = 'benchmark'
+        self.capability_key = self.capability_store.create_capability_key(self.minted_identity)
+
+        self.app = ProcessCapabilityApp(config, self.capability_store, None)
+        for operation in self.app.capability_handler_map.values() :
+            operation.input_loader = storage
+
+    # -----------------------------------------------------------------
+    def __call__(self, method_name, parameters) :
+        operation = {}
+        operation['nonce'] = os.urandom(16).hex()
+        operation['method_name'] = method_name
+        operation['parameters'] = parameters
+
+        request = {}
+        request['minted_identity'] = self.minted_identity
+        request['operation'] = send_secret(self.capability_key, operation)
+        body = json.dumps(request).encode('utf8')
+
+        environ = {
+            'REQUEST_METHOD' : 'POST',
+            'CONTENT_TYPE' : 'application/json',
+            'CONTENT_LENGTH' : str(len(body)),
+            'wsgi.input' : io.BytesIO(body),
+        }
+
+        response_status = []
+        def start_response(status, headers) :
+            response_status.append(status)
+
+        result = b''.join(self.app(environ, start_response))
+        if not response_status[0].startswith('200') :
+            raise RuntimeError('capability failed; {}'.format(result))
+        return json.loads(result)
+
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+## Benchmark
+## XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+
+# -----------------------------------------------------------------
+def percentile(sorted_values, fraction) :
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * fraction))
+    return sorted_values[index]
+
+# -----------------------------------------------------------------
+def run_benchmark(driver, method_name, parameters, images_per_request, concurrency, requests) :
+    """Issue requests at a fixed concurrency and return the summary statistics
+    """
+    latencies = []
+    latency_lock = threading.Lock()
+    failures = []
+
+    def issue_request(_) :
+        start_time = time.perf_counter()
+        try :
+            driver(method_name, parameters)
+        except Exception as e :
+            failures.append(e)
+            return
+        latency = time.perf_counter() - start_time
+        with latency_lock :
+            latencies.append(latency)
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    with futures.ThreadPoolExecutor(max_workers=concurrency) as executor :
+        list(executor.map(issue_request, range(requests)))
+    wall_time = time.perf_counter() - wall_start
+    cpu_time = time.process_time() - cpu_start
+
+    if failures :
+        logger.warning('%d requests failed; %s', len(failures), failures[0])
+
+    latencies.sort()
+    completed = len(latencies)
+
+    result = {}
+    result['driver'] = driver.name
+    result['concurrency'] = concurrency
+    result['requests'] = completed
+    result['failures'] = len(failures)
+    if completed :
+        result['p50_ms'] = percentile(latencies, 0.50) * 1000
+        result['p95_ms'] = percentile(latencies, 0.95) * 1000
+        result['p99_ms'] = percentile(latencies, 0.99) * 1000
+        result['images_per_second'] = completed * images_per_request / wall_time
+        result['cpu_ms_per_request'] = cpu_time * 1000 / completed
+
+    return result
+
+# -----------------------------------------------------------------
+def load_image(image_file, image_size) :
+    """Return the encoded bytes of the benchmark image
+
+    A random JPEG image is generated if no image file is given.
+    """
+    if image_file :
+        with open(image_file, 'rb') as fp :
+            return fp.read()
+
+    img = np.random.randint(0, 256, (image_size, image_size, 3), dtype=np.uint8)
+    (success, encoded) = cv2.imencode('.jpg', img)
+    if not success :
+        raise RuntimeError('failed to encode the benchmark image')
+    return encoded.tobytes()
+
+# -----------------------------------------------------------------
+def Main() :
+    parser = argparse.ArgumentParser(description='offline benchmark for the inference guardian')
+
+    parser.add_argument('--concurrency', help='Concurrency levels to measure', nargs='+', type=int, default=[1, 4, 16])
+    parser.add_argument('--requests', help='Number of requests at each concurrency level', type=int, default=100)
+    parser.add_argument('--batch-size', help='Images per request, more than one uses batch inference', type=int, default=1)
+    parser.add_argument('--driver', help='Request path to measure', choices=['operation', 'capability', 'all'], default='all')
+
+    parser.add_argument('--image', help='Image file used as inference input, a random image by default', type=str)
+    parser.add_argument('--image-size', help='Size of the random input image', type=int, default=512)
+
+    parser.add_argument('--latency', help='Model server latency per request in milliseconds', type=float, default=0.0)
+    parser.add_argument('--output-classes', help='Number of classes in the model output', type=int, default=1000)
+    parser.add_argument('--port', help='Port for the stand-in model server', type=int, default=9500)
+    parser.add_argument('--server-workers', help='Worker threads in the stand-in model server', type=int, default=16)
+
+    parser.add_argument('--input-precision', help='Input tensor precision', choices=['FP32', 'U8'], default='FP32')
+    parser.add_argument('--max-batch-size', help='MaxBatchSize for the model', type=int, default=16)
+
+    parser.add_argument('--loglevel', help='Logging level', type=str, default='WARNING')
+    parser.add_argument('--json', help='Print the results as JSON', action='store_true')
+
+    options = parser.parse_args()
+
+    logging.basicConfig(level=options.loglevel.upper())
+
+    # start the stand-in model server in its own process so that its
+    # CPU time is not charged to the guardian
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(
+        target=serve_prediction_service,
+        args=(options.port, options.latency / 1000.0, '1463', options.output_classes, options.server_workers, ready),
+        daemon=True)
+    server.start()
+    if not ready.wait(30) :
+        server.terminate()
+        sys.exit('stand-in model server failed to start')
+
+    data_path = tempfile.mkdtemp(prefix='benchmark_')
+
+    config = {
+        'GuardianService' : {
+            'Operations' : 'pdo.inference.operations',
+        },
+        'StorageService' : {
+            'URL' : 'http://127.0.0.1:7901',
+        },
+        'Data' : {
+            'Path' : data_path,
+        },
+        'Model' : {
+            'Name' : 'resnet',
+            'InputTensorName' : '0',
+            'OutputTensorName' : '1463',
+            'ScoringScriptModule' : 'ImageClassification',
+            'OpenVINOModelServerAddress' : '127.0.0.1',
+            'OpenVINOModelServerPort' : options.port,
+            'MaxBatchSize' : options.max_batch_size,
+            'InputPrecision' : options.input_precision,
+            'InputImageCropSize' : 224,
+            'InputImageIsRGB' : 0,
+            'WarmUpRequests' : 1,
+        },
+    }
+
+    # hold the request inputs in the in-memory input loader
+    storage = InMemoryInputLoader()
+    image_bytes = load_image(options.image, options.image_size)
+    if options.batch_size > 1 :
+        method_name = 'do_batch_inference'
+        values = { '__image___{}'.format(i) : image_bytes for i in range(options.batch_size) }
+        (encryption_key, state_hash) = storage.push_store(values)
+        parameters = {
+            'encryption_key' : encryption_key,
+            'state_hash' : state_hash,
+            'image_key' : '__image__',
+            'image_count' : options.batch_size,
+        }
+    else :
+        method_name = 'do_inference'
+        (encryption_key, state_hash) = storage.push_store({ '__image__' : image_bytes })
+        parameters = {
+            'encryption_key' : encryption_key,
+            'state_hash' : state_hash,
+            'image_key' : '__image__',
+        }
+
+    drivers = []
+    if options.driver in ('operation', 'all') :
+        drivers.append(OperationDriver(config, storage, method_name))
+    if options.driver in ('capability', 'all') :
+        drivers.append(CapabilityDriver(config, storage, method_name))
+
+    results = []
+    try :
+        for driver in drivers :
+            for concurrency in options.concurrency :
+                results.append(run_benchmark(
+                    driver, method_name, parameters, options.batch_size, concurrency, options.requests))
+    finally :
+        server.terminate()
+
+    if options.json :
+        print(json.dumps(results, indent=2))
+        return
+
+    header = '{:<12}{:>6}{:>10}{:>10}{:>10}{:>10}{:>12}{:>12}'
+    row = '{:<12}{:>6}{:>10}{:>10.2f}{:>10.2f}{:>10.2f}{:>12.1f}{:>12.2f}'
+    print(header.format('driver', 'conc', 'requests', 'p50 ms', 'p95 ms', 'p99 ms', 'images/s', 'cpu ms/req'))
+    for result in results :
+        if result['requests'] == 0 :
+            print('{:<12}{:>6}{:>10}'.format(result['driver'], result['concurrency'], 'failed'))
+            continue
+        print(row.format(
+            result['driver'], result['concurrency'], result['requests'],
+            result['p50_ms'], result['p95_ms'], result['p99_ms'],
+            result['images_per_second'], result['cpu_ms_per_request']))
+
+# -----------------------------------------------------------------
+if __name__ == '__main__' :
+    Main()
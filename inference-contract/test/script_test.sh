@@ -210,6 +210,9 @@ try pdo-context load ${OPTS} --import-file ${F_EXCHANGE_TEMPLATES}/order.toml \
 # start the tests
 # -----------------------------------------------------------------
 
+yell run a short pass of the offline guardian benchmark
+try python ${SOURCE_ROOT}/test/benchmark_inference.py --concurrency 1 2 --requests 4 --batch-size 2
+
 yell create a token issuer and mint the tokens
 try ex_token_issuer create ${OPTS} --contract token.test1.token_issuer
 try inference_token mint_tokens ${OPTS} --contract token.test1.token_object
@@ -217,6 +220,16 @@ try inference_token mint_tokens ${OPTS} --contract token.test1.token_object
 yell do inference on images
 try inference_token do_inference ${OPTS}  --contract token.test1.token_object.token_1 --image "zebra_wiki.jpg"
 
+yell do inference on images resized before upload
+try inference_token do_inference ${OPTS}  --contract token.test1.token_object.token_1 --image "zebra_wiki.jpg" --resize-input
+
+yell do batch inference on images
+try inference_token do_batch_inference ${OPTS}  --contract token.test1.token_object.token_1 --images "*.jpg"
+
+yell do streaming inference on a frame sequence
+try inference_token do_video_inference ${OPTS}  --contract token.test1.token_object.token_1 \
+    --frames "*.jpg" --frame-stride 1 --segment-length 2
+
 yell transfer the tokens to the token holders
 for i in 1 2 3 4 5 ; do
     try inference_token transfer ${OPTS} \